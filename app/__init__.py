@@ -0,0 +1,2 @@
+# Loads `.env` before any module of the package reads its settings
+from app import config  # noqa: F401
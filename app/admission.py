@@ -0,0 +1,318 @@
+# ============================
+# Admission Control (per-key rate limits, concurrency limits, priority queue)
+# ============================
+
+# Every chat request goes through three checks before it reaches the graph:
+#   1. Rate limit of its API key (slowapi, e.g. "60/minute")      → 429 + Retry-After
+#   2. Requests in flight of its API key (CLIENT_CONCURRENCY)       → 429 + Retry-After
+#   3. A free slot among MAX_CONCURRENT_REQUESTS, otherwise a wait in a bounded
+#      priority queue (high → normal → low); a full queue or a wait longer than
+#      ADMISSION_QUEUE_TIMEOUT                                       → 503 + Retry-After
+# So a burst from one client is rejected right away instead of spending the
+# LLM provider quota of everyone else, and overload shows up as fast rejections.
+
+# -------- Standard Library --------
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# -------- FastAPI / rate limiting (slowapi on top of `limits`) --------
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from limits import parse_many
+from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
+
+# -------- Prometheus metrics --------
+from app.metrics import ADMISSION_REJECTIONS, ADMISSION_WAIT
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Requests per API key (limits syntax: "60/minute", "10/second;500/hour", ...)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT = os.getenv("RATE_LIMIT", "60/minute")
+# "memory://" is per process; "redis://host:6379" shares the counters between workers
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "memory://")
+
+# Requests of one API key in flight (running or queued)
+CLIENT_CONCURRENCY = int(os.getenv("CLIENT_CONCURRENCY", "4"))
+
+# Graph runs in flight across all keys, requests allowed to wait for one, and for how long
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "16"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "15"))
+
+# Queue order: lower rank is served first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+# Longest Retry-After suggested, in seconds
+MAX_RETRY_AFTER = 60
+
+
+# ============================
+# 2. API Clients
+# ============================
+
+@dataclass(frozen=True)
+class Client:
+    name: str                            # Rate limits and concurrency are counted per client
+    priority: str = "normal"             # high / normal / low
+    rate_limit: str = RATE_LIMIT
+    concurrency: int = CLIENT_CONCURRENCY
+
+
+def load_clients(api_key: str, config: str) -> Dict[str, Client]:
+    """
+    API key → Client. API_KEYS is a JSON object
+    {"<key>": {"name": "web", "priority": "high", "rate_limit": "120/minute", "concurrency": 8}};
+    the single API_KEY is kept as the "default" client. Unnamed entries are
+    named by position ("client-1", ...): no part of a key ends up in stats or logs.
+    """
+    clients = {api_key: Client("default")} if api_key else {}
+    for position, (key, entry) in enumerate(json.loads(config or "{}").items(), start=1):
+        client = Client(
+            name=entry.get("name", f"client-{position}"),
+            priority=entry.get("priority", "normal"),
+            rate_limit=entry.get("rate_limit", RATE_LIMIT),
+            concurrency=int(entry.get("concurrency", CLIENT_CONCURRENCY)),
+        )
+        if client.priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {client.priority!r} for client {client.name!r}")
+        clients[key] = client
+    return clients
+
+
+# ============================
+# 3. Rate Limits (slowapi)
+# ============================
+
+# Client name → Client (set by main.py from its API keys)
+CLIENTS = {}
+
+
+def register_clients(clients: Dict[str, Client]):
+    CLIENTS.update({client.name: client for client in clients.values()})
+
+
+def client_name(request: Request) -> str:
+    # Set by the API key check, which runs before the rate limit
+    return request.state.client.name
+
+
+def rate_limit_for(key: str) -> str:
+    # Limit of one client (slowapi passes the value returned by client_name)
+    client = CLIENTS.get(key)
+    return client.rate_limit if client else RATE_LIMIT
+
+
+limiter = Limiter(key_func=client_name, storage_uri=RATE_LIMIT_STORAGE, enabled=RATE_LIMIT_ENABLED)
+
+
+def _rate_limit_retry_after(limit, arguments) -> int:
+    # Seconds until the key's rate window resets
+    reset_time = limiter.limiter.get_window_stats(limit, *arguments).reset_time
+    return min(max(math.ceil(reset_time - time.time()), 1), MAX_RETRY_AFTER)
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    """
+    429 with Retry-After (seconds until the key's rate window resets).
+    """
+    ADMISSION_REJECTIONS.inc(reason="rate_limit")
+    retry_after = _rate_limit_retry_after(*request.state.view_rate_limit)
+    return JSONResponse({"detail": f"Rate limit exceeded: {exc.detail}"}, status_code=429,
+                        headers={"Retry-After": str(retry_after)})
+
+
+def charge_rate_limit(request: Request, hits: int):
+    """
+    Counts `hits` more requests against the client's rate limits, on top of the
+    one already counted by `@limiter.limit` (a batch costs one per question).
+    Raises HTTPException 429 with Retry-After if they don't fit.
+    """
+    if not limiter.enabled or hits <= 0:
+        return
+    # Same key and scope as the hit counted by the decorator for this endpoint
+    _, arguments = request.state.view_rate_limit
+    for limit in parse_many(rate_limit_for(client_name(request))):
+        if not limiter.limiter.hit(limit, *arguments, cost=hits):
+            ADMISSION_REJECTIONS.inc(reason="rate_limit")
+            raise HTTPException(status_code=429, detail=f"Rate limit exceeded: {limit} ({hits + 1} questions)",
+                                headers={"Retry-After": str(_rate_limit_retry_after(limit, arguments))})
+
+
+# ============================
+# 4. Concurrency Limits + Priority Queue
+# ============================
+
+class AdmissionTicket:
+    """
+    Slots held by one admitted request (several for a batch, one per graph run
+    in flight). release() is idempotent, so streamed responses can release it
+    both when the stream ends and in a background task.
+    """
+
+    def __init__(self, controller, client: Client, slots: int = 1):
+        self.controller = controller
+        self.client = client
+        self.slots = slots
+        self.start = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_REQUESTS, queue_size: int = ADMISSION_QUEUE_SIZE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.per_client = {}
+        # Heap of (priority rank, arrival, future); a slot is handed over by resolving the future
+        self._waiters = []
+        self._arrivals = itertools.count()
+        # Recent durations of admitted requests (for Retry-After)
+        self._durations = deque(maxlen=100)
+
+    # -------- Retry-After estimate --------
+
+    def average_duration(self) -> float:
+        return sum(self._durations) / len(self._durations) if self._durations else 1.0
+
+    def retry_after(self) -> int:
+        # Time for the requests already waiting (and this one) to get a slot
+        seconds = (len(self._waiters) + 1) * self.average_duration() / self.max_concurrent
+        return min(max(math.ceil(seconds), 1), MAX_RETRY_AFTER)
+
+    def _reject(self, status_code: int, reason: str, detail: str, retry_after: int):
+        ADMISSION_REJECTIONS.inc(reason=reason)
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+    # -------- Admission --------
+
+    async def acquire(self, client: Client, priority: Optional[str] = None, slots: int = 1) -> AdmissionTicket:
+        """
+        Waits for a slot (at most queue_timeout seconds) and returns its ticket.
+        Raises HTTPException 429 (client over its concurrency) or 503 (overloaded).
+
+        With `slots` > 1 (batches), the ticket also takes up to `slots` - 1 more
+        slots, as many as are free right now within the client's concurrency:
+        extra slots never wait in the queue nor displace other requests.
+        """
+        if self.per_client.get(client.name, 0) >= client.concurrency:
+            # One of the client's own requests has to finish first
+            retry_after = min(max(math.ceil(self.average_duration()), 1), MAX_RETRY_AFTER)
+            raise self._reject(429, "client_concurrency", "Too many concurrent requests for this API key", retry_after)
+
+        priority = priority or client.priority
+        self.per_client[client.name] = self.per_client.get(client.name, 0) + 1
+        start = time.monotonic()
+        try:
+            await self._acquire_slot(PRIORITIES[priority])
+        except BaseException:
+            self.per_client[client.name] -= 1
+            raise
+        ADMISSION_WAIT.observe(time.monotonic() - start, priority=priority)
+        return AdmissionTicket(self, client, 1 + self._take_free_slots(client, slots - 1))
+
+    def _take_free_slots(self, client: Client, wanted: int) -> int:
+        # Slots nobody is waiting for, up to the client's concurrency
+        if self._waiters:
+            return 0
+        free = min(wanted, self.max_concurrent - self.active, client.concurrency - self.per_client[client.name])
+        free = max(free, 0)
+        self.active += free
+        self.per_client[client.name] += free
+        return free
+
+    async def _acquire_slot(self, rank: int):
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            # Full queue: the newcomer only gets in by displacing a lower-priority waiter
+            worst = max(self._waiters)
+            if worst[0] <= rank:
+                raise self._reject(503, "queue_full", "Server overloaded, try again later", self.retry_after())
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            worst[2].set_exception(
+                self._reject(503, "shed", "Server overloaded, try again later", self.retry_after()))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (rank, next(self._arrivals), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove(entry)
+            raise self._reject(503, "queue_timeout", "Server overloaded, try again later", self.retry_after())
+        except asyncio.CancelledError:
+            # The client went away; if the slot was handed over just before, give it back
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release_slot()
+            else:
+                self._remove(entry)
+            raise
+
+    def _remove(self, entry):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    # -------- Release --------
+
+    def _release(self, ticket: AdmissionTicket):
+        self._durations.append(time.monotonic() - ticket.start)
+        self.per_client[ticket.client.name] -= ticket.slots
+        for _ in range(ticket.slots):
+            self._release_slot()
+
+    def _release_slot(self):
+        # The slot goes straight to the best waiter still waiting
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "queue_size": self.queue_size,
+            "per_client": {name: count for name, count in self.per_client.items() if count},
+            "retry_after": self.retry_after(),
+        }
+
+
+admission = AdmissionController()
+
+
+async def release_when_done(stream, ticket: AdmissionTicket):
+    """
+    Passes a streamed body through and releases the ticket when it ends.
+    """
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        ticket.release()
@@ -0,0 +1,276 @@
+# =====================
+# Domain Agent Factory (one RAG workflow per area of law)
+# =====================
+
+# Every domain of the registry (app/agents/domains.py) gets the same two-step
+# workflow: retrieve the law articles of its collection → generate the answer.
+# A domain's retriever, vector store and compiled graph are built the first
+# time it is asked something, and released again after DOMAIN_IDLE_SECONDS
+# without use, so memory follows the domains actually in use.
+
+# Standard library
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Typing utilities to define the structure of the state passed between steps
+from typing import List, TypedDict
+
+# Prompt template, output parser and the LLM router used to generate the answers
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from app.llms import get_fallback_llm
+
+# Core LangGraph tools for building step-by-step workflows
+from langgraph.graph import StateGraph, START, END
+
+# Registered domains (category, collection, prompt, retrieval params)
+from app.agents.domains import DOMAINS, DomainConfig
+
+# Retriever of a collection, and the release of an idle collection
+from app.vectorstore.retrievers import (
+    RETRIEVAL_CANDIDATES,
+    RETRIEVAL_K,
+    RETRIEVAL_MODE,
+    ArticleAwareRetriever,
+    release_collection,
+)
+
+# Lets streaming clients (SSE) see the retrieved article references before generation
+from app.streaming import article_references, emit_stream_event
+
+# Packs the retrieved articles into the prompt context (token budget)
+from app.context_packer import pack_context
+
+# Prometheus metrics and tracing: latency and span of each node
+from app.metrics import NODE_DURATION
+from app.telemetry import traced
+
+logger = logging.getLogger(__name__)
+
+# Optional: Disable telemetry from Chroma (a vector store backend)
+os.environ["CHROMA_TELEMETRY"] = "FALSE"
+
+
+# =====================
+# 1. Configuration
+# =====================
+
+# Seconds without requests after which a domain is unloaded (0 = never)
+DOMAIN_IDLE_SECONDS = float(os.getenv("DOMAIN_IDLE_SECONDS", "1800"))
+
+# How often idle domains are looked for, in seconds
+DOMAIN_UNLOAD_INTERVAL = float(os.getenv("DOMAIN_UNLOAD_INTERVAL", "60"))
+
+
+# =====================
+# 2. Prompt Template
+# =====================
+# Shared by every domain without a "prompt" of its own
+DEFAULT_PROMPT = """
+    Eres un asistente legal.
+    Utiliza los artículos recuperados para brindar asistencia legal.
+    Proporciona información útil para ayudar al usuario con la pregunta.
+
+    Pregunta: {question}
+    Artículos de la ley: {context}
+    Respuesta:
+    """
+
+
+# Connect the prompt to the language model and string parser as a chain
+# (built on first use; domains with the same prompt share it)
+@lru_cache(maxsize=None)
+def get_law_articles_chain(template: str = DEFAULT_PROMPT):
+    return ChatPromptTemplate.from_template(template) | get_fallback_llm() | StrOutputParser()
+
+
+# =====================
+# 3. State Definition
+# =====================
+# This defines the shape of data (or "state") that flows through the graph
+class LawArticlesGraphState(TypedDict):
+    question: str                          # The user's legal question
+    retrieved_law_articles: List[str]     # Articles retrieved by the retriever
+    generation: str                        # Final legal answer generated by the LLM
+    context_stats: dict                    # Prompt tokens used and saved by the context packer
+
+
+# =====================
+# 4. Workflow Factory
+# =====================
+
+def create_domain_workflow(domain: DomainConfig, retriever):
+    """
+    Compiles the retrieve → generate workflow of a domain.
+    """
+    chain_template = domain.prompt or DEFAULT_PROMPT
+
+    # Step 1 - Retrieve the domain's law articles
+    # (unless the router already fetched them speculatively)
+    @traced(f"{domain.name}.retrieve_law_articles")
+    @NODE_DURATION.time(graph=domain.name, node="retrieve_law_articles")
+    async def retrieve_law_articles(state):
+        question = state["question"]
+        retrieved_law_articles = state.get("retrieved_law_articles")
+        if retrieved_law_articles is None:
+            retrieved_law_articles = await retriever.ainvoke(question)
+
+        # Only the count: the article text stays out of the logs
+        logger.info("Retrieved %d articles", len(retrieved_law_articles))
+        emit_stream_event("articles", article_references(retrieved_law_articles))
+        return {"question": question, "retrieved_law_articles": retrieved_law_articles}
+
+    # Step 2 - Generate the answer from the packed articles
+    @traced(f"{domain.name}.generate_legal_assistance")
+    @NODE_DURATION.time(graph=domain.name, node="generate_legal_assistance")
+    async def generate_legal_assistance(state):
+        question = state["question"]
+        retrieved_law_articles = state["retrieved_law_articles"]
+
+        # Clean, cited and deduplicated article text within the token budget
+        context = pack_context(retrieved_law_articles)
+        logger.info("Context: %d tokens (%d saved of %d)", context.tokens, context.saved, context.raw_tokens)
+
+        generation = await get_law_articles_chain(chain_template).ainvoke({
+            "question": question,
+            "context": context.text
+        })
+        return {
+            "question": question,
+            "retrieved_law_articles": retrieved_law_articles,
+            "generation": generation,
+            "context_stats": context.stats(),
+        }
+
+    workflow = StateGraph(LawArticlesGraphState)
+    workflow.add_node("retrieve_law_articles", retrieve_law_articles)
+    workflow.add_node("generate_legal_assistance", generate_legal_assistance)
+    workflow.add_edge(START, "retrieve_law_articles")                       # Start → Retrieve
+    workflow.add_edge("retrieve_law_articles", "generate_legal_assistance")  # Retrieve → Generate
+    workflow.add_edge("generate_legal_assistance", END)                      # Generate → End
+    # Not checkpointed, even when run inside a session (see app/sessions.py)
+    return workflow.compile(checkpointer=False)
+
+
+# =====================
+# 5. Lazily Loaded Domain Agents
+# =====================
+
+class DomainAgent:
+    """
+    Retriever and compiled graph of one domain, built on first use.
+    Use it inside `with agent.in_use():` so it isn't unloaded mid-request.
+    """
+
+    def __init__(self, domain: DomainConfig):
+        self.domain = domain
+        self._retriever = None
+        self._graph = None
+        self.active = 0
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._graph is not None or self._retriever is not None
+
+    @property
+    def retriever(self):
+        if self._retriever is None:
+            with self._lock:
+                if self._retriever is None:
+                    self._retriever = ArticleAwareRetriever(
+                        collection_name=self.domain.collection,
+                        mode=self.domain.retrieval_mode or RETRIEVAL_MODE,
+                        k=self.domain.k or RETRIEVAL_K,
+                        candidates=self.domain.candidates or RETRIEVAL_CANDIDATES,
+                    )
+        return self._retriever
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            retriever = self.retriever
+            with self._lock:
+                if self._graph is None:
+                    logger.info("Loading %s domain", self.domain.name)
+                    self._graph = create_domain_workflow(self.domain, retriever)
+        return self._graph
+
+    @contextmanager
+    def in_use(self):
+        with self._lock:
+            self.active += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.last_used = time.monotonic()
+
+    async def aretrieve(self, question: str):
+        with self.in_use():
+            return await self.retriever.ainvoke(question)
+
+    async def ainvoke(self, state: dict):
+        with self.in_use():
+            return await self.graph.ainvoke(state)
+
+    def warmup(self):
+        # Compiles the graph and opens the collection (WARMUP_ON_STARTUP)
+        from app.vectorstore.retrievers import get_vector_store
+        with self.in_use():
+            self.graph  # Property access compiles the workflow
+            if self.retriever.mode != "lexical":
+                get_vector_store(self.domain.collection)
+
+    def unload(self, max_idle: float) -> bool:
+        """
+        Releases the graph, retriever and collection if idle for `max_idle` seconds.
+        """
+        with self._lock:
+            if not self.loaded or self.active or time.monotonic() - self.last_used < max_idle:
+                return False
+            self._graph = None
+            self._retriever = None
+            # Under the lock: a new request waits instead of querying a closing store
+            release_collection(self.domain.collection)
+        logger.info("Unloaded idle %s domain", self.domain.name)
+        return True
+
+
+_agents = {}
+_agents_lock = threading.Lock()
+
+
+def get_domain_agent(name: str) -> DomainAgent:
+    agent = _agents.get(name)
+    if agent is None:
+        with _agents_lock:
+            agent = _agents.setdefault(name, DomainAgent(DOMAINS[name]))
+    return agent
+
+
+def loaded_domains() -> List[str]:
+    return [name for name, agent in list(_agents.items()) if agent.loaded]
+
+
+def unload_idle_domains(max_idle: float = DOMAIN_IDLE_SECONDS) -> List[str]:
+    """
+    Unloads every domain idle for `max_idle` seconds; returns their names.
+    """
+    return [name for name, agent in list(_agents.items()) if agent.unload(max_idle)]
+
+
+async def unload_idle_domains_periodically():
+    # Background task of the API server (does nothing if DOMAIN_IDLE_SECONDS=0)
+    if DOMAIN_IDLE_SECONDS <= 0:
+        return
+    while True:
+        await asyncio.sleep(DOMAIN_UNLOAD_INTERVAL)
+        unload_idle_domains()
@@ -0,0 +1,124 @@
+# ============================
+# Domain Registry (areas of law served by the assistant)
+# ============================
+
+# Every area of law is one entry of a JSON config (app/agents/domains.json by default):
+#
+#   {
+#     "name": "laboral",                 ← route / graph node name
+#     "category": "Derecho Laboral",     ← label returned by the classifiers
+#     "collection": "laboral",           ← Chroma collection (default: name)
+#     "index_path": "/data/laboral",     ← optional, default: INDEX_DIR/<collection>
+#     "prompt": "... {question} ... {context} ...",     ← optional answer prompt
+#     "retrieval": {"mode": "hybrid", "k": 4, "candidates": 10},  ← optional
+#     "laws": {"LFT": "ley federal del trabajo"}        ← abbreviation → how users name it
+#   }
+#
+# Adding an area of law (fiscal, mercantil, ...) = indexing its PDFs into a new
+# collection and adding its entry here; the router, classifiers and cache pick it up.
+
+# -------- Standard Library --------
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+# -------- Index locations and law names (citations in questions) --------
+from app.vectorstore.index_metadata import INDEX_PATHS
+from app.vectorstore.articles import LAW_NAMES
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Path of the JSON list of domains
+DOMAINS_CONFIG = os.getenv("DOMAINS_CONFIG", os.path.join(os.path.dirname(__file__), "domains.json"))
+
+# Node names of the router graph that a domain can't take
+RESERVED_NAMES = ("multi_domain", "fallback")
+
+
+# ============================
+# 2. Domain Config
+# ============================
+
+@dataclass(frozen=True)
+class DomainConfig:
+    name: str                            # Route and graph node name
+    category: str                        # Category label returned by the classifiers
+    collection: str                      # Chroma collection with the domain's laws
+    index_path: Optional[str] = None     # Persist directory (default: INDEX_DIR/<collection>)
+    prompt: Optional[str] = None         # Answer prompt (default: the shared legal prompt)
+    retrieval_mode: Optional[str] = None  # hybrid / dense / lexical (default: RETRIEVAL_MODE)
+    k: Optional[int] = None              # Documents retrieved (default: RETRIEVAL_K)
+    candidates: Optional[int] = None     # Candidates per side before fusion (default: RETRIEVAL_CANDIDATES)
+    laws: dict = field(default_factory=dict)  # Law abbreviation → regex of its name
+
+
+def parse_domain(entry: dict) -> DomainConfig:
+    retrieval = entry.get("retrieval") or {}
+    prompt = entry.get("prompt")
+    if prompt is not None and ("{question}" not in prompt or "{context}" not in prompt):
+        raise ValueError(f"Prompt of domain {entry['name']!r} must contain {{question}} and {{context}}")
+    return DomainConfig(
+        name=entry["name"],
+        category=entry["category"],
+        collection=entry.get("collection", entry["name"]),
+        index_path=entry.get("index_path"),
+        prompt=prompt,
+        retrieval_mode=retrieval.get("mode"),
+        k=retrieval.get("k"),
+        candidates=retrieval.get("candidates"),
+        laws=dict(entry.get("laws") or {}),
+    )
+
+
+def load_domains(path: str = DOMAINS_CONFIG) -> Dict[str, DomainConfig]:
+    """
+    Reads the domain list ({name: DomainConfig}, in config order = classifier order).
+    """
+    with open(path, encoding="utf-8") as f:
+        domains = [parse_domain(entry) for entry in json.load(f)]
+
+    for attribute in ("name", "category", "collection"):
+        values = [getattr(domain, attribute) for domain in domains]
+        if len(set(values)) != len(values):
+            raise ValueError(f"Duplicate domain {attribute} in {path}: {values}")
+    if any(domain.category == "General" for domain in domains):
+        raise ValueError("'General' is reserved for the fallback")
+    if any(domain.name in RESERVED_NAMES for domain in domains):
+        raise ValueError(f"Domain names {RESERVED_NAMES} are reserved for the router's own nodes")
+    return {domain.name: domain for domain in domains}
+
+
+def register_domains(domains: Dict[str, DomainConfig]):
+    # Custom index locations and law names are read by the vectorstore helpers
+    for domain in domains.values():
+        if domain.index_path:
+            INDEX_PATHS[domain.collection] = domain.index_path
+        LAW_NAMES.update(domain.laws)
+
+
+# ============================
+# 3. Registered Domains
+# ============================
+
+# Reading the config is cheap: collections and graphs are only opened on first use
+DOMAINS = load_domains()
+register_domains(DOMAINS)
+
+# Category label → route, and route → category label
+ROUTES = {domain.category: name for name, domain in DOMAINS.items()}
+CATEGORIES = {name: domain.category for name, domain in DOMAINS.items()}
+
+
+def domain_for_category(category: Optional[str]) -> Optional[DomainConfig]:
+    """
+    Domain of a category label, case-insensitively (None for "General" or unknown labels).
+    """
+    category = (category or "").lower()
+    for domain in DOMAINS.values():
+        if domain.category.lower() == category:
+            return domain
+    return None
@@ -3,22 +3,56 @@
 # ============================
 
 # Import standard Python libraries
+import asyncio
+import logging
 import os
-from typing import TypedDict, List
+from typing import List, Optional, TypedDict
 
 # Import LangGraph tools to define and compile state-based workflows
 from langgraph.graph import END, START, StateGraph
+from langgraph.types import Send
 
 # Import the classifier and prompt used to detect legal categories
-from app.router import legal_classifier, tagging_prompt
+from app.router import get_legal_classifier, tagging_prompt
 
-# Import each domain-specific legal agent (graphs for each legal area)
-from app.agents.labor_agent import laboral_graph
-from app.agents.civil_agent import civil_graph
-from app.agents.penal_agent import penal_graph
+# Article-level index: "art. 386 CPF" names its own domain
+from app.vectorstore.articles import cited_collections
+
+# Question normalization and search terms (follow-up detection within a session)
+from app.cache import normalize_question
+from app.vectorstore.lexical import tokenize
+
+# Local TF-IDF classifier: answers most routing decisions in milliseconds
+from app.local_classifier import (
+    LOCAL_CLASSIFIER_ENABLED,
+    LOCAL_CLASSIFIER_MIN_CONFIDENCE,
+    LOCAL_CLASSIFIER_MULTI_DOMAIN_MARGIN,
+    create_local_classifier,
+)
+
+# Registered domains (app/agents/domains.json) and their lazily loaded agents
+from app.agents.domains import CATEGORIES, DOMAINS, ROUTES
+from app.agents.domain_agent import get_domain_agent
 
 # Import fallback language model in case routing fails
-from app.llms import fallback_llm
+from app.llms import get_fallback_llm
+
+# Shared embedding model (the speculative retrievals embed the question once)
+from app.vectorstore.retrievers import EMBEDDING_CACHE_ENABLED, RETRIEVAL_MODE, get_embeddings
+
+# Rank fusion, reused to merge and deduplicate the articles of several domains
+from app.vectorstore.lexical import reciprocal_rank_fusion
+
+# Used to notify streaming clients (SSE) about the detected category
+from app.streaming import emit_stream_event
+
+# Prometheus metrics: node latency, category distribution and fallback rate
+from app.metrics import CATEGORY_REQUESTS, FALLBACKS, NODE_DURATION, REQUESTS, SESSION_TURNS
+
+# Structured logging and one span per node
+from app.telemetry import traced
+
+logger = logging.getLogger(__name__)
 
 # Optional: Disable telemetry reporting from Chroma (the vector store)
 os.environ["CHROMA_TELEMETRY"] = "FALSE"
@@ -31,68 +65,342 @@ os.environ["CHROMA_TELEMETRY"] = "FALSE"
 # This is the format of data passed between nodes in the graph
 class LegalRequest(TypedDict):
     question: str              # User's legal question
-    category: str              # Detected legal category (laboral, penal, civil)
+    category: str              # Detected legal category (label of a registered domain, or "General")
     answer: str                # Final response to the user
     retrieved_docs: List[str]  # List of retrieved legal documents/articles
+    categories: List[str]      # All the categories of a multi-domain question, ranked
+    context_stats: dict        # Tokens of the packed prompt context (and tokens saved)
+    session: dict              # Earlier turns of a conversation session (category, categories, articles, summary)
+    follow_up: bool            # Answered as a follow-up of the session (classification skipped)
 
 
 # ============================
 # 2. Step 1 - Classify the Request
 # ============================
 
-# This node will run first: it determines the category of the user's question
-def categorize_request(request: LegalRequest):
-    print(f"Received request: {request}")
-
-    # Generate a taggable prompt based on the question
-    prompt = tagging_prompt.invoke({"input": request["question"]})
-
-    # Use a classifier to label the legal category (laboral, civil, penal)
-    response = legal_classifier.invoke(prompt)
+# Category label → name of the node that handles it (ROUTES), and back (CATEGORIES),
+# come from the domain registry
+
+# Questions touching several areas of law ("me despidieron y me acusan de robo")
+# are answered with the articles of every matching domain (at most this many)
+MULTI_DOMAIN_ENABLED = os.getenv("MULTI_DOMAIN_ENABLED", "true").lower() == "true"
+MULTI_DOMAIN_MAX = int(os.getenv("MULTI_DOMAIN_MAX", "3"))
+
+# Built lazily on the first request from the indexed laws
+local_classifier = create_local_classifier() if LOCAL_CLASSIFIER_ENABLED else None
+
+
+async def classify_locally(question: str):
+    """
+    Returns the category predicted by the local classifier,
+    or None when it is disabled, unsure or unavailable.
+    With multi-domain answers on, a runner-up category close to the best one
+    also counts as unsure: the LLM classifier can return both.
+    """
+    if local_classifier is None:
+        return None
+    try:
+        prediction = await local_classifier.apredict(question)
+    except Exception as exc:
+        # The fast path is only an optimization: the LLM classifier still works
+        logger.warning("Local classifier unavailable: %s", exc)
+        return None
+    min_confidence = LOCAL_CLASSIFIER_MIN_CONFIDENCE
+    if MULTI_DOMAIN_ENABLED:
+        min_confidence = max(min_confidence, LOCAL_CLASSIFIER_MULTI_DOMAIN_MARGIN)
+    if prediction is None or prediction.confidence < min_confidence:
+        return None
+    return prediction.category
+
+
+# Speculative retrieval: search the likeliest domain collections while the request
+# is being classified, keep the documents of the chosen domain and discard the rest.
+# Retrieval is cheap next to an LLM round trip, so this takes it off the critical path.
+# Only the local classifier's top SPECULATIVE_TOP_K domains are searched, so the
+# vector stores of unrelated domains are not loaded
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+SPECULATIVE_TOP_K = int(os.getenv("SPECULATIVE_TOP_K", "2"))
+
+
+async def speculative_routes(question: str) -> List[str]:
+    """
+    Returns the routes of the local classifier's top-k categories
+    (none when it is disabled, unavailable or the question matches no domain).
+    """
+    if local_classifier is None:
+        return []
+    try:
+        categories = await local_classifier.arank(question, SPECULATIVE_TOP_K)
+    except Exception as exc:
+        logger.warning("Local classifier unavailable: %s", exc)
+        return []
+    return [ROUTES[category] for category in categories if category in ROUTES]
+
+
+async def start_speculative_retrieval(question: str) -> dict:
+    """
+    Starts one retrieval task per candidate domain: {route: task}.
+    """
+    routes = await speculative_routes(question)
+    if not routes:
+        return {}
+
+    embedded = None
+    if EMBEDDING_CACHE_ENABLED and RETRIEVAL_MODE != "lexical":
+        # Embed the question once; the candidate retrievers then hit the embedding cache
+        embedded = asyncio.ensure_future(get_embeddings().aembed_query(question))
+        embedded.add_done_callback(lambda future: future.cancelled() or future.exception())
+
+    async def retrieve(route: str):
+        if embedded is not None:
+            # Errors are ignored here: each retriever handles them on its own
+            await asyncio.wait([embedded])
+        return await get_domain_agent(route).aretrieve(question)
+
+    return {route: asyncio.create_task(retrieve(route)) for route in routes}
+
+
+async def take_speculative_results(tasks: dict, routes: List[str]):
+    """
+    Cancels the retrievals of the other domains and returns the documents of `routes`,
+    merged if there are several (None if not prefetched or any of them failed:
+    the chosen node then retrieves them itself).
+    """
+    cancelled = [task for other, task in tasks.items() if other not in routes]
+    for task in cancelled:
+        task.cancel()
+    # Collect the cancelled tasks so their outcome is retrieved (no asyncio warnings)
+    await asyncio.gather(*cancelled, return_exceptions=True)
+    if not tasks or any(route not in tasks for route in routes):
+        return None
+    try:
+        return merge_documents([await tasks[route] for route in routes])
+    except Exception as exc:
+        logger.warning("Speculative retrieval failed for %s: %s", routes, exc)
+        return None
+
+
+def merge_documents(results: List[list]) -> list:
+    """
+    Merges the ranked documents of several domains: interleaved by rank, duplicates removed.
+    """
+    if len(results) == 1:
+        return results[0]
+    return reciprocal_rank_fusion(results, k=sum(len(documents) for documents in results))
+
+
+async def retrieve_domains(question: str, routes: List[str]) -> list:
+    """
+    Retrieves from several domain collections in parallel and merges the results.
+    A failing domain is skipped as long as another one answered.
+    """
+    results = await asyncio.gather(
+        *(get_domain_agent(route).aretrieve(question) for route in routes), return_exceptions=True
+    )
+    documents = [result for result in results if not isinstance(result, BaseException)]
+    if not documents:
+        raise results[0]
+    for route, result in zip(routes, results):
+        if isinstance(result, BaseException):
+            logger.warning("Retrieval failed for %s: %s", route, result)
+    return merge_documents(documents)
 
-    # Route to the correct agent based on classification
-    if response.category == "Derecho Laboral":
-        return "laboral"
-    elif response.category == "Derecho Civil":
-        return "civil"
-    elif response.category == "Derecho Penal":
-        return "penal"
 
+# This node will run first: it determines the category of the user's question
+# All nodes are async so the graph can be awaited with `ainvoke` without
+# holding a worker thread while waiting on the LLM and the vector stores
+@traced("legal_assistant.categorize_request")
+@NODE_DURATION.time(graph="legal_assistant", node="categorize_request")
+async def categorize_request(request: LegalRequest):
+    logger.info("Received request", extra={"question_chars": len(request["question"])})
+
+    # Follow-up within a session: the session's domains, no classification
+    session = request.get("session")
+    routes = await follow_up_routes(request["question"], session) if session else None
+    if session:
+        SESSION_TURNS.inc(kind="follow_up" if routes else "new_topic")
+
+    if routes:
+        documents = await follow_up_documents(request["question"], routes, session.get("articles"))
+        request = {**request, "follow_up": True}
+    else:
+        tasks = await start_speculative_retrieval(request["question"]) if SPECULATIVE_RETRIEVAL else {}
+        try:
+            routes = await classify_request(request["question"])
+        except BaseException:
+            await take_speculative_results(tasks, [])
+            raise
+        documents = await take_speculative_results(tasks, routes)
+
+    REQUESTS.inc()
+    for route in routes:
+        CATEGORY_REQUESTS.inc(category=CATEGORIES.get(route, "General"))
+
+    # Several domains: one node retrieves from all of them and generates once
+    if len(routes) > 1:
+        categories = [CATEGORIES[route] for route in routes]
+        return Send("multi_domain", {**request, "categories": categories, "retrieved_docs": documents})
+
+    # Hand the prefetched documents to the chosen domain node
+    if documents is not None:
+        return Send(routes[0], {**request, "retrieved_docs": documents})
+    return routes[0]
+
+
+async def classify_request(question: str) -> List[str]:
+    """
+    Returns the routes (node names) of a question, most relevant first.
+    """
+    # Citation of an article of a specific law: its domain is already known
+    collections = {domain.collection: name for name, domain in DOMAINS.items()}
+    cited = await asyncio.to_thread(cited_collections, question, collections)
+    if cited:
+        return [collections[collection] for collection in cited][:MULTI_DOMAIN_MAX if MULTI_DOMAIN_ENABLED else 1]
+
+    # Fast path: confident local prediction, no LLM round trip
+    categories = [await classify_locally(question)]
+
+    if categories[0] is None:
+        # Generate a taggable prompt based on the question
+        prompt = await tagging_prompt.ainvoke({"input": question})
+
+        # Use a classifier to label the legal categories (one per registered domain), ranked
+        response = await get_legal_classifier().ainvoke(prompt)
+        categories = [response.category] + list(response.other_categories or [])
+
+    # Route to the correct agents based on classification
     # If no category matches, fallback to generic response
-    return "fallback"
+    routes = list(dict.fromkeys(ROUTES[category] for category in categories if category in ROUTES))
+    if not routes:
+        return ["fallback"]
+    return routes[:MULTI_DOMAIN_MAX if MULTI_DOMAIN_ENABLED else 1]
+
+
+# -------- Follow-ups within a conversation session --------
+
+# "¿y si tengo más de 20 años de antigüedad?" continues the previous question:
+# it keeps the session's domains and is answered over the session's articles
+# plus the ones retrieved for it (at most SESSION_MAX_ARTICLES)
+SESSION_MAX_ARTICLES = int(os.getenv("SESSION_MAX_ARTICLES", "8"))
+
+# First words and references that tie a question to the previous one (normalized).
+# Length alone says nothing: "¿Qué es el divorcio?" is short but a new topic
+FOLLOW_UP_STARTERS = {"y", "e", "o", "pero", "entonces", "tambien", "ademas", "aun", "luego"}
+FOLLOW_UP_REFERENCES = {"eso", "esto", "ello", "anterior", "dicho", "mismo", "misma"}
+
+
+def looks_like_follow_up(question: str) -> bool:
+    words = normalize_question(question).split()
+    return bool(words) and (words[0] in FOLLOW_UP_STARTERS or any(word in FOLLOW_UP_REFERENCES for word in words))
+
+
+async def follow_up_routes(question: str, session: dict) -> Optional[List[str]]:
+    """
+    Routes of the session's domains if the question follows up on them,
+    or None when it must be classified (new topic, or no domain in the session).
+    """
+    categories = session.get("categories") or [session.get("category")]
+    routes = [ROUTES[category] for category in categories if category in ROUTES]
+    if not routes or not looks_like_follow_up(question):
+        return None
+
+    # An article of another law, or a confident local prediction of another
+    # category, means the conversation moved to a new topic
+    collections = {domain.collection: name for name, domain in DOMAINS.items()}
+    cited = await asyncio.to_thread(cited_collections, question, collections)
+    if any(collections[collection] not in routes for collection in cited):
+        return None
+    predicted = await classify_locally(question)
+    if predicted is not None and ROUTES.get(predicted) not in routes:
+        return None
+    return routes
+
+
+async def follow_up_documents(question: str, routes: List[str], articles) -> list:
+    """
+    Articles for a follow-up: the session's ones are reused as they are when the
+    question brings no new search terms ("¿y eso por qué?"), otherwise merged
+    with the ones retrieved for it from the session's domains.
+    """
+    articles = list(articles or [])
+    terms = [term for term in tokenize(question) if term not in FOLLOW_UP_REFERENCES]
+    if articles and not terms:
+        return articles
+    try:
+        documents = await retrieve_domains(question, routes)
+    except Exception as exc:
+        if not articles:
+            raise
+        logger.warning("Follow-up retrieval failed, reusing the session's articles: %s", exc)
+        return articles
+    return merge_documents([documents, articles])[:SESSION_MAX_ARTICLES]
+
+
+def generation_question(request: LegalRequest) -> str:
+    # Follow-ups are answered with the conversation summary in the prompt
+    summary = (request.get("session") or {}).get("summary") if request.get("follow_up") else None
+    if not summary:
+        return request["question"]
+    return f"Conversación previa:\n{summary}\n\nPregunta actual: {request['question']}"
 
 
 # ============================
 # 3. Step 2 - Domain-Specific Handlers
 # ============================
 
-# Each of the following functions calls a domain-specific LangGraph agent
+# Each domain node calls the domain's LangGraph agent (built from the registry)
 # Then, updates the state with retrieved docs and final answer
 
-def handle_laboral(request: LegalRequest):
-    print(f"Routing to laboral agent")
-    response = laboral_graph.invoke({"question": request["question"]})
-    request["category"] = "Derecho Laboral"
-    request["retrieved_docs"] = response["retrieved_law_articles"]
-    request["answer"] = response["generation"]
-    return request
-
 
-def handle_civil(request: LegalRequest):
-    print(f"Routing to civil agent")
-    response = civil_graph.invoke({"question": request["question"]})
-    request["category"] = "Derecho Civil"
-    request["retrieved_docs"] = response["retrieved_law_articles"]
-    request["answer"] = response["generation"]
-    return request
-
-
-def handle_penal(request: LegalRequest):
-    print(f"Routing to penal agent")
-    response = penal_graph.invoke({"question": request["question"]})
-    request["category"] = "Derecho penal"
+def domain_input(request: LegalRequest) -> dict:
+    # Documents prefetched by the speculative retrieval skip the retrieval step
+    if request.get("retrieved_docs") is not None:
+        return {"question": generation_question(request), "retrieved_law_articles": request["retrieved_docs"]}
+    return {"question": request["question"]}
+
+
+def make_domain_handler(name: str):
+    """
+    Graph node of a registered domain: runs its agent and copies the answer into the request.
+    """
+    category = CATEGORIES[name]
+
+    @traced(f"legal_assistant.{name}")
+    @NODE_DURATION.time(graph="legal_assistant", node=name)
+    async def handle_domain(request: LegalRequest):
+        logger.info("Routing to %s agent", name)
+        emit_stream_event("category", category)
+        response = await get_domain_agent(name).ainvoke(domain_input(request))
+        request["category"] = category
+        request["retrieved_docs"] = response["retrieved_law_articles"]
+        request["answer"] = response["generation"]
+        request["context_stats"] = response.get("context_stats")
+        return request
+
+    handle_domain.__name__ = f"handle_{name}"
+    return handle_domain
+
+
+# Question spanning several areas of law: the domain retrievals run in parallel,
+# their articles are merged and deduplicated, and the graph of the most relevant
+# domain generates one answer over the combined context
+@traced("legal_assistant.multi_domain")
+@NODE_DURATION.time(graph="legal_assistant", node="multi_domain")
+async def handle_multi_domain(request: LegalRequest):
+    routes = [ROUTES[category] for category in request["categories"]]
+    logger.info("Routing to %s agents", ", ".join(routes))
+    emit_stream_event("category", request["categories"][0])
+
+    documents = request.get("retrieved_docs")
+    if documents is None:
+        documents = await retrieve_domains(request["question"], routes)
+    response = await get_domain_agent(routes[0]).ainvoke(
+        {"question": generation_question(request), "retrieved_law_articles": documents}
+    )
+    request["category"] = request["categories"][0]
     request["retrieved_docs"] = response["retrieved_law_articles"]
     request["answer"] = response["generation"]
+    request["context_stats"] = response.get("context_stats")
     return request
 
 
@@ -101,10 +409,14 @@ def handle_penal(request: LegalRequest):
 # ============================
 
 # If the classifier fails or returns an unknown category, use a generic response
-def handle_fallback(request: LegalRequest) -> LegalRequest:
-    print(f"fallback agent")
+@traced("legal_assistant.fallback")
+@NODE_DURATION.time(graph="legal_assistant", node="fallback")
+async def handle_fallback(request: LegalRequest) -> LegalRequest:
+    logger.info("Routing to fallback agent")
+    FALLBACKS.inc()
     request["category"] = "General"
-    request["answer"] = fallback_llm.invoke(
+    emit_stream_event("category", request["category"])
+    request["answer"] = await get_fallback_llm().ainvoke(
         "No se encontró contexto suficiente. Responde de la mejor manera posible: "
         + request["question"]
     )
@@ -118,20 +430,22 @@ def handle_fallback(request: LegalRequest) -> LegalRequest:
 # Initialize the workflow with the state shape (LegalRequest)
 graph = StateGraph(LegalRequest)
 
-# Register the processing nodes (steps)
-graph.add_node("laboral", handle_laboral)
-graph.add_node("civil", handle_civil)
-graph.add_node("penal", handle_penal)
+# Register the processing nodes (steps): one per registered domain
+# (cheap: a domain's graph and collection are only loaded on its first question)
+for name in DOMAINS:
+    graph.add_node(name, make_domain_handler(name))
+graph.add_node("multi_domain", handle_multi_domain)
 graph.add_node("fallback", handle_fallback)
 
 # Add the conditional router that runs at START and decides the next step
 graph.add_conditional_edges(START, categorize_request)
 
 # Define how each node leads to the END of the process
-graph.add_edge("laboral", END)
-graph.add_edge("civil", END)
-graph.add_edge("penal", END)
+for name in DOMAINS:
+    graph.add_edge(name, END)
+graph.add_edge("multi_domain", END)
 graph.add_edge("fallback", END)
 
 # Compile the entire routing system into an executable graph
-legal_assistant_graph = graph.compile()
+# (never checkpointed itself: sessions keep their state in app/sessions.py)
+legal_assistant_graph = graph.compile(checkpointer=False)
@@ -0,0 +1,161 @@
+# ============================
+# Bulk Question Processing (Batch Mode)
+# ============================
+
+# -------- Standard Library --------
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+
+# -------- JSON encoding of LangChain objects (Documents, AIMessages) --------
+from app.responses import RESPONSE_SHAPE, RESPONSE_SHAPES, dumps, project_response
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Upper bound of questions running through the graph at the same time.
+# Callers can ask for less, never for more (protects the LLM provider quotas).
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+
+# ============================
+# 2. Input Parsing
+# ============================
+
+def parse_questions(lines):
+    """
+    Reads questions from JSONL lines. Each line can be either
+    a JSON object with a "question" field or a JSON string.
+    Blank lines are ignored.
+    """
+    questions = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        questions.append(item["question"] if isinstance(item, dict) else str(item))
+    return questions
+
+
+def resolve_concurrency(requested=None) -> int:
+    """
+    Clamps the requested concurrency to [1, BATCH_MAX_CONCURRENCY].
+    """
+    if not requested:
+        return BATCH_MAX_CONCURRENCY
+    return max(1, min(int(requested), BATCH_MAX_CONCURRENCY))
+
+
+# ============================
+# 3. Run a Batch Through the Graph
+# ============================
+
+async def run_batch(graph, questions, max_concurrency=None, ordered=True, shape=RESPONSE_SHAPE):
+    """
+    Runs every question through the compiled graph using its batch execution
+    (`abatch_as_completed`) with a bounded number of concurrent runs.
+
+    Yields one JSON-ready dict per question:
+    - {"index", "question", "result"} on success (the result in the given response shape)
+    - {"index", "question", "error"} on failure (the rest of the batch keeps running)
+
+    With ordered=True results are yielded in input order, as soon as every
+    previous question is done; otherwise they are yielded as they finish.
+    """
+    inputs = [{"question": question} for question in questions]
+    config = {"max_concurrency": resolve_concurrency(max_concurrency)}
+
+    # Buffer for out-of-order results when ordered=True
+    pending = {}
+    next_index = 0
+
+    async for index, output in graph.abatch_as_completed(
+        inputs, config=config, return_exceptions=True
+    ):
+        item = {"index": index, "question": questions[index]}
+        if isinstance(output, Exception):
+            item["error"] = f"{type(output).__name__}: {output}"
+        else:
+            item["result"] = project_response(output, shape)
+
+        if not ordered:
+            yield item
+            continue
+
+        # Release every result that is now contiguous with what was already sent
+        pending[index] = item
+        while next_index in pending:
+            yield pending.pop(next_index)
+            next_index += 1
+
+
+async def stream_batch_ndjson(graph, questions, max_concurrency=None, ordered=True, shape=RESPONSE_SHAPE):
+    """
+    Same as `run_batch`, but serialized as newline-delimited JSON (one line per result).
+    """
+    async for item in run_batch(graph, questions, max_concurrency, ordered, shape):
+        yield dumps(item).decode("utf-8") + "\n"
+
+
+# ============================
+# 4. Command Line Interface
+# ============================
+
+async def _run_cli(args):
+    # Only the files opened here are closed (never stdin/stdout)
+    with contextlib.ExitStack() as files:
+        source = sys.stdin if args.input == "-" else files.enter_context(open(args.input, encoding="utf-8"))
+        questions = parse_questions(source)
+
+        output = sys.stdout if args.output == "-" else files.enter_context(open(args.output, "w", encoding="utf-8"))
+
+        # Imported here so `--help` works without loading the LLMs and vector stores
+        from app.agents.legal_assistant_agent import legal_assistant_graph
+        from app.cache import ANSWER_CACHE_ENABLED, create_answer_cache
+
+        # Repeated questions inside the batch are answered from the cache
+        graph = legal_assistant_graph
+        if ANSWER_CACHE_ENABLED:
+            graph = create_answer_cache().wrap(legal_assistant_graph)
+
+        async for line in stream_batch_ndjson(
+            graph, questions, args.concurrency, not args.unordered, args.shape
+        ):
+            output.write(line)
+            output.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a batch of legal questions (JSONL) through the legal assistant graph."
+    )
+    parser.add_argument("input", nargs="?", default="-",
+                        help='JSONL file with {"question": ...} objects or strings ("-" for stdin)')
+    parser.add_argument("-o", "--output", default="-",
+                        help='Where to write the JSONL results ("-" for stdout)')
+    parser.add_argument("-c", "--concurrency", type=int, default=None,
+                        help=f"Max questions in flight (default and cap: {BATCH_MAX_CONCURRENCY})")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Write results as they finish instead of in input order")
+    parser.add_argument("--shape", choices=RESPONSE_SHAPES, default=RESPONSE_SHAPE,
+                        help="Retrieved documents in full, as snippets or as citations only")
+    args = parser.parse_args()
+
+    # Logs go to stderr, so they never mix with the JSONL results on stdout
+    from app.telemetry import setup_logging, setup_tracing, shutdown_telemetry
+    setup_logging()
+    setup_tracing()
+    try:
+        asyncio.run(_run_cli(args))
+    finally:
+        shutdown_telemetry()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+# ============================
+# Offline Benchmark Suite
+# ============================
+
+# Measures the hot paths without API keys or a pre-built index:
+#   1. ingestion    → ingest_docs.py throughput on docs/*.pdf (pages/s, chunks/s, tokens/s)
+#   2. retrieval    → retriever latency per mode as the collection grows (synthetic collections)
+#   3. domains      → every domain graph (retrieve → generate) end to end
+#   4. graph        → legal_assistant_graph end to end, one question at a time and concurrently
+#
+# LLMs and embeddings are the deterministic fakes of app/fakes.py, with a
+# configurable latency, and everything is written to a temporary folder.
+# Results are one JSON document (milliseconds, rates per second) that can be
+# kept per commit and compared with --compare.
+#
+# Usage:
+#   PYTHONPATH=. python3 -m app.benchmark -o bench.json
+#   PYTHONPATH=. python3 -m app.benchmark -o new.json --compare bench.json
+#   PYTHONPATH=. python3 -m app.benchmark --only retrieval --sizes 1000,10000 --llm-latency 0.5
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCHMARKS = ("ingestion", "retrieval", "domains", "graph")
+
+# Questions of every domain, a multi-domain one, cited articles and an off-topic one
+QUESTIONS = [
+    "¿Cuánto es el aguinaldo que me corresponde?",
+    "Me despidieron sin causa justificada, ¿qué indemnización me toca?",
+    "¿Qué dice el artículo 47 de la LFT?",
+    "¿Cuántos días de vacaciones tengo al año?",
+    "¿Qué es la usucapión y en cuánto tiempo procede?",
+    "¿Cómo se hace un testamento válido?",
+    "¿Qué pena tiene el robo de un celular?",
+    "¿Qué dice el artículo 386 del Código Penal Federal?",
+    "Me despidieron y además me acusan de robo, ¿qué hago?",
+    "¿Cuál es la capital de Francia?",
+]
+
+
+# ============================
+# 1. Timing Helpers
+# ============================
+
+def _percentile(values, percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percentile / 100), len(ordered) - 1)]
+
+
+def summarize(latencies) -> dict:
+    """
+    Latency statistics in milliseconds.
+    """
+    if not latencies:
+        return {"count": 0}
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        "count": len(milliseconds),
+        "mean_ms": round(sum(milliseconds) / len(milliseconds), 3),
+        "p50_ms": round(_percentile(milliseconds, 50), 3),
+        "p95_ms": round(_percentile(milliseconds, 95), 3),
+        "p99_ms": round(_percentile(milliseconds, 99), 3),
+        "min_ms": round(min(milliseconds), 3),
+        "max_ms": round(max(milliseconds), 3),
+    }
+
+
+async def time_calls(call, inputs, repeat: int) -> dict:
+    """
+    Awaits `call(input)` for every input, `repeat` times, one at a time.
+    The first call is reported apart (cold start: lazy clients, indexes, graphs).
+    """
+    start = time.perf_counter()
+    await call(inputs[0])
+    first_call = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            await call(item)
+            latencies.append(time.perf_counter() - start)
+    return {"first_call_ms": round(first_call * 1000, 3), **summarize(latencies)}
+
+
+async def time_concurrent(call, inputs, concurrency: int) -> dict:
+    """
+    Throughput of `call` over all the inputs with at most `concurrency` in flight.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run(item):
+        async with semaphore:
+            start = time.perf_counter()
+            await call(item)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(item) for item in inputs))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(inputs) / elapsed, 3),
+        **summarize(latencies),
+    }
+
+
+# ============================
+# 2. Benchmarks
+# ============================
+
+def bench_ingestion(docs_dir: str, index_dir: str, streaming: bool = False) -> dict:
+    """
+    Indexes docs_dir from scratch into index_dir with the ingestion pipeline.
+    """
+    from app.vectorstore.ingest_docs import IngestionPipeline
+    from app.vectorstore.retrievers import embedding_signature, get_embeddings
+
+    pipeline = IngestionPipeline(docs_dir=docs_dir, index_dir=index_dir, embeddings=get_embeddings(),
+                                 signature=embedding_signature())
+    start = time.perf_counter()
+    # The pipeline reports its progress with print(): keep stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        pipeline.run_streaming() if streaming else pipeline.run()
+    elapsed = time.perf_counter() - start
+    return {
+        **pipeline.stats,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pipeline.stats["pages"] / elapsed, 3),
+        "chunks_per_second": round(pipeline.stats["chunks"] / elapsed, 3),
+        "tokens_per_second": round(pipeline.stats["tokens"] / elapsed, 3),
+    }
+
+
+def corpus_chunks():
+    """
+    Text and metadata of every chunk of the served collections (source of the synthetic ones).
+    """
+    from app.agents.domains import DOMAINS
+    from app.vectorstore.retrievers import get_vector_store
+
+    texts, metadatas = [], []
+    for domain in DOMAINS.values():
+        data = get_vector_store(domain.collection).get(include=["documents", "metadatas"])
+        texts.extend(data["documents"])
+        metadatas.extend(metadata or {} for metadata in data["metadatas"])
+    return texts, metadatas
+
+
+def build_synthetic_collection(name: str, size: int, texts, metadatas, directory: str) -> float:
+    """
+    Writes a collection of `size` chunks (the corpus repeated, tagged per copy) with
+    its BM25 index; returns the seconds it took.
+    """
+    from app.vectorstore.index_metadata import INDEX_PATHS, mark_index_updated, save_embedding_signature
+    from app.vectorstore.ingest_docs import open_collection
+    from app.vectorstore.lexical import build_lexical_index
+    from app.vectorstore.retrievers import embedding_signature, get_embeddings
+
+    start = time.perf_counter()
+    persist_directory = os.path.join(directory, name, "")
+    INDEX_PATHS[name] = persist_directory
+    collection = open_collection(directory, name)
+    embeddings = get_embeddings()
+    for offset in range(0, size, 1000):
+        numbers = range(offset, min(offset + 1000, size))
+        batch = [texts[number % len(texts)] + (f" [{number // len(texts)}]" if number >= len(texts) else "")
+                 for number in numbers]
+        collection.upsert(
+            ids=[f"{name}-{number}" for number in numbers],
+            embeddings=embeddings.embed_documents(batch),
+            documents=batch,
+            metadatas=[metadatas[number % len(texts)] or None for number in numbers],
+        )
+    build_lexical_index(persist_directory, collection)
+    save_embedding_signature(persist_directory, embedding_signature())
+    mark_index_updated(persist_directory)
+    return time.perf_counter() - start
+
+
+async def bench_retrieval(sizes, modes, questions, repeat: int, directory: str) -> dict:
+    from app.vectorstore.retrievers import ArticleAwareRetriever, release_collection
+
+    texts, metadatas = corpus_chunks()
+    results = {}
+    for size in sizes:
+        name = f"bench_{size}"
+        results[str(size)] = {"build_seconds": round(build_synthetic_collection(name, size, texts, metadatas, directory), 3)}
+        for mode in modes:
+            retriever = ArticleAwareRetriever(collection_name=name, mode=mode)
+            results[str(size)][mode] = await time_calls(retriever.ainvoke, questions, repeat)
+        release_collection(name)
+        print(f"retrieval {size}: {json.dumps(results[str(size)])}", file=sys.stderr)
+    return results
+
+
+async def bench_domains(questions, repeat: int) -> dict:
+    from app.agents.domains import DOMAINS
+    from app.agents.domain_agent import get_domain_agent
+
+    results = {}
+    for name in DOMAINS:
+        agent = get_domain_agent(name)
+        results[name] = await time_calls(lambda question: agent.ainvoke({"question": question}), questions, repeat)
+        print(f"domain {name}: {json.dumps(results[name])}", file=sys.stderr)
+    return results
+
+
+async def bench_graph(questions, repeat: int, concurrency: int) -> dict:
+    from app.agents.legal_assistant_agent import legal_assistant_graph
+
+    async def ask(question):
+        return await legal_assistant_graph.ainvoke({"question": question})
+
+    results = {
+        "sequential": await time_calls(ask, questions, repeat),
+        "concurrent": await time_concurrent(ask, questions * repeat, concurrency),
+    }
+    print(f"graph: {json.dumps(results)}", file=sys.stderr)
+    return results
+
+
+# ============================
+# 3. Results
+# ============================
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# Values compared by --compare, and whether higher is better
+COMPARED = {"p50_ms": False, "p95_ms": False, "mean_ms": False, "per_second": True,
+            "pages_per_second": True, "chunks_per_second": True, "tokens_per_second": True}
+
+
+def _flatten(results: dict, prefix: str = ""):
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        elif key in COMPARED and isinstance(value, (int, float)):
+            yield path, key, value
+
+
+def compare(current: dict, baseline: dict) -> list:
+    """
+    One line per metric present in both result files: baseline → current (change, better/worse).
+    """
+    previous = {path: value for path, _, value in _flatten(baseline.get("results", {}))}
+    lines = []
+    for path, key, value in _flatten(current.get("results", {})):
+        if not previous.get(path):
+            continue
+        change = (value - previous[path]) / previous[path] * 100
+        better = change > 0 if COMPARED[key] else change < 0
+        verdict = "better" if better and abs(change) >= 5 else "worse" if abs(change) >= 5 else "same"
+        lines.append(f"{path}: {previous[path]} → {value} ({change:+.1f}%, {verdict})")
+    return lines
+
+
+# ============================
+# 4. Command Line Interface
+# ============================
+
+async def run(args, index_dir: str, work_dir: str) -> dict:
+    questions = QUESTIONS[:args.questions]
+    results = {}
+    if "ingestion" in args.only:
+        results["ingestion"] = {"pool": bench_ingestion(args.docs, os.path.join(work_dir, "index"))}
+        if args.ingest_streaming:
+            results["ingestion"]["streaming"] = bench_ingestion(
+                args.docs, os.path.join(work_dir, "index_streaming"), streaming=True)
+        print(f"ingestion: {json.dumps(results['ingestion'])}", file=sys.stderr)
+    if "retrieval" in args.only:
+        results["retrieval"] = await bench_retrieval(args.sizes, args.modes, questions, args.repeat,
+                                                     os.path.join(work_dir, "synthetic"))
+    if "domains" in args.only:
+        results["domains"] = await bench_domains(questions, args.repeat)
+    if "graph" in args.only:
+        results["graph"] = await bench_graph(questions, args.repeat, args.concurrency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the legal assistant (fake LLMs and embeddings).")
+    parser.add_argument("-o", "--output", default="-", help='Where to write the JSON results ("-" for stdout)')
+    parser.add_argument("--compare", default=None, help="Previous results file to compare against")
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help=f"Comma-separated benchmarks to run (default: {','.join(BENCHMARKS)})")
+    parser.add_argument("--docs", default=os.path.join(ROOT_DIR, "docs"), help="PDFs to ingest (docs/<collection>/)")
+    parser.add_argument("--index", default=None,
+                        help="Existing index to serve instead of the one built by the ingestion benchmark "
+                             "(must have been built with EMBEDDING_BACKEND=fake)")
+    parser.add_argument("--ingest-streaming", action="store_true", help="Also measure the --streaming ingestion")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Chunks of the synthetic retrieval collections")
+    parser.add_argument("--modes", default="lexical,dense,hybrid", help="Retrieval modes to measure")
+    parser.add_argument("--questions", type=int, default=len(QUESTIONS), help="How many of the built-in questions to use")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the questions per measurement")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions in flight in the concurrent graph run")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per fake LLM call")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per fake embedding call")
+    parser.add_argument("--embedding-cache", action="store_true", help="Keep the embedding cache on (off by default)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary folder (indexes) when done")
+    args = parser.parse_args()
+    args.only = [name.strip() for name in args.only.split(",") if name.strip()]
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    if "ingestion" not in args.only and args.index is None:
+        parser.error("Without the ingestion benchmark, --index must point to an existing index")
+
+    # Configuration is read from the environment when the app modules are imported,
+    # so it is set before importing any of them. Importing the `app` package has
+    # already applied .env (app/config.py): undo it, so the results only depend on
+    # the settings below and the shell environment
+    from app.config import ignore_dotenv
+    ignore_dotenv()
+
+    work_dir = tempfile.mkdtemp(prefix="legal-benchmark-")
+    index_dir = args.index or os.path.join(work_dir, "index")
+    settings = {
+        "LLM_PROVIDERS": "fake",
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_EMBEDDING_LATENCY": str(args.embedding_latency),
+        "EMBEDDING_CACHE_ENABLED": "true" if args.embedding_cache else "false",
+        "EMBEDDING_CACHE_PATH": os.path.join(work_dir, "embedding_cache.sqlite3"),
+        "INDEX_DIR": index_dir,
+        "CHROMA_TELEMETRY": "FALSE",
+    }
+    os.environ.update(settings)
+
+    try:
+        output = {
+            "environment": environment(),
+            "settings": {**settings, "questions": args.questions, "repeat": args.repeat,
+                         "concurrency": args.concurrency,
+                         "RETRIEVAL_MODE": os.getenv("RETRIEVAL_MODE", "hybrid")},
+            "results": asyncio.run(run(args, index_dir, work_dir)),
+        }
+    finally:
+        if args.keep:
+            print(f"Indexes kept in {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(output, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline.get('environment', {}).get('commit')}:", file=sys.stderr)
+        for line in compare(output, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
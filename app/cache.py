@@ -0,0 +1,318 @@
+# ============================
+# Semantic Answer Cache (in front of legal_assistant_graph)
+# ============================
+
+# -------- Standard Library --------
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+# -------- Numerical computing (cosine similarity) --------
+import numpy as np
+
+# -------- LangChain runnable wrapper --------
+from langchain_core.runnables import RunnableLambda
+
+# -------- Index version markers (cache invalidation on re-index) --------
+from app.vectorstore.index_metadata import cached_index_version, index_path
+
+# -------- Article citations ("artículo 47") --------
+from app.vectorstore.articles import find_citations
+
+# -------- Domain registry (category → collection) --------
+from app.agents.domains import domain_for_category
+
+# -------- Prometheus metrics --------
+from app.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Turn the cache on/off without code changes
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+
+# Max number of cached answers (least recently used ones are evicted first)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# Cosine similarity needed to reuse the answer of a differently phrased question
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+# Default time-to-live of an answer, in seconds
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+# Per-category TTLs as JSON, e.g. {"Derecho Laboral": 86400, "General": 600}
+ANSWER_CACHE_CATEGORY_TTLS = json.loads(os.getenv("ANSWER_CACHE_CATEGORY_TTLS", "{}"))
+
+
+# ============================
+# 2. Question Normalization
+# ============================
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercases, strips accents and punctuation (¿?¡!) and collapses whitespace,
+    so "¿Cuánto es el aguinaldo?" and "cuanto es el aguinaldo" share a key.
+    """
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def collection_version(category: Optional[str]):
+    """
+    Current index version of the collection behind a category
+    (None for categories that are not grounded on an index, like "General").
+    """
+    # Category returned by the graph → Chroma collection that grounded the answer
+    domain = domain_for_category(category)
+    if domain is None:
+        return None
+    # Re-read from disk at most every INDEX_VERSION_TTL seconds
+    return cached_index_version(index_path(domain.collection))
+
+
+def answer_version(categories) -> tuple:
+    """
+    Index versions of every collection an answer was grounded on
+    (several for questions spanning more than one area of law).
+    """
+    return tuple(collection_version(category) for category in categories)
+
+
+# ============================
+# 3. Cache Entry
+# ============================
+
+@dataclass
+class CacheEntry:
+    question: str                 # Normalized question (exact lookup key)
+    response: dict                # Final state returned by the graph
+    category: Optional[str]       # Category detected for the question
+    categories: tuple             # Every category whose articles grounded the answer
+    vector: Optional[np.ndarray]  # Normalized embedding of the question (None: exact lookups only)
+    expires_at: float             # Monotonic time after which the entry is stale
+    index_version: tuple          # Collection versions the answer was grounded on
+    hits: int = field(default=0)
+
+
+# ============================
+# 4. Answer Cache
+# ============================
+
+class AnswerCache:
+    """
+    Three-level answer cache:
+    1. Exact lookup on the normalized question.
+    2. Semantic lookup: cosine similarity between question embeddings >= threshold.
+    3. Per-category TTL and LRU eviction once `max_entries` is reached.
+
+    Entries are dropped when the collection that grounded them is re-indexed.
+
+    `embeddings` can be an embedding model or a zero-argument function returning
+    one, resolved on the first semantic lookup (keeps startup lazy).
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+        default_ttl: float = ANSWER_CACHE_TTL,
+        category_ttls: Optional[dict] = None,
+    ):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.default_ttl = default_ttl
+        self.category_ttls = dict(ANSWER_CACHE_CATEGORY_TTLS if category_ttls is None else category_ttls)
+
+        # Insertion/usage ordered: first item = least recently used
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+        # Stacked embeddings of all entries, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_keys = []
+
+        self.counters = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    # -------- Internal helpers --------
+
+    def _ttl(self, category: Optional[str]) -> float:
+        return float(self.category_ttls.get(category, self.default_ttl))
+
+    def _remove(self, key: str, counter: str):
+        self._entries.pop(key, None)
+        self._matrix = None
+        self.counters[counter] += 1
+
+    def _is_valid(self, key: str, entry: CacheEntry) -> bool:
+        # Drops the entry (and returns False) if it expired or its index changed
+        if time.monotonic() >= entry.expires_at:
+            self._remove(key, "expirations")
+            return False
+        if entry.index_version != answer_version(entry.categories):
+            self._remove(key, "invalidations")
+            return False
+        return True
+
+    def _hit(self, key: str, entry: CacheEntry, counter: str) -> dict:
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.counters[counter] += 1
+        CACHE_LOOKUPS.inc(cache="answer", result=counter[:-1])
+        # Copy so callers can't mutate the cached state
+        return dict(entry.response)
+
+    async def _embed(self, question: str):
+        if self.embeddings is None:
+            return None
+        try:
+            if callable(self.embeddings):
+                self.embeddings = self.embeddings()
+            vector = np.asarray(await self.embeddings.aembed_query(question), dtype=np.float32)
+        except Exception as e:
+            if callable(self.embeddings):
+                # The embedding model can't be built (no API key, missing package,
+                # model that won't load): remember it and keep to exact matches
+                self.embeddings = None
+            # Embedding provider down: only exact matches until it comes back
+            logger.warning("Semantic cache unavailable, exact matches only: %r", e)
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _nearest(self, vector):
+        # Returns (key, similarity) of the most similar cached question
+        if self._matrix is None:
+            self._matrix_keys = [key for key, entry in self._entries.items() if entry.vector is not None]
+            if not self._matrix_keys:
+                return None, 0.0
+            self._matrix = np.stack([self._entries[key].vector for key in self._matrix_keys])
+        if not self._matrix_keys:
+            return None, 0.0
+        similarities = self._matrix @ vector
+        best = int(np.argmax(similarities))
+        return self._matrix_keys[best], float(similarities[best])
+
+    # -------- Public API --------
+
+    async def alookup(self, question: str):
+        """
+        Returns (cached_response or None, question_vector).
+        The vector is returned so a following `astore` doesn't embed twice.
+        """
+        key = normalize_question(question)
+
+        # Level 1: exact match on the normalized question
+        entry = self._entries.get(key)
+        if entry is not None and self._is_valid(key, entry):
+            return self._hit(key, entry, "exact_hits"), entry.vector
+
+        # Level 2: semantic match on the question embedding. Questions citing articles
+        # are matched exactly only: "artículo 47" and "artículo 48" embed almost the
+        # same, and their answers are stored without a vector for the same reason
+        vector = None if find_citations(question) else await self._embed(question)
+        if vector is not None:
+            while True:
+                nearest_key, similarity = self._nearest(vector)
+                if nearest_key is None or similarity < self.similarity_threshold:
+                    break
+                nearest = self._entries[nearest_key]
+                if self._is_valid(nearest_key, nearest):
+                    return self._hit(nearest_key, nearest, "semantic_hits"), vector
+                # The best match was stale and got dropped: try the next best
+
+        self.counters["misses"] += 1
+        CACHE_LOOKUPS.inc(cache="answer", result="miss")
+        return None, vector
+
+    def store(self, question: str, response: dict, vector=None):
+        """
+        Caches the final graph state of a question.
+        """
+        key = normalize_question(question)
+        category = response.get("category")
+        categories = tuple(response.get("categories") or [category])
+        self._entries[key] = CacheEntry(
+            question=key,
+            response=dict(response),
+            category=category,
+            categories=categories,
+            vector=vector,
+            expires_at=time.monotonic() + self._ttl(category),
+            index_version=answer_version(categories),
+        )
+        self._entries.move_to_end(key)
+        self._matrix = None
+
+        # Level 3: size-bounded LRU eviction
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key, "evictions")
+
+    def invalidate(self, category: Optional[str] = None):
+        """
+        Drops every entry (or only the entries of one category).
+        """
+        for key in [k for k, e in self._entries.items() if category is None or e.category == category]:
+            self._remove(key, "invalidations")
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters plus the current size of the cache.
+        """
+        lookups = self.counters["exact_hits"] + self.counters["semantic_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def wrap(self, graph):
+        """
+        Returns a runnable with the same input/output as `graph` that answers
+        from the cache when possible (supports `ainvoke`, `abatch`, `abatch_as_completed`).
+        """
+        async def cached_ainvoke(state: dict, config=None):
+            question = state["question"]
+            cached, vector = await self.alookup(question)
+            if cached is not None:
+                return cached
+            response = await graph.ainvoke(state, config)
+            self.store(question, response, vector)
+            return response
+
+        return RunnableLambda(cached_ainvoke, name="cached_legal_assistant")
+
+
+# ============================
+# 5. Shared Cache Instance
+# ============================
+
+def create_answer_cache():
+    """
+    Builds the process-wide answer cache, reusing the retrievers' embedding model.
+    With RETRIEVAL_MODE=lexical nothing else embeds, so the cache keeps to exact
+    matches and the whole pipeline runs without an embedding model.
+    """
+    from app.vectorstore.retrievers import RETRIEVAL_MODE, get_embeddings
+    return AnswerCache(embeddings=None if RETRIEVAL_MODE == "lexical" else get_embeddings)
@@ -0,0 +1,179 @@
+# ============================
+# Single-Flight Request Coalescing
+# ============================
+
+# When a new reform comes out, many users ask the same thing within seconds.
+# Identical questions that arrive while one is still being answered don't start
+# their own classify → retrieve → generate run: they attach to the one in flight
+# and all get its result (or, for /chat/stream, its token stream from the start).
+#
+# Requests are identical when their normalized question (see app/cache.py) and
+# their category (when the caller already knows it) match. Once the run is over
+# the flight is gone; later repeats are served by the answer cache.
+
+# -------- Standard Library --------
+import asyncio
+import logging
+import os
+from typing import Optional
+
+# -------- LangChain runnable wrapper --------
+from langchain_core.runnables import RunnableLambda
+
+# -------- Same normalization as the answer cache --------
+from app.cache import normalize_question
+
+# -------- Prometheus metrics --------
+from app.metrics import COALESCED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+COALESCING_ENABLED = os.getenv("COALESCING_ENABLED", "true").lower() == "true"
+
+
+def flight_key(question: str, category: Optional[str] = None) -> tuple:
+    return normalize_question(question), category
+
+
+# ============================
+# 2. One Result, Many Waiters
+# ============================
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamFlight:
+    """
+    Items of a running async generator, kept so late subscribers replay them
+    from the start and then follow the live ones.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._updated = asyncio.Event()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def pump(self, source):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._updated.wait()
+
+
+class SingleFlight:
+    """
+    Runs each key at most once at a time; concurrent callers with the same key share the run.
+    The run is cancelled only when every caller waiting for it has gone away.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._streams = {}
+
+    async def run(self, key, factory):
+        """
+        Awaits `factory()` (a coroutine function), or the run already in flight for `key`.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._forget(self._flights, key, flight))
+        else:
+            COALESCED_REQUESTS.inc(kind="invoke")
+            logger.info("Attached to an identical request in flight")
+
+        flight.waiters += 1
+        try:
+            # Shielded: one caller going away doesn't cancel the run of the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._forget(self._flights, key, flight)
+                flight.task.cancel()
+
+    async def stream(self, key, factory):
+        """
+        Yields the items of `factory()` (an async generator function), or of the
+        generator already in flight for `key`, from its first item.
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            flight.task = asyncio.ensure_future(flight.pump(factory()))
+            self._streams[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._forget(self._streams, key, flight))
+        else:
+            COALESCED_REQUESTS.inc(kind="stream")
+            logger.info("Attached to an identical stream in flight")
+
+        flight.subscribers += 1
+        try:
+            async for item in flight.subscribe():
+                yield item
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.task.done():
+                self._forget(self._streams, key, flight)
+                flight.task.cancel()
+
+    @staticmethod
+    def _forget(flights: dict, key, flight):
+        # A finished run must not be joined by new requests (they go to the cache instead)
+        if flights.get(key) is flight:
+            del flights[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "streams_in_flight": len(self._streams)}
+
+
+single_flight = SingleFlight()
+
+
+# ============================
+# 3. Coalesced Graph
+# ============================
+
+def coalesce(graph, flights: SingleFlight = single_flight):
+    """
+    Returns a runnable with the same input/output as `graph` whose identical
+    concurrent calls share one run (supports `ainvoke`, `abatch`, `abatch_as_completed`).
+    """
+    async def coalesced_ainvoke(state: dict, config=None):
+        key = flight_key(state["question"], state.get("category"))
+        return await flights.run(key, lambda: graph.ainvoke(state, config))
+
+    return RunnableLambda(coalesced_ainvoke, name="coalesced_legal_assistant")
@@ -0,0 +1,34 @@
+# ============================
+# Environment Variables (.env)
+# ============================
+
+# Every module reads its settings with os.getenv when it is imported
+# (ANSWER_CACHE_*, LLM_PROVIDERS, RATE_LIMIT, SESSION_*, ...), so the `.env`
+# file has to be loaded before the first of them. The `app` package imports
+# this module first (app/__init__.py), which covers the API server, the batch
+# CLI and the ingestion script alike.
+
+# -------- Standard Library --------
+import os
+
+# -------- Environment Variable Loader --------
+from dotenv import find_dotenv, load_dotenv
+
+# `.env` of the working directory (or its parents), else the one of the project root
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOTENV_PATH = find_dotenv(usecwd=True) or os.path.join(_ROOT_DIR, ".env")
+
+# Environment as it was before `.env` was applied (see ignore_dotenv)
+_ENVIRONMENT_WITHOUT_DOTENV = dict(os.environ)
+
+# Values in `.env` take precedence over the ones already in the environment
+load_dotenv(DOTENV_PATH, override=True)
+
+
+def ignore_dotenv():
+    """
+    Undoes the `.env` load, for tools whose results must not depend on it
+    (app/benchmark.py). Only effective before any other module of the package is imported.
+    """
+    os.environ.clear()
+    os.environ.update(_ENVIRONMENT_WITHOUT_DOTENV)
@@ -0,0 +1,166 @@
+# ============================
+# Token-Budgeted Context Packer (retrieved articles → prompt context)
+# ============================
+
+# The retrieved chunks overlap by 200 characters and their Python repr carries
+# metadata the LLM doesn't need. Packing keeps clean text plus a short citation,
+# merges chunks of the same page or article, drops repeated text and stops at a
+# token budget, so every request sends fewer prompt tokens.
+
+# -------- Standard Library --------
+import os
+from dataclasses import dataclass, field
+
+# -------- Token counting (tiktoken) --------
+from app.tokens import count_tokens, truncate_to_tokens
+
+# -------- Page headers of the law PDFs --------
+from app.vectorstore.articles import law_code, strip_page_header
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Max tokens of context sent to the LLM per request
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Longest overlap searched between two consecutive chunks (splitter overlap + margin)
+MAX_OVERLAP = 400
+
+# A truncated last section must keep at least this many tokens to be worth sending
+MIN_SECTION_TOKENS = 50
+
+
+# ============================
+# 2. Packing Result
+# ============================
+
+@dataclass
+class PackedContext:
+    text: str                 # Context to put in the prompt
+    tokens: int               # Tokens of `text`
+    raw_tokens: int           # Tokens the raw list of Documents would have used
+    sections: int             # Cited sections included
+    dropped: int = field(default=0)  # Sections left out by the budget
+
+    @property
+    def saved(self) -> int:
+        return max(self.raw_tokens - self.tokens, 0)
+
+    def stats(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "raw_tokens": self.raw_tokens,
+            "saved_tokens": self.saved,
+            "sections": self.sections,
+            "dropped_sections": self.dropped,
+        }
+
+
+# ============================
+# 3. Text Helpers
+# ============================
+
+def clean_text(text: str) -> str:
+    # Drops the repeated PDF page header and collapses whitespace / line breaks
+    return " ".join(strip_page_header(text).split())
+
+
+def citation(metadata: dict) -> str:
+    """
+    Short citation of a chunk: "LFT, art. 47, p. 21" or "LFT, p. 21".
+    """
+    parts = [law_code(str(metadata.get("source", "")))]
+    if metadata.get("article"):
+        parts.append(f"art. {metadata['article']}")
+    page = metadata.get("page")
+    if isinstance(page, int):
+        parts.append(f"p. {page + 1}")
+    return ", ".join(parts)
+
+
+def merge_overlapping(first: str, second: str):
+    """
+    Joins two pieces of the same page if one continues the other (the splitter
+    repeats up to 200 characters), or if one already contains the other.
+    Returns None when they are not contiguous.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    for left, right in ((first, second), (second, first)):
+        # Longest suffix of `left` that is a prefix of `right`
+        start = max(len(left) - MAX_OVERLAP, 0)
+        position = left.find(right[:20], start)
+        while position != -1:
+            if right.startswith(left[position:]):
+                return left + right[len(left) - position:]
+            position = left.find(right[:20], position + 1)
+    return None
+
+
+# ============================
+# 4. Packing
+# ============================
+
+def _section_key(metadata: dict):
+    # Article documents are whole units; chunks are grouped by page
+    if metadata.get("article"):
+        return ("article", metadata.get("source"), metadata["article"])
+    return ("page", metadata.get("source"), metadata.get("page"))
+
+
+def pack_context(documents, budget: int = CONTEXT_TOKEN_BUDGET) -> PackedContext:
+    """
+    Packs retrieved Documents (most relevant first) into a numbered, cited context
+    of at most `budget` tokens.
+    """
+    documents = list(documents or [])
+    raw_tokens = count_tokens(str(documents))
+
+    # Sections in order of first appearance (= relevance), each a list of pieces
+    sections = {}
+    for document in documents:
+        metadata = getattr(document, "metadata", {}) or {}
+        text = clean_text(getattr(document, "page_content", str(document)))
+        if not text:
+            continue
+        _, pieces = sections.setdefault(_section_key(metadata), (metadata, []))
+        for number, piece in enumerate(pieces):
+            merged = merge_overlapping(piece, text)
+            if merged is not None:
+                pieces[number] = merged
+                break
+        else:
+            pieces.append(text)
+
+    # The same text can still appear in two sections (article + the chunk it came from)
+    seen = []
+    blocks = []
+    for metadata, pieces in sections.values():
+        body = " […] ".join(piece for piece in pieces if not any(piece in other for other in seen))
+        seen.extend(pieces)
+        if body:
+            blocks.append((citation(metadata), body))
+
+    # Fill the budget in relevance order
+    parts, used, dropped = [], 0, 0
+    for citation_text, body in blocks:
+        block = f"[{len(parts) + 1}] {citation_text}\n{body}"
+        tokens = count_tokens(block) + 1
+        if used + tokens > budget:
+            # Header, separator and the " […]" marker also count
+            remaining = budget - used - count_tokens(f"[{len(parts) + 1}] {citation_text}\n") - 4
+            if remaining < MIN_SECTION_TOKENS:
+                dropped += 1
+                continue
+            block = f"[{len(parts) + 1}] {citation_text}\n{truncate_to_tokens(body, remaining)} […]"
+            tokens = count_tokens(block) + 1
+        parts.append(block)
+        used += tokens
+
+    text = "\n\n".join(parts)
+    return PackedContext(text=text, tokens=count_tokens(text), raw_tokens=raw_tokens,
+                         sections=len(parts), dropped=dropped)
@@ -0,0 +1,175 @@
+# ============================
+# Offline Fakes (deterministic LLM + embeddings, no API keys)
+# ============================
+
+# Stand-ins for the LLM providers and the embedding model, selected with
+# LLM_PROVIDERS=fake and EMBEDDING_BACKEND=fake. Same input → same output,
+# with a configurable latency, so the benchmarks (app/benchmark.py) measure
+# our own code paths and not the network.
+
+# -------- Standard Library --------
+import asyncio
+import hashlib
+import os
+import re
+import time
+import zlib
+from typing import Any, List, Optional
+
+# -------- LangChain chat model / embeddings interfaces --------
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Seconds per LLM call (spread over the tokens when streaming) and words per answer
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.0"))
+FAKE_LLM_ANSWER_WORDS = int(os.getenv("FAKE_LLM_ANSWER_WORDS", "80"))
+
+# Seconds per embedding call (one batch or one query) and vector size
+FAKE_EMBEDDING_LATENCY = float(os.getenv("FAKE_EMBEDDING_LATENCY", "0.0"))
+FAKE_EMBEDDING_SIZE = int(os.getenv("FAKE_EMBEDDING_SIZE", "256"))
+
+# Words the fake answers are made of
+_VOCABULARY = (
+    "el trabajador tiene derecho a una indemnización conforme al artículo de la ley "
+    "y el patrón deberá pagar el salario las prestaciones y el aguinaldo en los plazos "
+    "que establece el código por lo que se recomienda acudir ante la autoridad competente"
+).split()
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def _prompt_text(input) -> str:
+    # Prompt values, message lists and plain strings all end up as one string
+    if hasattr(input, "to_string"):
+        return input.to_string()
+    if isinstance(input, list):
+        return "\n".join(str(getattr(message, "content", message)) for message in input)
+    return str(input)
+
+
+# ============================
+# 2. Fake Chat Model
+# ============================
+
+def fake_answer(prompt: str, words: int = FAKE_LLM_ANSWER_WORDS) -> str:
+    seed = _seed(prompt)
+    return " ".join(_VOCABULARY[(seed + number * 7) % len(_VOCABULARY)] for number in range(words))
+
+
+def fake_structured_output(schema, prompt: str):
+    """
+    Instance of a pydantic `schema` whose enum fields are picked from the prompt's hash
+    (e.g. the classifier's category); lists are left empty and other strings blank.
+    """
+    seed = _seed(prompt)
+    values = {}
+    for name, field in schema.model_json_schema().get("properties", {}).items():
+        if "enum" in field:
+            values[name] = field["enum"][seed % len(field["enum"])]
+        elif field.get("type") == "array":
+            values[name] = []
+        elif field.get("type") == "string":
+            values[name] = ""
+    return schema(**values)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model: answers are built from the prompt's hash after `latency` seconds.
+    """
+
+    latency: float = FAKE_LLM_LATENCY
+    answer_words: int = FAKE_LLM_ANSWER_WORDS
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _result(self, messages) -> ChatResult:
+        prompt = _prompt_text(messages)
+        answer = fake_answer(prompt, self.answer_words)
+        usage = {"input_tokens": len(prompt.split()), "output_tokens": self.answer_words,
+                 "total_tokens": len(prompt.split()) + self.answer_words}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer, usage_metadata=usage))])
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        words = fake_answer(_prompt_text(messages), self.answer_words).split(" ")
+        for number, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if number == 0 else " " + word))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs):
+        def classify(input):
+            time.sleep(self.latency)
+            return fake_structured_output(schema, _prompt_text(input))
+
+        async def aclassify(input):
+            await asyncio.sleep(self.latency)
+            return fake_structured_output(schema, _prompt_text(input))
+
+        return RunnableLambda(classify, afunc=aclassify)
+
+
+# ============================
+# 3. Fake Embeddings
+# ============================
+
+_WORD = re.compile(r"\w+")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words vectors (L2-normalized): texts sharing words are close,
+    so retrieval results stay meaningful without a model.
+    """
+
+    def __init__(self, size: int = FAKE_EMBEDDING_SIZE, latency: float = FAKE_EMBEDDING_LATENCY):
+        self.size = size
+        self.latency = latency
+        self.model = f"fake-hash-{size}"
+        self.dimension = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in _WORD.findall(text.lower()):
+            bucket = zlib.crc32(word.encode("utf-8"))
+            vector[bucket % self.size] += 1.0 if bucket & 1 << 31 else -1.0
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self._embed(text)
@@ -2,11 +2,11 @@
 # Multi-Provider LLM Fallback Setup
 # ============================
 
-# Import LLM wrappers from different providers via LangChain integrations
-from langchain_openai import ChatOpenAI                      # OpenAI's GPT models
-from langchain_anthropic import ChatAnthropic               # Anthropic's Claude models
-from langchain_google_genai import ChatGoogleGenerativeAI   # Google's Gemini models
-from langchain_ollama.chat_models import ChatOllama         # Local Ollama-hosted models
+# Every client is built lazily, the first time it is needed:
+# importing this module has no side effects, doesn't import the provider SDKs
+# and doesn't fail when a provider is unreachable or its API key is missing.
+import os
+from functools import lru_cache
 
 
 # ============================
@@ -14,7 +14,12 @@ from langchain_ollama.chat_models import ChatOllama         # Local Ollama-hoste
 # ============================
 
 # This is the default model the system will try first
-openai_llm = ChatOpenAI(model="gpt-4o-mini")
+@lru_cache(maxsize=None)
+def get_openai_llm():
+    from langchain_openai import ChatOpenAI                      # OpenAI's GPT models
+    # stream_usage: streamed answers (/chat/stream) also report their token usage
+    # (Anthropic, Google and Ollama report it while streaming by default)
+    return ChatOpenAI(model="gpt-4o-mini", stream_usage=True)
 
 
 # ============================
@@ -24,23 +29,53 @@ openai_llm = ChatOpenAI(model="gpt-4o-mini")
 # If the primary LLM fails or times out, these will be tried in order
 
 # Claude 3 Opus by Anthropic (high-quality reasoning)
-anthropic_llm = ChatAnthropic(model="claude-3-opus-20240229")
+@lru_cache(maxsize=None)
+def get_anthropic_llm():
+    from langchain_anthropic import ChatAnthropic               # Anthropic's Claude models
+    return ChatAnthropic(model="claude-3-opus-20240229")
+
 
 # Gemini 2.0 Flash by Google (fast, lightweight)
-google_llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+@lru_cache(maxsize=None)
+def get_google_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI   # Google's Gemini models
+    return ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+
 
 # LLaMA 3 model via Ollama (runs locally, no API key needed)
-ollama_llm = ChatOllama(model="llama3.2:1b")
+@lru_cache(maxsize=None)
+def get_ollama_llm():
+    from langchain_ollama.chat_models import ChatOllama         # Local Ollama-hosted models
+    return ChatOllama(model="llama3.2:1b")
+
+
+# Deterministic offline model with configurable latency (benchmarks, no API key)
+@lru_cache(maxsize=None)
+def get_fake_llm():
+    from app.fakes import FakeChatModel
+    return FakeChatModel()
 
 
 # ============================
-# 3. Combine Models with Fallbacks
+# 3. Combine Models in a Provider Router
 # ============================
 
-# `with_fallbacks` allows you to chain models together:
-# If one fails, the next one is automatically tried.
-fallback_llm = openai_llm.with_fallbacks([
-    google_llm,        # Try Gemini if OpenAI fails
-    anthropic_llm,     # Try Claude if Gemini fails
-    ollama_llm         # Finally, fall back to local LLaMA
-])
+# Providers by name, tried in the LLM_PROVIDERS order (comma-separated)
+PROVIDERS = {
+    "openai": get_openai_llm,        # Primary model
+    "google": get_google_llm,        # Try Gemini if OpenAI fails or is slow
+    "anthropic": get_anthropic_llm,  # Try Claude if Gemini fails or is slow
+    "ollama": get_ollama_llm,        # Finally, fall back to local LLaMA
+    "fake": get_fake_llm,            # Offline only (LLM_PROVIDERS=fake), never a default
+}
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "openai,google,anthropic,ollama").split(",")
+                 if name.strip()]
+
+
+# Like `with_fallbacks` (if one fails, the next one is tried), plus hedged requests
+# to the next provider when one is slow, circuit breakers on failing providers and
+# ordering by measured latency (see provider_router.py)
+@lru_cache(maxsize=None)
+def get_fallback_llm():
+    from app.provider_router import ProviderRouter
+    return ProviderRouter([(name, PROVIDERS[name]) for name in LLM_PROVIDERS])
@@ -0,0 +1,205 @@
+# ============================
+# Local Fast-Path Classifier (TF-IDF centroids over the indexed laws)
+# ============================
+
+# -------- Standard Library --------
+import asyncio
+import math
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+# -------- Same tokenizer as the BM25 index the centroids are built from --------
+from app.vectorstore.lexical import tokenize
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Turn the local classifier on/off (off = every request goes to the LLM classifier)
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "true").lower() == "true"
+
+# Minimum confidence to trust the local prediction and skip the LLM round trip
+LOCAL_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("LOCAL_CLASSIFIER_MIN_CONFIDENCE", "0.35"))
+
+# With multi-domain answers on, the fast path also needs at least this margin:
+# a runner-up category closer than that may be a second area of law of the
+# question ("me despidieron y me acusan de robo"), so the LLM classifier decides
+# and can return both
+LOCAL_CLASSIFIER_MULTI_DOMAIN_MARGIN = float(os.getenv("LOCAL_CLASSIFIER_MULTI_DOMAIN_MARGIN", "0.5"))
+
+# Below this cosine similarity the question looks unrelated to every corpus
+# (probably "General"), so the LLM decides
+LOCAL_CLASSIFIER_MIN_SIMILARITY = float(os.getenv("LOCAL_CLASSIFIER_MIN_SIMILARITY", "0.05"))
+
+
+# ============================
+# 2. Features
+# ============================
+
+def features(text: str):
+    """
+    Tokens of the BM25 index (same tokenizer), without numbers: article and
+    page numbers say nothing about the area of law.
+    """
+    return [token for token in tokenize(text) if not token.isdigit()]
+
+
+def _normalize(vector: dict) -> dict:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else vector
+
+
+# ============================
+# 3. Prediction Result
+# ============================
+
+@dataclass
+class Prediction:
+    category: str        # Best category, e.g. "Derecho Laboral"
+    confidence: float    # 0..1, relative margin between the best and second-best category
+    similarity: float    # Cosine similarity with the best category centroid
+
+
+# ============================
+# 4. TF-IDF Centroid Classifier
+# ============================
+
+class LocalLegalClassifier:
+    """
+    Classifies a question by comparing its TF-IDF vector with one centroid per
+    category, built from the chunks already indexed for that category.
+
+    `sources` maps a category label to a function returning its chunk texts.
+    `version` returns a value that changes when the indexes are rebuilt,
+    so the model is rebuilt too.
+    """
+
+    def __init__(self, sources: dict, version=None):
+        self.sources = sources
+        self.version = version or (lambda: None)
+        self._model = None          # (idf, centroids)
+        self._model_version = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        # Document frequency of each term across all chunks of all categories
+        chunks = {category: [Counter(features(text)) for text in load()] for category, load in self.sources.items()}
+        total_chunks = sum(len(category_chunks) for category_chunks in chunks.values())
+        document_frequency = Counter()
+        for category_chunks in chunks.values():
+            for counts in category_chunks:
+                document_frequency.update(counts.keys())
+
+        # Terms present in every chunk (stopwords) get an IDF of 0
+        idf = {term: math.log(total_chunks / df) for term, df in document_frequency.items()}
+
+        # Centroid = mean of the normalized TF-IDF vectors of the category chunks
+        centroids = {}
+        for category, category_chunks in chunks.items():
+            centroid = Counter()
+            for counts in category_chunks:
+                for term, weight in _normalize({t: c * idf[t] for t, c in counts.items()}).items():
+                    centroid[term] += weight
+            centroids[category] = _normalize(dict(centroid))
+        return idf, centroids
+
+    def _ensure_model(self):
+        version = self.version()
+        if self._model is not None and self._model_version == version:
+            return self._model
+        with self._lock:
+            if self._model is None or self._model_version != version:
+                self._model = self._build()
+                self._model_version = version
+        return self._model
+
+    def _scores(self, question: str):
+        # [(cosine similarity, category)], best first; empty if nothing to compare with
+        idf, centroids = self._ensure_model()
+        counts = Counter(token for token in features(question) if token in idf)
+        if not counts or not centroids:
+            return []
+
+        query = _normalize({term: count * idf[term] for term, count in counts.items()})
+        return sorted(
+            ((sum(weight * centroid.get(term, 0.0) for term, weight in query.items()), category)
+             for category, centroid in centroids.items()),
+            reverse=True,
+        )
+
+    def predict(self, question: str):
+        """
+        Returns a Prediction, or None if there is nothing to compare with
+        (no indexed chunks or no known words in the question).
+        """
+        scores = self._scores(question)
+        if not scores:
+            return None
+
+        best_similarity, best_category = scores[0]
+        second_similarity = scores[1][0] if len(scores) > 1 else 0.0
+
+        if best_similarity < LOCAL_CLASSIFIER_MIN_SIMILARITY:
+            confidence = 0.0
+        else:
+            confidence = (best_similarity - second_similarity) / best_similarity
+        return Prediction(best_category, confidence, best_similarity)
+
+    def rank(self, question: str, k: int = None):
+        """
+        Returns the categories most similar to the question, best first (at most `k`),
+        leaving out the ones below LOCAL_CLASSIFIER_MIN_SIMILARITY.
+        """
+        return [
+            category for similarity, category in self._scores(question)[:k]
+            if similarity >= LOCAL_CLASSIFIER_MIN_SIMILARITY
+        ]
+
+    def warmup(self):
+        """
+        Builds the model ahead of the first request.
+        """
+        self._ensure_model()
+
+    async def _run(self, method, *args):
+        # (Re)building the model reads every indexed chunk: keep it off the event loop
+        # (`version` is cached in memory, so checking it doesn't touch the disk either)
+        if self._model is None or self._model_version != self.version():
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def apredict(self, question: str):
+        return await self._run(self.predict, question)
+
+    async def arank(self, question: str, k: int = None):
+        return await self._run(self.rank, question, k)
+
+
+# ============================
+# 5. Classifier Over the Indexed Collections
+# ============================
+
+def create_local_classifier():
+    """
+    Builds the classifier over the collections of the registered domains.
+    The chunk texts are streamed from each collection's BM25 index (bm25.sqlite3): no Chroma
+    collection is opened and no embedding model is needed, so domains stay
+    lazily loaded and RETRIEVAL_MODE=lexical works offline.
+    """
+    from app.agents.domains import DOMAINS
+    from app.cache import collection_version
+    from app.vectorstore.index_metadata import index_path
+    from app.vectorstore.lexical import BM25Index
+
+    def chunk_texts(collection_name):
+        def load():
+            index = BM25Index.load(index_path(collection_name))
+            return index.texts() if index is not None else []
+        return load
+
+    sources = {domain.category: chunk_texts(domain.collection) for domain in DOMAINS.values()}
+    version = lambda: tuple(collection_version(category) for category in sources)
+    return LocalLegalClassifier(sources, version)
@@ -3,57 +3,167 @@
 # ============================
 
 # -------- Standard Library --------
+import asyncio
+import json
 import os
+from contextlib import asynccontextmanager
+from typing import Optional
 
 # -------- FastAPI Core Components --------
 from fastapi import FastAPI, Depends, Request, Header, HTTPException
-
-# -------- Environment Variable Loader --------
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 # -------- Import the Main Legal Agent Workflow --------
 from app.agents.legal_assistant_agent import legal_assistant_graph
 
+# Background unloading of idle domains
+from app.agents.domain_agent import unload_idle_domains_periodically
+
+# -------- Server-Sent Events helper for token streaming --------
+from app.streaming import stream_legal_answer
+
+# -------- Bulk question processing (bounded-concurrency batches) --------
+from app.batch import parse_questions, resolve_concurrency, stream_batch_ndjson
+
+# -------- Semantic answer cache (exact + embedding similarity + TTL/LRU) --------
+from app.cache import ANSWER_CACHE_ENABLED, create_answer_cache
+
+# -------- Optional warmup of the lazily-built LLMs / vector stores --------
+from app.warmup import WARMUP_ON_STARTUP, readiness, warmup
+
+# -------- LLM provider router statistics (latency, errors, hedges, circuits) --------
+from app.provider_router import provider_stats
+
+# -------- Single-flight coalescing of identical questions in flight --------
+from app.coalescing import COALESCING_ENABLED, coalesce, flight_key, single_flight
+
+# -------- Conversation sessions (SQLite LangGraph checkpointer, TTL eviction) --------
+from app.sessions import (
+    SESSIONS_ENABLED,
+    ask_in_session,
+    end_session,
+    evict_expired_sessions_periodically,
+    stream_in_session,
+    thread_id,
+)
+
+# -------- Response shapes, orjson serialization and compression --------
+from app.responses import RESPONSE_SHAPE, CompressionMiddleware, ORJSONResponse, ResponseShape, project_response
+
+# -------- Prometheus metrics (latency histograms and counters) --------
+from app.metrics import render_metrics
+
+# -------- Admission control: per-key rate/concurrency limits and the priority queue --------
+from slowapi.errors import RateLimitExceeded
+from app.admission import (
+    admission,
+    charge_rate_limit,
+    limiter,
+    load_clients,
+    rate_limit_exceeded_handler,
+    rate_limit_for,
+    register_clients,
+    release_when_done,
+)
+
+# -------- Structured logging, tracing and request IDs --------
+from app.telemetry import RequestContextMiddleware, setup_logging, setup_tracing, shutdown_telemetry
+
 
 # ============================
 # 1. Load Environment Variables
 # ============================
 
-# This loads variables from a `.env` file into the environment
-# Useful for storing secrets like API keys
-load_dotenv(override=True)
+# Variables from the `.env` file (secrets like API keys, and every setting)
+# are loaded by app/config.py as soon as the `app` package is imported,
+# before the modules above read their configuration
 
 
 # ============================
 # 2. Initialize the FastAPI App
 # ============================
 
-# Create an instance of the FastAPI application
-app = FastAPI()
+# Nothing heavy happens at import time: LLM clients and vector stores are
+# built on first use. With WARMUP_ON_STARTUP=true they are built in the
+# background right after startup, and /ready reports when that is done.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    setup_tracing()
+    warmup_task = asyncio.create_task(warmup()) if WARMUP_ON_STARTUP else None
+    # Releases the collections of domains without recent questions
+    unload_task = asyncio.create_task(unload_idle_domains_periodically())
+    # Deletes the conversation sessions idle for more than SESSION_TTL
+    eviction_task = asyncio.create_task(evict_expired_sessions_periodically())
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    unload_task.cancel()
+    eviction_task.cancel()
+    shutdown_telemetry()
+
+
+# Create an instance of the FastAPI application (JSON rendered with orjson)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# zstd / gzip compression negotiated with Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+# Per-API-key rate limits (429 + Retry-After when exceeded)
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+
+# Request ID (X-Request-ID) and root span of every request, inherited by the graph
+app.add_middleware(RequestContextMiddleware)
+
+
+# ============================
+# 3. Answer Cache + Request Coalescing
+# ============================
+
+# Near-duplicate questions are answered from the cache instead of running
+# classification, retrieval and generation again (ANSWER_CACHE_ENABLED=false to disable)
+answer_cache = create_answer_cache() if ANSWER_CACHE_ENABLED else None
+
+# Same interface as the graph (ainvoke / abatch_as_completed), cache-aware
+legal_assistant = answer_cache.wrap(legal_assistant_graph) if answer_cache else legal_assistant_graph
+
+# Identical questions asked at the same time share one run (COALESCING_ENABLED=false to disable)
+if COALESCING_ENABLED:
+    legal_assistant = coalesce(legal_assistant)
 
 
 # ============================
-# 3. Load the API Key
+# 4. Load the API Key
 # ============================
 
 # Try to load the API key from the environment
 # If not found, use "default-dev-key" (for local development only)
 API_KEY = os.getenv("API_KEY", "default-dev-key")
 
+# More keys, each with its own client name, priority, rate limit and concurrency
+# (API_KEYS, JSON - see app/admission.py); API_KEY is the "default" client
+API_CLIENTS = load_clients(API_KEY, os.getenv("API_KEYS", ""))
+register_clients(API_CLIENTS)
+
 
 # ============================
-# 4. Dependency - API Key Verification
+# 5. Dependency - API Key Verification
 # ============================
 
 # This function checks the x-api-key header in each request
 # If the key is wrong or missing, raise a 401 Unauthorized error
-async def verify_api_key(x_api_key: str = Header(...)):
-    if x_api_key != API_KEY:
+async def verify_api_key(request: Request, x_api_key: str = Header(...)):
+    client = API_CLIENTS.get(x_api_key)
+    if client is None:
         raise HTTPException(status_code=401, detail="Unauthorized")
+    # Rate limits, concurrency limits and queue priority are applied per client
+    request.state.client = client
 
 
 # ============================
-# 5. Define API Routes
+# 6. Define API Routes
 # ============================
 
 # -------- Health Check --------
@@ -66,15 +176,167 @@ def read_root():
     return {"message": "Backend is live."}
 
 
+# -------- Readiness Check --------
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe, separate from the liveness check above.
+    Returns 503 until the optional warmup has finished without errors.
+    """
+    status_code = 200 if readiness["ready"] else 503
+    return JSONResponse(status_code=status_code, content=readiness)
+
+
 # -------- Chatbot Response Endpoint --------
 @app.post("/chat/response", dependencies=[Depends(verify_api_key)])
-def chat_stream(question: str, request: Request):
+@limiter.limit(rate_limit_for)
+async def chat_stream(
+    question: str,
+    request: Request,
+    shape: Optional[ResponseShape] = None,
+    session_id: Optional[str] = None,
+):
     """
     Accepts a legal question and routes it through the legal_assistant_graph.
     Requires a valid API key in the request header.
+    Runs on the event loop, so no threadpool worker is held while waiting on the LLMs.
+    `shape` selects how the retrieved documents are returned: "full",
+    "snippets" or "citations-only" (default: RESPONSE_SHAPE).
+    With a `session_id`, the question is one turn of that conversation: follow-ups
+    keep its category and articles (no answer cache or coalescing for these).
     """
-    # Pass the user’s question to the agent workflow
-    response = legal_assistant_graph.invoke({"question": question})
+    # Wait for a free slot (or get a quick 429/503 with Retry-After)
+    ticket = await admission.acquire(request.state.client)
+    try:
+        if session_id and SESSIONS_ENABLED:
+            response = await ask_in_session(thread_id(request.state.client.name, session_id), question)
+        else:
+            # Pass the user’s question to the agent workflow (awaited, fully async)
+            response = await legal_assistant.ainvoke({"question": question})
+    finally:
+        ticket.release()
 
     # Return the structured response (includes category, answer, and docs)
-    return response
+    return ORJSONResponse(project_response(response, shape or RESPONSE_SHAPE))
+
+
+# -------- Streaming (SSE) Chatbot Endpoint --------
+@app.post("/chat/stream", dependencies=[Depends(verify_api_key)])
+@limiter.limit(rate_limit_for)
+async def chat_stream_events(question: str, request: Request, session_id: Optional[str] = None):
+    """
+    Same workflow as /chat/response, but streamed as Server-Sent Events:
+    the detected category and the retrieved article references are sent
+    right after retrieval, then every answer token as soon as the LLM produces it.
+    """
+    # The slot is held until the stream ends (or the client disconnects)
+    ticket = await admission.acquire(request.state.client)
+    if session_id and SESSIONS_ENABLED:
+        stream = stream_in_session(thread_id(request.state.client.name, session_id), question)
+    elif COALESCING_ENABLED:
+        # Joins the identical stream in flight, if any, from its first event
+        stream = single_flight.stream(
+            flight_key(question), lambda: stream_legal_answer(legal_assistant_graph, question, answer_cache))
+    else:
+        stream = stream_legal_answer(legal_assistant_graph, question, answer_cache)
+    return StreamingResponse(
+        release_when_done(stream, ticket),
+        media_type="text/event-stream",
+        # Disable caching/proxy buffering so each event reaches the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release),
+    )
+
+
+# -------- Bulk Questions Endpoint --------
+@app.post("/chat/batch", dependencies=[Depends(verify_api_key)])
+@limiter.limit(rate_limit_for)
+async def chat_batch(
+    request: Request,
+    max_concurrency: Optional[int] = None,
+    ordered: bool = True,
+    shape: Optional[ResponseShape] = None,
+):
+    """
+    Runs many questions through the legal_assistant_graph in one request.
+    The body is either a JSON list of questions (strings or {"question": ...} objects)
+    or a JSONL stream (Content-Type: application/x-ndjson).
+    Results are streamed back as JSONL, in input order or as they finish (ordered=false),
+    each one in the requested `shape` (see /chat/response).
+    A failing question is reported in its own line and does not fail the batch.
+    Batches wait in the queue with the lowest priority, behind interactive questions.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            questions = parse_questions(body.decode("utf-8").splitlines())
+        else:
+            items = json.loads(body)
+            questions = [item["question"] if isinstance(item, dict) else str(item) for item in items]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid batch body")
+
+    # One rate-limit hit per question, and one admission slot per question in flight
+    charge_rate_limit(request, len(questions) - 1)
+    concurrency = min(resolve_concurrency(max_concurrency), max(len(questions), 1))
+    ticket = await admission.acquire(request.state.client, priority="low", slots=concurrency)
+    return StreamingResponse(
+        release_when_done(
+            stream_batch_ndjson(legal_assistant, questions, ticket.slots, ordered, shape or RESPONSE_SHAPE),
+            ticket,
+        ),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(ticket.release),
+    )
+
+
+# -------- End a Conversation Session --------
+@app.delete("/chat/session/{session_id}", dependencies=[Depends(verify_api_key)])
+async def delete_session(session_id: str, request: Request):
+    """
+    Forgets a conversation session before its TTL (the next question starts a new one).
+    """
+    if not SESSIONS_ENABLED:
+        raise HTTPException(status_code=404, detail="Sessions are disabled")
+    await end_session(thread_id(request.state.client.name, session_id))
+    return {"deleted": session_id}
+
+
+# -------- Answer Cache Statistics --------
+@app.get("/cache/stats", dependencies=[Depends(verify_api_key)])
+def cache_stats():
+    """
+    Hit/miss/eviction counters of the semantic answer cache.
+    """
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
+
+# -------- LLM Provider Statistics --------
+@app.get("/llm/stats", dependencies=[Depends(verify_api_key)])
+def llm_stats():
+    """
+    Per-provider latency (p50/p95), errors, timeouts, hedges, hedge wins and circuit state.
+    """
+    return provider_stats()
+
+
+# -------- Admission Control Statistics --------
+@app.get("/admission/stats", dependencies=[Depends(verify_api_key)])
+def admission_stats():
+    """
+    Requests running and queued (overall and per client), and the current Retry-After estimate.
+    """
+    return admission.stats()
+
+
+# -------- Prometheus Metrics --------
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Latency histograms and counters in the Prometheus text format.
+    No API key, like the health checks: scrapers and autoscalers read it.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,221 @@
+# ============================
+# Prometheus Metrics (text exposition format, no extra dependency)
+# ============================
+
+# Counters and histograms kept in memory and rendered by GET /metrics in the
+# Prometheus text format (version 0.0.4). Covers graph nodes, LLM provider
+# calls, embedding calls, Chroma queries, categories, fallbacks, tokens and caches.
+
+# -------- Standard Library --------
+import functools
+import threading
+import time
+from typing import List
+
+# -------- LangChain embeddings interface (for the metered wrapper) --------
+from langchain_core.embeddings import Embeddings
+
+# -------- Tracing (embedding calls are external calls) --------
+from app.telemetry import tracer
+
+
+# ============================
+# 1. Metric Types
+# ============================
+
+# Seconds: from a cached embedding lookup to a slow LLM generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+REGISTRY = []
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # A counter without labels is exported as 0 until its first increment
+        self._values = {} if self.labels else {(): 0}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels → [count per bucket..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            # Bucket counts are cumulative (le = "less than or equal")
+            series = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for number, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[number] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """
+        Decorator timing an async function (e.g. a graph node).
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    bucket_labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                bucket_labels = _format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ============================
+# 2. Application Metrics
+# ============================
+
+# -------- Latency histograms --------
+NODE_DURATION = Histogram(
+    "legal_node_duration_seconds", "Duration of each LangGraph node.", ["graph", "node"])
+LLM_DURATION = Histogram(
+    "legal_llm_request_duration_seconds", "Duration of each LLM provider call.", ["provider", "outcome"])
+EMBEDDING_DURATION = Histogram(
+    "legal_embedding_duration_seconds", "Duration of each call to the embedding model.", ["model", "kind"])
+VECTOR_QUERY_DURATION = Histogram(
+    "legal_vector_query_duration_seconds", "Duration of each Chroma similarity query.", ["collection"])
+
+# -------- Counters --------
+REQUESTS = Counter(
+    "legal_requests_total", "Questions classified by the legal assistant graph.")
+CATEGORY_REQUESTS = Counter(
+    "legal_category_total", "Questions routed to each legal category.", ["category"])
+FALLBACKS = Counter(
+    "legal_fallback_total", "Questions answered by the fallback (no legal category).")
+LLM_TOKENS = Counter(
+    "legal_llm_tokens_total", "Tokens reported by the LLM providers.", ["provider", "type"])
+CACHE_LOOKUPS = Counter(
+    "legal_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"])
+COALESCED_REQUESTS = Counter(
+    "legal_coalesced_requests_total", "Requests attached to an identical request in flight.", ["kind"])
+SESSION_TURNS = Counter(
+    "legal_session_turns_total", "Questions asked within a session, as follow-ups or new topics.", ["kind"])
+ADMISSION_REJECTIONS = Counter(
+    "legal_admission_rejected_total", "Requests rejected by admission control, by reason.", ["reason"])
+
+# -------- Admission queue --------
+ADMISSION_WAIT = Histogram(
+    "legal_admission_wait_seconds", "Time admitted requests waited for a slot.", ["priority"])
+
+
+def record_llm_usage(provider: str, result):
+    # Chat messages carry usage_metadata (structured outputs don't)
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), provider=provider, type="prompt")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), provider=provider, type="completion")
+
+
+# ============================
+# 3. Metered Embeddings
+# ============================
+
+class MeteredEmbeddings(Embeddings):
+    """
+    Times every call that reaches the embedding model (cache hits never get here).
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str):
+        self.underlying = underlying
+        self.model_name = model_name
+
+    def _observe(self, start: float, kind: str):
+        EMBEDDING_DURATION.observe(time.perf_counter() - start, model=self.model_name, kind=kind)
+
+    def _span(self, kind: str, texts: int):
+        return tracer.start_as_current_span(
+            f"embedding.{kind}", attributes={"embedding.model": self.model_name, "embedding.texts": texts}
+        )
+
+    def embed_documents(self, texts):
+        start = time.perf_counter()
+        try:
+            with self._span("documents", len(texts)):
+                return self.underlying.embed_documents(texts)
+        finally:
+            self._observe(start, "documents")
+
+    def embed_query(self, text):
+        start = time.perf_counter()
+        try:
+            with self._span("query", 1):
+                return self.underlying.embed_query(text)
+        finally:
+            self._observe(start, "query")
+
+    async def aembed_documents(self, texts):
+        start = time.perf_counter()
+        try:
+            with self._span("documents", len(texts)):
+                return await self.underlying.aembed_documents(texts)
+        finally:
+            self._observe(start, "documents")
+
+    async def aembed_query(self, text):
+        start = time.perf_counter()
+        try:
+            with self._span("query", 1):
+                return await self.underlying.aembed_query(text)
+        finally:
+            self._observe(start, "query")
@@ -0,0 +1,409 @@
+# ============================
+# LLM Provider Router (hedged requests + circuit breakers + latency ordering)
+# ============================
+
+# Replaces a fixed `with_fallbacks` chain, which only moves on after a failure
+# (a slow but alive primary means 30-second answers). For every call the router:
+#   1. Skips providers whose circuit breaker is open (recent errors / timeouts)
+#   2. Orders the rest by their measured rolling latency
+#   3. Sends a hedged request to the next provider when the first one passes
+#      its own p95 latency, and keeps whichever answers first
+#   4. Fails over to the next provider on errors, like `with_fallbacks`
+
+# -------- Standard Library --------
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# -------- LangChain runnable + callback interfaces --------
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.runnables import Runnable, ensure_config
+
+# -------- Prometheus metrics --------
+from app.metrics import LLM_DURATION, record_llm_usage
+
+# -------- Tracing (one span per provider call) --------
+from app.telemetry import tracer
+
+logger = logging.getLogger(__name__)
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Send a hedged request when the first provider is slower than its p95 latency
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+
+# Hedge delay (seconds) used until a provider has enough latency samples
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "10"))
+LLM_MIN_SAMPLES = int(os.getenv("LLM_MIN_SAMPLES", "20"))
+
+# Max seconds per provider call (a timeout counts as a failure)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Consecutive failures that open a circuit, and seconds before it is retried
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "3"))
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+
+# Reorder providers by rolling median latency (off = always the configured order)
+LLM_REORDER_BY_LATENCY = os.getenv("LLM_REORDER_BY_LATENCY", "true").lower() == "true"
+
+# Latency samples kept per provider
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+
+
+# ============================
+# 2. Per-Provider Statistics and Circuit Breaker
+# ============================
+
+class ProviderStats:
+    def __init__(self, name: str, window: int = LLM_LATENCY_WINDOW):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.counters = {"calls": 0, "successes": 0, "errors": 0, "timeouts": 0,
+                         "hedges": 0, "hedge_wins": 0, "circuit_opens": 0}
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False         # Half-open: the single trial call is in flight
+        self._lock = threading.Lock()
+
+    def count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def percentile(self, percentile: float):
+        # None until there are enough samples to trust it
+        with self._lock:
+            if len(self.latencies) < LLM_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * percentile / 100), len(ordered) - 1)]
+
+    def state(self) -> str:
+        # closed / open / half_open (open for longer than the cooldown: one more try)
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= LLM_CIRCUIT_COOLDOWN else "open"
+
+    def acquire(self):
+        """
+        Whether the provider can be called: "closed", "probe" or None. Half-open,
+        only the first caller gets "probe" (the single trial call), and the others
+        keep skipping the provider until the probe succeeds or fails (or is released).
+        """
+        with self._lock:
+            state = self.state()
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return "probe"
+            return "closed" if state == "closed" else None
+
+    def release_probe(self):
+        # The claimed probe was never made (another provider answered) or was cancelled
+        with self._lock:
+            self.probing = False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+            self.counters["successes"] += 1
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self, timeout: bool = False):
+        with self._lock:
+            self.counters["timeouts" if timeout else "errors"] += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= LLM_CIRCUIT_FAILURES:
+                if self.opened_at is None:
+                    self.counters["circuit_opens"] += 1
+                # A failed half-open try keeps the circuit open for another cooldown
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            **self.counters,
+            "circuit": self.state(),
+            "latency_samples": len(self.latencies),
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+# Shared by every router (plain and structured-output), so a provider that is
+# down for one of them is skipped by all of them
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_provider_stats(name: str) -> ProviderStats:
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = ProviderStats(name)
+        return _stats[name]
+
+
+def provider_stats() -> dict:
+    """
+    Latency, error, hedge and circuit statistics of every provider used so far.
+    """
+    with _stats_lock:
+        stats = list(_stats.values())
+    return {provider.name: provider.snapshot() for provider in stats}
+
+
+# ============================
+# 3. Callback Helpers
+# ============================
+
+class _FirstTokenHandler(AsyncCallbackHandler):
+    # Flags when the provider starts streaming tokens (it is alive and answering)
+    def __init__(self, event: asyncio.Event):
+        self.event = event
+
+    async def on_llm_new_token(self, token, **kwargs):
+        self.event.set()
+
+
+def _with_handler(config, handler):
+    # ensure_config also brings in the callbacks of the running graph (a call
+    # made with config=None would otherwise drop them and stop token streaming)
+    config = dict(ensure_config(config))
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        config["callbacks"] = [handler]
+    elif isinstance(callbacks, list):
+        config["callbacks"] = callbacks + [handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+        config["callbacks"] = callbacks
+    return config
+
+
+def _without_callbacks(config):
+    # Hedged requests don't stream tokens or traces: only one answer reaches the client
+    # (an empty list, since None would inherit the callbacks of the running graph)
+    return {**(config or {}), "callbacks": []}
+
+
+# ============================
+# 4. The Router
+# ============================
+
+class ProviderRouter(Runnable):
+    """
+    Runnable over several chat model providers, usable anywhere a chat model is
+    (`prompt | router | parser`, `router.with_structured_output(schema)`).
+
+    `providers` is a list of (name, zero-argument function building the chat model);
+    clients are built on first use, so a missing API key only disables that provider.
+    """
+
+    def __init__(self, providers, transform=None):
+        self.providers = list(providers)
+        self.transform = transform
+        self._runnables = {}
+        self._lock = threading.Lock()
+
+    # -------- Building the provider runnables --------
+
+    def _runnable(self, name: str):
+        if name not in self._runnables:
+            with self._lock:
+                if name not in self._runnables:
+                    llm = dict(self.providers)[name]()
+                    self._runnables[name] = self.transform(llm) if self.transform else llm
+        return self._runnables[name]
+
+    def with_structured_output(self, schema, **kwargs):
+        return ProviderRouter(self.providers, lambda llm: llm.with_structured_output(schema, **kwargs))
+
+    def warmup(self):
+        """
+        Builds every provider client. Raises only if none of them can be built.
+        """
+        errors = {}
+        for name, _ in self.providers:
+            try:
+                self._runnable(name)
+            except Exception as exc:
+                errors[name] = exc
+                logger.warning("LLM provider %s unavailable: %s", name, exc)
+        if len(errors) == len(self.providers):
+            raise RuntimeError(f"No LLM provider available: {errors}")
+
+    # -------- Provider order --------
+
+    def ordered_providers(self, probes: set) -> list:
+        """
+        Providers to try, in order: available ones first (sorted by rolling
+        median latency when known), then the ones with an open circuit.
+        Half-open providers whose probe this call claimed are added to `probes`:
+        the caller releases them once done (see `_release_probes`).
+        """
+        names = [name for name, _ in self.providers]
+        available = []
+        for name in names:
+            access = get_provider_stats(name).acquire()
+            if access is not None:
+                available.append(name)
+            if access == "probe":
+                probes.add(name)
+        unavailable = [name for name in names if name not in available]
+        if LLM_REORDER_BY_LATENCY:
+            # Stable sort: providers without enough samples keep their configured place after the measured ones
+            def median(name):
+                p50 = get_provider_stats(name).percentile(50)
+                return float("inf") if p50 is None else p50
+            available.sort(key=median)
+        # If every circuit is open, still try them all rather than failing right away
+        return available + unavailable
+
+    @staticmethod
+    def _release_probes(probes: set):
+        # A probe that succeeded or failed is already released; this frees the
+        # ones never called (an earlier provider answered) or cancelled
+        for name in probes:
+            get_provider_stats(name).release_probe()
+
+    def hedge_delay(self, name: str) -> float:
+        p95 = get_provider_stats(name).percentile(LLM_HEDGE_PERCENTILE)
+        return LLM_HEDGE_DELAY if p95 is None else p95
+
+    # -------- Calls --------
+
+    async def _acall(self, name: str, input, config, **kwargs):
+        stats = get_provider_stats(name)
+        stats.count("calls")
+        start = time.perf_counter()
+        outcome = "error"
+        with tracer.start_as_current_span("llm.call", attributes={"llm.provider": name}) as span:
+            try:
+                result = await asyncio.wait_for(self._runnable(name).ainvoke(input, config, **kwargs), LLM_TIMEOUT)
+                outcome = "success"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                stats.record_failure(timeout=True)
+                raise
+            except asyncio.CancelledError:
+                # Lost a hedge race: neither a success nor a failure
+                outcome = "cancelled"
+                raise
+            except Exception:
+                stats.record_failure()
+                raise
+            finally:
+                latency = time.perf_counter() - start
+                span.set_attribute("llm.outcome", outcome)
+                LLM_DURATION.observe(latency, provider=name, outcome=outcome)
+        stats.record_success(latency)
+        record_llm_usage(name, result)
+        return result
+
+    async def _ahedged(self, name: str, queue: list, input, config, **kwargs):
+        # Calls `name`; if it passes its p95 without answering (or streaming a
+        # first token), also calls the next provider of `queue` and returns the first answer
+        first_token = asyncio.Event()
+        primary = asyncio.create_task(
+            self._acall(name, input, _with_handler(config, _FirstTokenHandler(first_token)), **kwargs)
+        )
+        tasks = {primary: name}
+        token_wait = None
+
+        def start_hedge():
+            hedge_name = queue.pop(0)
+            get_provider_stats(hedge_name).count("hedges")
+            logger.info("LLM %s slower than %.1fs, hedging with %s", name, self.hedge_delay(name), hedge_name)
+            hedge = asyncio.create_task(self._acall(hedge_name, input, _without_callbacks(config), **kwargs))
+            tasks[hedge] = hedge_name
+
+        try:
+            if LLM_HEDGE_ENABLED and queue:
+                await asyncio.wait({primary}, timeout=self.hedge_delay(name))
+                if not primary.done() and not first_token.is_set():
+                    start_hedge()
+                    token_wait = asyncio.create_task(first_token.wait())
+
+            error = None
+            while tasks:
+                waiting = set(tasks)
+                if token_wait is not None and not token_wait.done():
+                    waiting.add(token_wait)
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                if token_wait in done and primary in tasks:
+                    # The primary started streaming to the client: commit to it
+                    for task in [task for task in tasks if task is not primary]:
+                        task.cancel()
+                        del tasks[task]
+
+                for task in done:
+                    if task not in tasks:
+                        continue
+                    winner = tasks.pop(task)
+                    if task.exception() is None:
+                        if winner != name:
+                            get_provider_stats(winner).count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+                    # A failed hedge while the primary is still silent: hedge with the next one
+                    if task is not primary and primary in tasks and queue and not first_token.is_set():
+                        start_hedge()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if token_wait is not None:
+                token_wait.cancel()
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        probes = set()
+        queue = self.ordered_providers(probes)
+        errors = []
+        try:
+            while queue:
+                name = queue.pop(0)
+                try:
+                    return await self._ahedged(name, queue, input, config, **kwargs)
+                except Exception as exc:
+                    # Fail over to the next provider (like `with_fallbacks`)
+                    logger.warning("LLM provider %s failed: %r", name, exc)
+                    errors.append(exc)
+            raise errors[0]
+        finally:
+            self._release_probes(probes)
+
+    def invoke(self, input, config=None, **kwargs):
+        # Sync path (scripts): same ordering, circuit breakers and failover, no hedging
+        errors = []
+        probes = set()
+        try:
+            for name in self.ordered_providers(probes):
+                stats = get_provider_stats(name)
+                stats.count("calls")
+                start = time.perf_counter()
+                try:
+                    result = self._runnable(name).invoke(input, config, **kwargs)
+                except Exception as exc:
+                    stats.record_failure()
+                    LLM_DURATION.observe(time.perf_counter() - start, provider=name, outcome="error")
+                    logger.warning("LLM provider %s failed: %r", name, exc)
+                    errors.append(exc)
+                    continue
+                latency = time.perf_counter() - start
+                stats.record_success(latency)
+                LLM_DURATION.observe(latency, provider=name, outcome="success")
+                record_llm_usage(name, result)
+                return result
+            raise errors[0]
+        finally:
+            self._release_probes(probes)
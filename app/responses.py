@@ -0,0 +1,230 @@
+# ============================
+# Response Shapes, Fast JSON and Compression
+# ============================
+
+# The graph state holds whole LangChain Documents (and, for fallback answers,
+# an AIMessage). Before leaving the API it is projected to plain JSON:
+#   - "full"           → every retrieved document with its text and metadata
+#   - "snippets"       → a citation and the first SNIPPET_CHARS of each document
+#   - "citations-only" → only the citation, file name and page of each document
+# Responses are serialized with orjson and compressed (zstd or gzip) when the
+# client's Accept-Encoding allows it.
+
+# -------- Standard Library --------
+import os
+import zlib
+from typing import Literal, Optional
+
+# -------- Fast JSON and zstd compression --------
+import orjson
+import zstandard
+
+# -------- FastAPI / Starlette --------
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+
+# -------- Citations and clean text of the retrieved chunks --------
+from app.context_packer import citation, clean_text
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+ResponseShape = Literal["full", "snippets", "citations-only"]
+RESPONSE_SHAPES = ("full", "snippets", "citations-only")
+
+# Shape used when the request doesn't ask for one
+RESPONSE_SHAPE = os.getenv("RESPONSE_SHAPE", "full")
+if RESPONSE_SHAPE not in RESPONSE_SHAPES:
+    raise ValueError(f"Unknown RESPONSE_SHAPE: {RESPONSE_SHAPE!r} (expected one of {RESPONSE_SHAPES})")
+
+# Characters of article text kept per document in the "snippets" shape
+SNIPPET_CHARS = int(os.getenv("SNIPPET_CHARS", "300"))
+
+# Responses smaller than this are sent uncompressed (not worth the CPU)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+# Preferred first when the client accepts both with the same weight
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+
+
+# ============================
+# 2. Response Projections
+# ============================
+
+def answer_text(answer) -> str:
+    # Domain answers are strings, fallback answers are AIMessages
+    return getattr(answer, "content", answer) or ""
+
+
+def _snippet(text: str) -> str:
+    text = clean_text(text)
+    if len(text) <= SNIPPET_CHARS:
+        return text
+    # Cut at the last whole word
+    return text[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+
+
+def project_document(document, shape: str) -> dict:
+    metadata = getattr(document, "metadata", None) or {}
+    if shape == "full":
+        return {
+            "id": getattr(document, "id", None),
+            "metadata": metadata,
+            "page_content": getattr(document, "page_content", str(document)),
+            "type": "Document",
+        }
+
+    projected = {
+        "citation": citation(metadata),
+        "source": os.path.basename(str(metadata.get("source", ""))),
+        "page": metadata.get("page"),
+    }
+    if shape == "snippets":
+        projected["snippet"] = _snippet(getattr(document, "page_content", str(document)))
+    return projected
+
+
+def project_response(state: dict, shape: str = RESPONSE_SHAPE) -> dict:
+    """
+    JSON-ready view of a legal assistant graph result in the requested shape.
+    """
+    response = {key: value for key, value in state.items() if key != "retrieved_docs"}
+    if "answer" in state:
+        response["answer"] = answer_text(state["answer"])
+    if "retrieved_docs" in state:
+        response["retrieved_docs"] = [project_document(document, shape) for document in state["retrieved_docs"] or []]
+    return response
+
+
+# ============================
+# 3. Fast JSON (orjson)
+# ============================
+
+def _default(value):
+    # Anything orjson doesn't know natively (pydantic models, LangChain objects, ...)
+    return jsonable_encoder(value)
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson (several times faster than the stdlib encoder).
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# ============================
+# 4. Negotiated Compression
+# ============================
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Best supported encoding of an Accept-Encoding header ("gzip;q=0.8, zstd"), or None.
+    """
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name:
+            weights[name.strip()] = weight
+
+    wildcard = weights.get("*", 0.0)
+    candidates = [(weights.get(name, wildcard), -rank, name) for rank, name in enumerate(SUPPORTED_ENCODINGS)]
+    weight, _, name = max(candidates)
+    return name if weight > 0 else None
+
+
+class _Compressor:
+    # Streaming compressor: each chunk is flushed so clients can decode it right away
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def compress(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == "zstd":
+            mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if last else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            mode = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(mode)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with zstd or gzip (Accept-Encoding).
+    Streamed JSONL is compressed chunk by chunk; Server-Sent Events are left
+    alone so every event reaches the client as soon as it is sent.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        encoding = negotiate_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk tells whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is not None:
+                response_headers = MutableHeaders(scope=start)
+                skip = (
+                    "content-encoding" in response_headers
+                    or response_headers.get("content-type", "").startswith("text/event-stream")
+                    or (not more_body and len(body) < self.minimum_size)
+                )
+                if not skip:
+                    compressor = _Compressor(encoding)
+                    body = compressor.compress(body, last=not more_body)
+                    response_headers["Content-Encoding"] = encoding
+                    response_headers.add_vary_header("Accept-Encoding")
+                    if more_body:
+                        del response_headers["Content-Length"]
+                    else:
+                        response_headers["Content-Length"] = str(len(body))
+                await send(start)
+                start = None
+            elif compressor is not None:
+                body = compressor.compress(body, last=not more_body)
+
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -2,26 +2,25 @@
 # Structured Legal Text Classifier
 # ================================
 
+# Standard library cache used to build the classifier only once, on first use
+from functools import lru_cache
+from typing import List
+
 # Import LangChain's prompt template to define custom LLM input instructions
 from langchain_core.prompts import ChatPromptTemplate
 
 # Import your default fallback language model (e.g., OpenAI, Gemini, Claude)
-from app.llms import fallback_llm
+from app.llms import get_fallback_llm
 
 # Pydantic is used to define structured output formats (like JSON schemas)
 from pydantic import BaseModel, Field
 
-
-# ================================
-# 1. Load LLM
-# ================================
-
-# Assign the default LLM to a variable (could be GPT, Gemini, etc.)
-llm = fallback_llm
+# Category labels of the registered domains (app/agents/domains.json)
+from app.agents.domains import ROUTES
 
 
 # ================================
-# 2. Create Prompt Template
+# 1. Create Prompt Template
 # ================================
 
 # This prompt instructs the LLM to extract specific structured data
@@ -38,7 +37,7 @@ tagging_prompt = ChatPromptTemplate.from_template(
 
 
 # ================================
-# 3. Define Expected Output Format (Pydantic Schema)
+# 2. Define Expected Output Format (Pydantic Schema)
 # ================================
 
 # This class defines the fields we expect the LLM to extract
@@ -46,7 +45,13 @@ tagging_prompt = ChatPromptTemplate.from_template(
 class Classification(BaseModel):
     category: str = Field(
         description="Categoría legal asignada.",
-        enum=["Derecho Laboral", "Derecho Civil", "Derecho Penal", "General"],  # Only these values are allowed
+        enum=[*ROUTES, "General"],  # Only these values are allowed
+    )
+    other_categories: List[str] = Field(
+        default_factory=list,
+        description="Otras categorías legales que también aplican a la pregunta, en orden de relevancia "
+                    "(vacía si solo aplica una).",
+        json_schema_extra={"items": {"enum": list(ROUTES)}},
     )
     language: str = Field(
         description="El idioma en el que está escrito el texto.",
@@ -55,31 +60,31 @@ class Classification(BaseModel):
 
 
 # ================================
-# 4. Bind the Output Schema to the LLM
+# 3. Bind the Output Schema to the LLM
 # ================================
 
 # This wraps the LLM so that it returns output that matches the Classification schema
-legal_classifier = llm.with_structured_output(Classification)
+# (built on first use, so importing this module never calls or builds an LLM client)
+@lru_cache(maxsize=None)
+def get_legal_classifier():
+    return get_fallback_llm().with_structured_output(Classification)
 
 
 # ================================
-# 5. Run a Test Input
+# 4. Run a Test Input (only when executed directly: python -m app.router)
 # ================================
 
-# Sample legal input (user question or text)
-inp = "las horas extra se pagan impuestos?"
-
-# First, inject the input into the tagging prompt
-prompt = tagging_prompt.invoke({"input": inp})
-
-# Then, run the structured LLM to classify the response
-response = legal_classifier.invoke(prompt)
+if __name__ == "__main__":
+    # Sample legal input (user question or text)
+    inp = "las horas extra se pagan impuestos?"
 
+    # First, inject the input into the tagging prompt
+    prompt = tagging_prompt.invoke({"input": inp})
 
-# ================================
-# 6. Print the Result
-# ================================
+    # Then, run the structured LLM to classify the response
+    response = get_legal_classifier().invoke(prompt)
 
-# Print the type and value of the extracted category
-print(type(response.category))   # Should be <class 'str'>
-print(response.category)         # Should be "Derecho Laboral", "Derecho Civil", etc.
+    # Print the type and value of the extracted category
+    print(type(response.category))   # Should be <class 'str'>
+    print(response.category)         # Should be "Derecho Laboral", "Derecho Civil", etc.
+    print(response.other_categories) # Other areas the question also touches (usually empty)
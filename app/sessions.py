@@ -0,0 +1,461 @@
+# ============================
+# Conversation Sessions (LangGraph checkpointer on SQLite)
+# ============================
+
+# A question asked with a session_id is one turn of a conversation. The turn's
+# category, retrieved articles and a bounded summary of the conversation are
+# checkpointed in a local SQLite file (thread_id = API client + session_id), so
+# a follow-up like "¿y si tengo más de 20 años de antigüedad?" skips the
+# classification, keeps the session's domains and reuses its articles
+# (see follow_up_routes / follow_up_documents in the legal assistant graph).
+# Sessions without a turn for SESSION_TTL seconds are deleted.
+
+# -------- Standard Library --------
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, Iterator, List, Optional, Sequence, TypedDict
+
+# -------- LangGraph checkpointing --------
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.graph import END, START, StateGraph
+
+# -------- The legal assistant graph answers every turn --------
+from app.agents.legal_assistant_agent import legal_assistant_graph
+
+# -------- Answer text of domain (str) and fallback (AIMessage) answers --------
+from app.responses import answer_text
+
+# -------- SSE streaming of a turn --------
+from app.streaming import stream_legal_answer
+
+logger = logging.getLogger(__name__)
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+SESSIONS_ENABLED = os.getenv("SESSIONS_ENABLED", "true").lower() == "true"
+
+# SQLite file holding the checkpoints of every session
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(_ROOT_DIR, "sessions.sqlite3"))
+
+# Seconds without a turn after which a session is deleted, and how often they are looked for
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_EVICTION_INTERVAL = float(os.getenv("SESSION_EVICTION_INTERVAL", "300"))
+
+# Characters of conversation summary kept per session (the oldest turns go first)
+SESSION_SUMMARY_CHARS = int(os.getenv("SESSION_SUMMARY_CHARS", "1500"))
+
+# Characters of each answer kept in the summary
+SUMMARY_ANSWER_CHARS = 300
+
+
+# ============================
+# 2. SQLite Checkpointer
+# ============================
+
+class SqliteSaver(BaseCheckpointSaver[str]):
+    """
+    LangGraph checkpointer storing checkpoints and pending writes in one SQLite file.
+    Only the latest checkpoint of a thread (and its parent) is kept, which is all
+    a session needs, and threads idle for more than `ttl` seconds are treated
+    as missing and deleted by `evict_expired`.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: float = SESSION_TTL, serde=None):
+        super().__init__(serde=serde)
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE INDEX IF NOT EXISTS checkpoints_updated_at ON checkpoints (updated_at);
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+        """)
+        self._lock = threading.Lock()
+
+    # -------- Internal helpers --------
+
+    def _expired(self, thread_id: str) -> bool:
+        if self.ttl <= 0:
+            return False
+        row = self._connection.execute(
+            "SELECT MAX(updated_at) FROM checkpoints WHERE thread_id = ?", (thread_id,)
+        ).fetchone()
+        return row[0] is not None and time.time() - row[0] > self.ttl
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._connection.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+        def config(checkpoint_id):
+            return {"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }}
+
+        return CheckpointTuple(
+            config=config(checkpoint_id),
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=config(parent_checkpoint_id) if parent_checkpoint_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    # -------- Sync API --------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id:
+                row = self._connection.execute(
+                    f"SELECT {columns} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                # Latest checkpoint, unless the session expired (a new one starts)
+                if self._expired(thread_id):
+                    self._delete(thread_id)
+                    return None
+                row = self._connection.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                 "metadata_type, metadata FROM checkpoints")
+        conditions, parameters = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            parameters.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                conditions.append("checkpoint_ns = ?")
+                parameters.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                parameters.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            conditions.append("checkpoint_id < ?")
+            parameters.append(get_checkpoint_id(before))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+            tuples = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(tuples) >= limit:
+                    break
+                checkpoint_tuple = self._tuple(thread_id, checkpoint_ns, row)
+                if filter and any(checkpoint_tuple.metadata.get(key) != value for key, value in filter.items()):
+                    continue
+                tuples.append(checkpoint_tuple)
+        yield from tuples
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_checkpoint_id, type_, serialized,
+                 metadata_type, serialized_metadata, time.time()),
+            )
+            # Older checkpoints are never read again: only the latest and its parent are kept
+            kept = (checkpoint["id"], parent_checkpoint_id or checkpoint["id"])
+            for table in ("checkpoints", "writes"):
+                self._connection.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (?, ?)",
+                    (thread_id, checkpoint_ns, *kept),
+                )
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for index, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, index),
+                         channel, type_, serialized, task_path))
+        # Special writes (errors, interrupts) replace the previous ones, regular writes are kept
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock, self._connection:
+            self._connection.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _delete(self, thread_id: str):
+        with self._connection:
+            self._connection.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._connection.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete(thread_id)
+
+    def evict_expired(self) -> List[str]:
+        """
+        Deletes the threads idle for more than `ttl` seconds; returns their ids.
+        """
+        if self.ttl <= 0:
+            return []
+        with self._lock:
+            expired = [thread_id for thread_id, in self._connection.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?",
+                (time.time() - self.ttl,),
+            )]
+            for thread_id in expired:
+                self._delete(thread_id)
+        return expired
+
+    # -------- Async API (SQLite calls run in a worker thread) --------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        for checkpoint_tuple in await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        ):
+            yield checkpoint_tuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: Any = None) -> str:
+        # Zero-padded so versions stored as text still sort in order
+        number = 0 if current is None else int(str(current).split(".")[0])
+        return f"{number + 1:032}"
+
+
+# ============================
+# 3. Conversation Summary
+# ============================
+
+def _excerpt(answer: str) -> str:
+    # First sentences of the answer, cut at a whole word
+    text = " ".join(answer.split())
+    if len(text) <= SUMMARY_ANSWER_CHARS:
+        return text
+    text = text[:SUMMARY_ANSWER_CHARS]
+    sentence_end = max(text.rfind(". "), text.rfind("? "))
+    return text[:sentence_end + 1] if sentence_end > 0 else text.rsplit(" ", 1)[0] + "…"
+
+
+def update_summary(summary: str, question: str, answer: str, max_chars: int = SESSION_SUMMARY_CHARS) -> str:
+    """
+    Appends one turn to the conversation summary, dropping the oldest turns
+    past `max_chars` (no LLM call: the summary is built from the turns themselves).
+    """
+    turns = re.split(r"\n(?=Usuario: )", summary) if summary else []
+    turns.append(f"Usuario: {' '.join(question.split())}\nAsistente: {_excerpt(answer)}")
+    while len(turns) > 1 and len("\n".join(turns)) > max_chars:
+        turns.pop(0)
+    return "\n".join(turns)[-max_chars:]
+
+
+# ============================
+# 4. Session Graph
+# ============================
+
+# Checkpointed state of a session: the last turn's result plus what the next turn needs
+class SessionState(TypedDict):
+    question: str           # Question of the last turn
+    category: str           # Category of the last turn (kept by follow-ups)
+    categories: List[str]   # Every category of a multi-domain turn
+    answer: str             # Answer of the last turn
+    retrieved_docs: list    # Articles of the last turn (reused by follow-ups)
+    context_stats: dict     # Tokens of the packed prompt context
+    follow_up: bool         # Whether the last turn was answered as a follow-up
+    summary: str            # Bounded summary of the conversation so far
+    turns: int              # Questions asked in the session
+
+
+# Keys of the legal assistant result copied into the session
+TURN_KEYS = ("category", "categories", "answer", "retrieved_docs", "context_stats")
+
+
+async def answer_turn(state: SessionState):
+    # The earlier turns of the session (if any) go to the legal assistant graph as context
+    request = {"question": state["question"]}
+    if state.get("turns"):
+        request["session"] = {
+            "category": state.get("category"),
+            "categories": state.get("categories"),
+            "articles": state.get("retrieved_docs"),
+            "summary": state.get("summary"),
+        }
+    result = await legal_assistant_graph.ainvoke(request)
+    return {
+        # Missing keys are reset so nothing of the previous turn leaks into this one
+        **{key: result.get(key) for key in TURN_KEYS},
+        "follow_up": bool(result.get("follow_up")),
+        "summary": update_summary(state.get("summary") or "", state["question"], answer_text(result.get("answer"))),
+        "turns": (state.get("turns") or 0) + 1,
+    }
+
+
+@lru_cache(maxsize=1)
+def get_session_saver() -> SqliteSaver:
+    return SqliteSaver(SESSION_DB_PATH, SESSION_TTL)
+
+
+@lru_cache(maxsize=1)
+def get_session_graph():
+    """
+    One-node graph answering a turn, checkpointed per session (built on first use).
+    """
+    graph = StateGraph(SessionState)
+    graph.add_node("answer_turn", answer_turn)
+    graph.add_edge(START, "answer_turn")
+    graph.add_edge("answer_turn", END)
+    return graph.compile(checkpointer=get_session_saver())
+
+
+# ============================
+# 5. Asking Within a Session
+# ============================
+
+def thread_id(client_name: str, session_id: str) -> str:
+    # Sessions are private to the API client that created them
+    return f"{client_name}:{session_id}"
+
+
+# Turns of the same session run one at a time (each one reads the previous checkpoint)
+_session_locks = {}
+
+
+@asynccontextmanager
+async def session_turn(thread: str):
+    lock, waiters = _session_locks.get(thread, (asyncio.Lock(), 0))
+    _session_locks[thread] = (lock, waiters + 1)
+    try:
+        async with lock:
+            yield {"configurable": {"thread_id": thread}}
+    finally:
+        lock, waiters = _session_locks[thread]
+        if waiters == 1:
+            del _session_locks[thread]
+        else:
+            _session_locks[thread] = (lock, waiters - 1)
+
+
+async def ask_in_session(thread: str, question: str) -> dict:
+    """
+    Answers one turn of a session; returns the session state after it.
+    """
+    async with session_turn(thread) as config:
+        return await get_session_graph().ainvoke({"question": question}, config)
+
+
+async def stream_in_session(thread: str, question: str):
+    """
+    Same as ask_in_session, streamed as SSE frames (see app/streaming.py).
+    """
+    async with session_turn(thread) as config:
+        async for frame in stream_legal_answer(get_session_graph(), question, config=config):
+            yield frame
+
+
+async def end_session(thread: str):
+    await get_session_saver().adelete_thread(thread)
+
+
+async def evict_expired_sessions_periodically():
+    # Background task of the API server (does nothing if SESSION_TTL=0)
+    if not SESSIONS_ENABLED or SESSION_TTL <= 0:
+        return
+    while True:
+        await asyncio.sleep(SESSION_EVICTION_INTERVAL)
+        expired = await asyncio.to_thread(get_session_saver().evict_expired)
+        if expired:
+            logger.info("Evicted %d expired sessions", len(expired))
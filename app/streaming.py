@@ -0,0 +1,141 @@
+# ============================
+# Server-Sent Events (SSE) Streaming
+# ============================
+
+# -------- Standard Library --------
+import os
+
+# -------- LangGraph Streaming Helpers --------
+from langgraph.config import get_stream_writer
+
+# -------- Fast JSON (orjson) --------
+from app.responses import dumps
+
+
+# ============================
+# 1. Stream Event Helpers (used inside the graph nodes)
+# ============================
+
+# Nodes whose LLM tokens are part of the answer shown to the user
+# (the classifier's structured output call is NOT streamed to the client)
+ANSWER_NODES = {"generate_legal_assistance", "fallback"}
+
+
+def article_references(documents):
+    """
+    Turns retrieved Documents into short, JSON-friendly references
+    (file name + page) that can be sent before the answer is generated.
+    """
+    references = []
+    for document in documents:
+        metadata = getattr(document, "metadata", {}) or {}
+        references.append({
+            "source": os.path.basename(str(metadata.get("source", ""))),
+            "page": metadata.get("page"),
+        })
+    return references
+
+
+def emit_stream_event(event: str, data):
+    """
+    Sends a custom event to whoever is streaming the graph with
+    stream_mode="custom". It is a no-op for plain `ainvoke` calls.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        # Called outside of a graph run (e.g. from a unit of code reused elsewhere)
+        return
+    writer({"event": event, "data": data})
+
+
+# ============================
+# 2. SSE Formatting
+# ============================
+
+def format_sse(event: str, data) -> str:
+    """
+    Serializes one Server-Sent Event frame.
+    """
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+# ============================
+# 3. Stream the Legal Assistant Graph as SSE
+# ============================
+
+async def stream_legal_answer(graph, question: str, cache=None, config=None):
+    """
+    Runs the legal assistant graph and yields SSE frames as soon as data is available:
+    - `category`: detected legal category (right after classification)
+    - `articles`: references of the retrieved articles (right after retrieval)
+    - `token`: each generated token of the answer
+    - `done` / `error`: end of the stream
+
+    If an AnswerCache is given, cached answers are replayed without running the graph
+    and freshly generated answers are stored in it. `config` is passed to the graph
+    (e.g. the thread_id of a conversation session).
+    """
+    try:
+        vector = None
+        if cache is not None:
+            cached, vector = await cache.alookup(question)
+            if cached is not None:
+                for frame in replay_cached_answer(cached):
+                    yield frame
+                return
+
+        final_state = None
+        streamed_tokens = False
+
+        # "custom" carries our category/articles events, "messages" carries LLM tokens
+        # and "values" the state of the top graph (kept to fill the cache).
+        # subgraphs=True is needed because the domain agents run as nested graphs.
+        async for namespace, mode, payload in graph.astream(
+            {"question": question},
+            config,
+            stream_mode=["custom", "messages", "values"],
+            subgraphs=True,
+        ):
+            if mode == "custom":
+                yield format_sse(payload["event"], payload["data"])
+                continue
+
+            if mode == "values":
+                if not namespace:
+                    final_state = payload
+                continue
+
+            # mode == "messages": payload is (message_chunk, metadata)
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") not in ANSWER_NODES:
+                continue
+            # `.text()` also handles providers that stream content as a list of blocks
+            token = chunk.text()
+            if token:
+                streamed_tokens = True
+                yield format_sse("token", token)
+
+        # The answer came from a provider that didn't stream (e.g. a hedged request): send it whole
+        if not streamed_tokens and final_state is not None and final_state.get("answer"):
+            answer = final_state["answer"]
+            yield format_sse("token", getattr(answer, "content", answer))
+
+        if cache is not None and final_state is not None:
+            cache.store(question, final_state, vector)
+
+        yield format_sse("done", {})
+    except Exception as exc:
+        # Headers are already sent, so errors must travel inside the stream
+        yield format_sse("error", {"detail": str(exc)})
+
+
+def replay_cached_answer(response: dict):
+    """
+    Emits a cached graph result with the same events as a live run.
+    """
+    answer = response.get("answer", "")
+    yield format_sse("category", response.get("category"))
+    yield format_sse("articles", article_references(response.get("retrieved_docs", [])))
+    yield format_sse("token", getattr(answer, "content", answer))
+    yield format_sse("done", {"cached": True})
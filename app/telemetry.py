@@ -0,0 +1,254 @@
+# ============================
+# Structured Logging + OpenTelemetry Tracing
+# ============================
+
+# Replaces print() on the request path:
+#   - Logs are JSON lines (or plain text) handed to a queue and written by a
+#     background thread, so the event loop never waits on stdout/stderr
+#   - Info/debug logs are sampled per request (warnings and errors are always kept)
+#   - Spans for every graph node and external call (LLM, embeddings, Chroma),
+#     exported to an OTLP collector or to a local JSONL file, with ratio sampling
+#   - A request ID (X-Request-ID header or a new one) set in main.py flows through
+#     the graph in a contextvar and is attached to every log line and the root span
+
+# -------- Standard Library --------
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+# -------- OpenTelemetry API (no-op until a tracer provider is set) --------
+from opentelemetry import trace
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Level of the application loggers ("app.*") and output format ("json" or "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Fraction of requests whose info/debug logs are kept (warnings and errors always are)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Log records waiting for the writer thread; beyond this they are dropped, not awaited
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# "none" (no-op tracer, spans cost next to nothing), "otlp" (OTEL_EXPORTER_OTLP_ENDPOINT,
+# gRPC) or "file" (one JSON span per line in TRACING_FILE)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+
+# Fraction of requests traced (child spans follow the decision of their root span)
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "0.1"))
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "legal-assistant")
+
+
+# ============================
+# 2. Request Context
+# ============================
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_log_sampled = contextvars.ContextVar("log_sampled", default=True)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def start_request(request_id=None) -> str:
+    """
+    Sets the request ID (a new one if none is given) and the log sampling
+    decision for the current context; asyncio tasks started afterwards inherit both.
+    """
+    request_id = (request_id or uuid.uuid4().hex)[:128]
+    _request_id.set(request_id)
+    _log_sampled.set(LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE)
+    return request_id
+
+
+# ============================
+# 3. Logging
+# ============================
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "request_id", "trace_id"}
+
+
+class _RequestContextFilter(logging.Filter):
+    # Runs in the caller's context: drops unsampled records before any formatting
+    # and stamps the request and trace IDs
+    def filter(self, record):
+        if record.levelno < logging.WARNING and not _log_sampled.get():
+            return False
+        record.request_id = _request_id.get()
+        span_context = trace.get_current_span().get_span_context()
+        record.trace_id = format(span_context.trace_id, "032x") if span_context.is_valid else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "trace_id": getattr(record, "trace_id", None),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    # A full queue drops the record instead of blocking the event loop
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+_listener = None
+
+
+def setup_logging():
+    """
+    Sends the "app.*" loggers to stderr through a queue and a writer thread.
+    Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(_RequestContextFilter())
+
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+
+
+# ============================
+# 4. Tracing
+# ============================
+
+# Proxy tracer: no-op until setup_tracing() installs a provider
+tracer = trace.get_tracer("legal_assistant")
+
+
+def _file_exporter(path: str):
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    output = open(path, "a", encoding="utf-8")
+    return ConsoleSpanExporter(out=output, formatter=lambda span: span.to_json(indent=None) + "\n")
+
+
+def setup_tracing():
+    """
+    Installs the tracer provider of TRACING_EXPORTER (nothing to do for "none").
+    """
+    if TRACING_EXPORTER == "none":
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif TRACING_EXPORTER == "file":
+        exporter = _file_exporter(TRACING_FILE)
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER: {TRACING_EXPORTER!r} (expected 'none', 'otlp' or 'file')")
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    # Spans are exported in batches from a background thread
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def shutdown_telemetry():
+    """
+    Flushes pending spans and log records (server shutdown).
+    """
+    global _listener
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def traced(name: str, **attributes):
+    """
+    Decorator running an async function (graph node) inside a span.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name, attributes=attributes):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ============================
+# 5. Request Middleware
+# ============================
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware: takes the X-Request-ID header (or creates an ID), opens the
+    root span of the request and returns the ID in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        request_id = start_request(headers.get(b"x-request-id", b"").decode("latin-1") or None)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        with tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            kind=trace.SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"], "request.id": request_id},
+        ):
+            await self.app(scope, receive, send_with_request_id)
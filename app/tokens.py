@@ -0,0 +1,52 @@
+# ============================
+# Token Counting (tiktoken, with an offline fallback)
+# ============================
+
+import threading
+
+# Encoding used by OpenAI's embedding and GPT-4o-mini era models
+ENCODING_NAME = "cl100k_base"
+
+_encoding = None
+_encoding_failed = False
+_lock = threading.Lock()
+
+
+def _get_encoding():
+    # tiktoken downloads the encoding the first time; if that isn't possible
+    # (offline machine) we fall back to an estimate instead of failing
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(ENCODING_NAME)
+                except Exception:
+                    _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Number of tokens of a text (≈ 4 characters per token when tiktoken is unavailable).
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Longest prefix of a text that fits in `max_tokens` tokens.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,315 @@
+# ============================
+# Article-Level Index ("Artículo N" of the LFT, CCF, CPF, ...)
+# ============================
+
+# Questions that cite a specific article ("artículo 47 de la LFT", "art. 386 CPF")
+# are answered with an O(1) dictionary lookup of the exact article text, instead
+# of a vector search over 1000-character chunks that may split or miss it.
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import List
+
+from langchain_core.documents import Document
+
+# Index location and version marker (to reload after a re-index)
+from app.vectorstore.index_metadata import index_path, read_index_version
+
+
+# ============================
+# 1. Article Headings in the PDFs
+# ============================
+
+# Suffixes of articles added after the original numbering (47 Bis, 123 Ter, ...)
+SUFFIXES = r"bis|ter|qu[áa]ter|quinquies|sexies|septies|octies|nonies|decies"
+
+# "Artículo 54.-", "Artículo 55. -", "Artículo 56.", "Artículo 5o.-", "Artículo 47 Bis.-"
+HEADING = re.compile(
+    rf"^[ \t]*(?:Art[íi]culo|ART[ÍI]CULO)[ \t]+(\d+)[ \t]*(?:o|º|°)?[ \t]*((?:{SUFFIXES})(?:[ \t]*\d+)?)?[ \t]*(?:\.[ \t]*-?|-)",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+# The transitory articles at the end of the laws reuse the article numbers
+END_OF_BODY = re.compile(r"^[ \t]*TRANSITORIOS?[ \t]*$", re.MULTILINE)
+
+# Page header of the Cámara de Diputados PDFs ends with "21 de 450"
+PAGE_COUNTER = re.compile(r"^[ \t]*\d+[ \t]+de[ \t]+\d+[ \t]*$", re.MULTILINE)
+
+
+def article_key(number: str, suffix: str = None) -> str:
+    """
+    Normalized article number: "47", "47 bis", "123 ter".
+    """
+    suffix = " ".join((suffix or "").lower().replace("á", "a").split())
+    return f"{int(number)} {suffix}".strip()
+
+
+def strip_page_header(text: str) -> str:
+    # Drops the repeated page header (law name, chamber, last reform, "N de M")
+    match = PAGE_COUNTER.search(text[:600])
+    return text[match.end():] if match else text
+
+
+class ArticleParser:
+    """
+    Incremental parser: feed it the pages of a law in order and it returns
+    {article key: {"text", "page_start", "page_end"}}. Only the article being
+    parsed is kept in progress, so it also works with streamed pages.
+
+    With a `sink(key, article)` (e.g. ArticleFileWriter.write), every article is
+    handed over as soon as it closes instead of being collected, so memory
+    stays flat whatever the size of the law.
+    """
+
+    def __init__(self, sink=None):
+        self.articles = {}
+        self.sink = sink
+        self.seen = set()
+        self.current = None
+        self.finished_body = False
+
+    def _close(self):
+        # First occurrence wins (later ones are usually reform decrees)
+        if self.current is not None and self.current["key"] not in self.seen:
+            key = self.current.pop("key")
+            self.current["text"] = " ".join(self.current["text"].split())
+            self.seen.add(key)
+            if self.sink is not None:
+                self.sink(key, self.current)
+            else:
+                self.articles[key] = self.current
+        self.current = None
+
+    def _append(self, text: str, page: int):
+        if self.current is not None and text.strip():
+            self.current["text"] += text
+            self.current["page_end"] = page
+
+    def feed(self, text: str, page: int):
+        if self.finished_body:
+            return
+        text = strip_page_header(text)
+
+        end = END_OF_BODY.search(text)
+        if end is not None:
+            text = text[:end.start()]
+
+        position = 0
+        for match in HEADING.finditer(text):
+            self._append(text[position:match.start()], page)
+            self._close()
+            self.current = {
+                "key": article_key(match.group(1), match.group(2)),
+                "text": "",
+                "page_start": page,
+                "page_end": page,
+            }
+            position = match.start()
+        self._append(text[position:], page)
+
+        if end is not None:
+            self._close()
+            self.finished_body = True
+
+    def finish(self) -> dict:
+        self._close()
+        return self.articles
+
+
+def law_code(source: str) -> str:
+    """
+    Law abbreviation of a source PDF, from its file name (laboral/LFT.pdf → LFT).
+    """
+    return os.path.splitext(os.path.basename(source))[0].upper()
+
+
+# ============================
+# 2. Article Files (one per source PDF, next to index/<collection>/)
+# ============================
+
+ARTICLES_DIR = "articles"
+
+
+def _articles_file(persist_directory: str, source: str) -> str:
+    name = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(persist_directory, ARTICLES_DIR, f"{name}.json")
+
+
+class ArticleFileWriter:
+    """
+    Writes the article file of one source PDF one article at a time
+    ({"source", "law", "articles": {key: article}}). The file only replaces
+    the previous one on close(), once the whole PDF was parsed.
+    """
+
+    def __init__(self, persist_directory: str, source: str):
+        self.path = _articles_file(persist_directory, source)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path + ".tmp", "w", encoding="utf-8")
+        header = json.dumps({"source": source, "law": law_code(source)}, ensure_ascii=False)
+        self._file.write(header[:-1] + ', "articles": {')
+        self._count = 0
+
+    def write(self, key: str, article: dict):
+        separator = ", " if self._count else ""
+        self._file.write(f"{separator}{json.dumps(key)}: {json.dumps(article, ensure_ascii=False)}")
+        self._count += 1
+
+    def close(self):
+        self._file.write("}}")
+        self._file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+def save_file_articles(persist_directory: str, source: str, articles: dict):
+    writer = ArticleFileWriter(persist_directory, source)
+    for key, article in articles.items():
+        writer.write(key, article)
+    writer.close()
+
+
+def delete_file_articles(persist_directory: str, source: str):
+    try:
+        os.remove(_articles_file(persist_directory, source))
+    except FileNotFoundError:
+        pass
+
+
+# ============================
+# 3. Citations in Questions
+# ============================
+
+# One cited article number: "47", "5o.", "47 bis"
+CITED_NUMBER = rf"(\d+)[ \t]*(?:o|º|°)?\.?[ \t]*((?:{SUFFIXES})\b)?"
+
+# "artículo 47", "art. 386", "art 47 bis", and lists after the keyword:
+# "artículos 47, 48 y 50", "arts. 47 y 48", "artículos 5o. e 6o."
+CITATION = re.compile(
+    rf"\bart(?:[íi]culos?|s?\.)?[ \t]*"
+    rf"({CITED_NUMBER}(?:(?:[ \t]*(?:,|\b[ye]\b)[ \t]*)+{CITED_NUMBER})*)",
+    re.IGNORECASE,
+)
+NUMBER = re.compile(CITED_NUMBER, re.IGNORECASE)
+
+# How users name each law (the abbreviation itself always works too)
+LAW_NAMES = {
+    "LFT": r"ley federal del trabajo",
+    "CCF": r"c[óo]digo civil",
+    "CPF": r"c[óo]digo penal",
+}
+
+# Naming any law or code, indexed or not ("Ley de Amparo", "artículo 123 constitucional")
+ANY_LAW = re.compile(
+    r"\b(?:ley(?:es)?|c[óo]digos?|constituci[óo]n(?:al)?|reglamentos?|tratados?|convenios?|estatutos?)\b",
+    re.IGNORECASE,
+)
+
+
+def find_citations(question: str) -> List[str]:
+    """
+    Article keys cited in a question, in order ("47", "47 bis", ...).
+    """
+    keys = []
+    for match in CITATION.finditer(question):
+        keys.extend(article_key(number, suffix) for number, suffix in NUMBER.findall(match.group(1)))
+    return list(dict.fromkeys(keys))
+
+
+def mentions_law(question: str, law: str) -> bool:
+    if re.search(rf"\b{re.escape(law)}\b", question, re.IGNORECASE):
+        return True
+    name = LAW_NAMES.get(law)
+    return bool(name and re.search(name, question, re.IGNORECASE))
+
+
+def names_any_law(question: str) -> bool:
+    return bool(ANY_LAW.search(question)) or any(mentions_law(question, law) for law in LAW_NAMES)
+
+
+# ============================
+# 4. In-Memory Article Index (O(1) lookups)
+# ============================
+
+class ArticleIndex:
+    def __init__(self, persist_directory: str):
+        # (law, article key) → Document
+        self.articles = {}
+        self.laws = set()
+        directory = os.path.join(persist_directory, ARTICLES_DIR)
+        if not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                data = json.load(f)
+            self.laws.add(data["law"])
+            for key, article in data["articles"].items():
+                self.articles[(data["law"], key)] = Document(
+                    page_content=article["text"],
+                    metadata={
+                        "source": data["source"],
+                        "law": data["law"],
+                        "article": key,
+                        "page": article["page_start"],
+                        "page_end": article["page_end"],
+                    },
+                )
+
+    def cited_laws(self, question: str) -> set:
+        return {law for law in self.laws if mentions_law(question, law)}
+
+    def lookup(self, question: str) -> List[Document]:
+        """
+        Documents of the articles cited in the question ([] if none is cited or found).
+        Citations of laws that are not in this index are ignored: with no law of
+        this index named, every law is searched only if no law at all is named
+        ("artículo 123 constitucional" is not art. 123 of the LFT).
+        """
+        keys = find_citations(question)
+        if not keys:
+            return []
+        laws = self.cited_laws(question)
+        if not laws:
+            if names_any_law(question):
+                return []
+            laws = self.laws
+        return [self.articles[(law, key)] for key in keys for law in sorted(laws) if (law, key) in self.articles]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_article_index(collection_name: str) -> ArticleIndex:
+    """
+    Article index of a collection, reloaded only when the collection is re-indexed.
+    """
+    persist_directory = index_path(collection_name)
+    version = read_index_version(persist_directory)
+    cached = _indexes.get(collection_name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _lock:
+        index = ArticleIndex(persist_directory)
+        _indexes[collection_name] = (version, index)
+    return index
+
+
+def release_article_index(collection_name: str):
+    # Frees the articles of an idle collection (reloaded on next use)
+    with _lock:
+        _indexes.pop(collection_name, None)
+
+
+def cited_collections(question: str, collections) -> List[str]:
+    """
+    Collections whose law is explicitly cited together with an article number
+    ("art. 386 CPF" → ["penal"], "art. 47 LFT y art. 386 CPF" → ["laboral", "penal"]).
+    """
+    if not find_citations(question):
+        return []
+    return [name for name in collections if get_article_index(name).cited_laws(question)]
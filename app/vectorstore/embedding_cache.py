@@ -0,0 +1,176 @@
+# ============================
+# Persistent Embedding Cache (on-disk key-value store + in-memory LRU)
+# ============================
+
+# -------- Standard Library --------
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List
+
+# -------- Numerical computing (compact float32 storage) --------
+import numpy as np
+
+# -------- LangChain embeddings interface --------
+from langchain_core.embeddings import Embeddings
+
+# -------- Prometheus metrics --------
+from app.metrics import CACHE_LOOKUPS
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Number of vectors kept in memory in front of the on-disk store
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "10000"))
+
+
+# ============================
+# 2. On-Disk Key-Value Store (SQLite)
+# ============================
+
+class EmbeddingStore:
+    """
+    Maps a key (model name + text hash) to a float32 vector, in a single SQLite file.
+    Safe to share between threads and between processes (ingestion + API server).
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[bytes]) -> dict:
+        found = {}
+        with self._lock:
+            # Query in slices to stay under SQLite's host parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: dict):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+            )
+
+
+# ============================
+# 3. Cached Embeddings
+# ============================
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any LangChain embedding model so the same text is never embedded twice:
+    memory LRU → SQLite store → underlying model (only for the texts still missing).
+    Used both for query embeddings (retrievers) and chunk embeddings (ingestion).
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, path: str,
+                 memory_size: int = EMBEDDING_CACHE_MEMORY_SIZE):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = EmbeddingStore(path)
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    # -------- Internal helpers --------
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def _remember(self, key: bytes, vector: List[float]):
+        with self._memory_lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, texts: List[str]):
+        # Returns (key of each text, {key: vector} found so far, {key: text} still missing)
+        keys = [self._key(text) for text in texts]
+        vectors = {}
+        with self._memory_lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+        self.counters["memory_hits"] += len(vectors)
+        CACHE_LOOKUPS.inc(len(vectors), cache="embedding", result="memory_hit")
+
+        missing_keys = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing_keys:
+            from_disk = self.store.get_many(missing_keys)
+            self.counters["disk_hits"] += len(from_disk)
+            CACHE_LOOKUPS.inc(len(from_disk), cache="embedding", result="disk_hit")
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+            vectors.update(from_disk)
+
+        # Deduplicated texts that have to go to the embedding model
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        self.counters["misses"] += len(missing)
+        CACHE_LOOKUPS.inc(len(missing), cache="embedding", result="miss")
+        return keys, vectors, missing
+
+    def _save(self, vectors: dict, missing: dict, embedded: List[List[float]]):
+        new_vectors = dict(zip(missing, embedded))
+        self.store.put_many(new_vectors)
+        for key, vector in new_vectors.items():
+            self._remember(key, vector)
+        vectors.update(new_vectors)
+
+    # -------- Sync API --------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        if missing:
+            self._save(vectors, missing, self.underlying.embed_documents(list(missing.values())))
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, vectors, missing = self._lookup([text])
+        if missing:
+            self._save(vectors, missing, [self.underlying.embed_query(text)])
+        return vectors[keys[0]]
+
+    # -------- Async API (disk access runs in a worker thread) --------
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            embedded = await self.underlying.aembed_documents(list(missing.values()))
+            await asyncio.to_thread(self._save, vectors, missing, embedded)
+        return [vectors[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Fast path: repeated questions are answered from memory without a thread hop
+        key = self._key(text)
+        with self._memory_lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                CACHE_LOOKUPS.inc(cache="embedding", result="memory_hit")
+                return self._memory[key]
+
+        keys, vectors, missing = await asyncio.to_thread(self._lookup, [text])
+        if missing:
+            embedded = [await self.underlying.aembed_query(text)]
+            await asyncio.to_thread(self._save, vectors, missing, embedded)
+        return vectors[keys[0]]
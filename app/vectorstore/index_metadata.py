@@ -0,0 +1,166 @@
+# ============================
+# Vector Index Metadata (location + version markers)
+# ============================
+
+import json
+import os
+import time
+
+
+# ============================
+# 1. Index Location
+# ============================
+
+# Root folder that contains one Chroma index per collection (index/<collection>/),
+# by default the index/ folder at the root of the repository
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+INDEX_DIR = os.getenv("INDEX_DIR", os.path.join(_ROOT_DIR, "index"))
+
+
+# Collections stored outside INDEX_DIR (set from the domain registry's "index_path")
+INDEX_PATHS = {}
+
+
+def index_path(collection_name: str) -> str:
+    """
+    Returns the persist directory of a collection (e.g. index/laboral/).
+    """
+    if collection_name in INDEX_PATHS:
+        return os.path.join(INDEX_PATHS[collection_name], "")
+    return os.path.join(INDEX_DIR, collection_name, "")
+
+
+# ============================
+# 2. Index Version Marker
+# ============================
+
+# File written by the ingestion script every time a collection is (re)indexed.
+# Anything derived from the index (e.g. cached answers) can compare versions
+# to know when it became stale.
+VERSION_FILE = "index_version"
+
+
+def mark_index_updated(persist_directory: str) -> str:
+    """
+    Writes a new version marker into the persist directory and returns it.
+    """
+    version = str(time.time_ns())
+    os.makedirs(persist_directory, exist_ok=True)
+    with open(os.path.join(persist_directory, VERSION_FILE), "w") as f:
+        f.write(version)
+    return version
+
+
+def read_index_version(persist_directory: str):
+    """
+    Returns the current version marker of an index, or None if it was never marked.
+    """
+    try:
+        with open(os.path.join(persist_directory, VERSION_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+# Seconds a version marker read from disk is trusted by the request path
+# (a re-index is noticed at most this late)
+INDEX_VERSION_TTL = float(os.getenv("INDEX_VERSION_TTL", "10"))
+
+# persist directory → (version, monotonic time it was read)
+_versions = {}
+
+
+def cached_index_version(persist_directory: str, ttl: float = INDEX_VERSION_TTL):
+    """
+    Same as read_index_version, but re-reads the marker at most every `ttl` seconds,
+    so hot paths (cache lookups, classification) don't touch the disk per request.
+    """
+    cached = _versions.get(persist_directory)
+    if cached is not None and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+    version = read_index_version(persist_directory)
+    _versions[persist_directory] = (version, time.monotonic())
+    return version
+
+
+# ============================
+# 3. Ingestion Manifest
+# ============================
+
+# File that records, per source PDF, its content hash and the IDs of its chunks,
+# so re-running the ingestion only touches the PDFs that changed
+MANIFEST_FILE = "manifest.json"
+
+
+def load_manifest(persist_directory: str) -> dict:
+    """
+    Returns the manifest of an index ({"files": {path: {"sha256", "chunk_ids"}}}).
+    """
+    try:
+        with open(os.path.join(persist_directory, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+
+
+def save_manifest(persist_directory: str, manifest: dict):
+    """
+    Writes the manifest atomically (a crash never leaves a half-written file).
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+# ============================
+# 4. Embedding Signature
+# ============================
+
+# File that records which embedding backend, model and dimension built an index.
+# Vectors of different models are not comparable, so an index must always be
+# queried (and extended) with the same embeddings it was built with.
+EMBEDDINGS_FILE = "embeddings.json"
+
+
+class EmbeddingMismatchError(ValueError):
+    pass
+
+
+def load_embedding_signature(persist_directory: str):
+    """
+    Returns {"backend", "model", "dimension"} of an index, or None if it was not recorded.
+    """
+    try:
+        with open(os.path.join(persist_directory, EMBEDDINGS_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_embedding_signature(persist_directory: str, signature: dict):
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, EMBEDDINGS_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(signature, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def check_embedding_signature(persist_directory: str, signature: dict):
+    """
+    Raises EmbeddingMismatchError if the index was built with another backend, model
+    or dimension. Indexes built before signatures were recorded are accepted.
+    """
+    recorded = load_embedding_signature(persist_directory)
+    if recorded is None:
+        return
+    for field in ("backend", "model", "dimension"):
+        if signature.get(field) is not None and recorded.get(field) is not None \
+                and signature[field] != recorded[field]:
+            raise EmbeddingMismatchError(
+                f"Index {persist_directory} was built with {recorded['backend']}:{recorded['model']} "
+                f"({recorded.get('dimension')} dims), but the configured embeddings are "
+                f"{signature['backend']}:{signature['model']} ({signature.get('dimension')} dims). "
+                f"Re-index it (delete the folder and run ingest_docs.py) or change EMBEDDING_BACKEND."
+            )
@@ -2,97 +2,517 @@
 # PDF Indexing Script with LangChain + Chroma
 # ============================
 
+# Incremental and idempotent: every chunk gets a stable ID (file + page + content hash)
+# and a manifest per collection remembers what is already indexed, so re-running
+# this script only re-embeds the PDFs that changed and removes the deleted ones.
+#
+# Pipeline:
+#   1. PDFs are parsed and split on a process pool (CPU bound, one PDF per worker)
+#   2. Chunks are grouped into embedding batches (max texts / max tokens per request)
+#   3. Batches are embedded concurrently under a tokens-per-minute limiter
+#   4. Embedded batches are upserted into Chroma in bulk
+#   5. The BM25 index of every changed collection is rebuilt (lexical retrieval)
+#
+# With --streaming the same steps run as a chain of generators instead
+# (pages → chunks → embedding batches → store writes) with at most
+# --max-in-flight batches held in memory, so peak memory stays flat
+# no matter how large a PDF or the corpus is.
+#
+# Usage:
+#   PYTHONPATH=. python3 app/vectorstore/ingest_docs.py --docs docs --index index
+#   PYTHONPATH=. python3 app/vectorstore/ingest_docs.py --docs docs --index index --streaming
+
+import argparse
+import hashlib
 import os
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 
 # PDF loader that converts PDFs into LangChain documents
 from langchain_community.document_loaders import PyPDFLoader
 
-# Embedding model from OpenAI (requires OPENAI_API_KEY in env)
-from langchain_openai import OpenAIEmbeddings
-
 # Used to split long text into chunks for better embedding and retrieval
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-# Vector store to save and search embedded documents
-from langchain_chroma import Chroma
+# Version marker so caches built on top of the index know it changed,
+# and manifest of the files already indexed
+from app.vectorstore.index_metadata import (
+    INDEX_DIR,
+    MANIFEST_FILE,
+    check_embedding_signature,
+    load_embedding_signature,
+    load_manifest,
+    mark_index_updated,
+    save_embedding_signature,
+    save_manifest,
+)
+
+# Token counting for embedding batches and the rate limiter (tiktoken)
+from app.tokens import count_tokens
+
+# Article-level index ("Artículo N") for direct lookups of cited articles
+from app.vectorstore.articles import ArticleFileWriter, ArticleParser, delete_file_articles, save_file_articles
+
+# BM25 inverted index for the lexical side of hybrid retrieval
+from app.vectorstore.lexical import LEXICAL_FILE, BM25Index, build_lexical_index
 
 # Optional: Turn off Chroma's telemetry data collection
 os.environ["CHROMA_TELEMETRY"] = "FALSE"
 
 
 # ============================
-# 1. Walk through the docs/ folder recursively
+# 1. Stable Identifiers
 # ============================
 
-# This loop traverses all subdirectories and files under the /docs folder
-for dirpath, dirnames, filenames in os.walk(
-    "/home/janf/Projects/legal_assistant_ai_agent/docs"
-):
-    # Get the name of the current folder (used as collection/category name)
-    parent_dir = dirpath.split("/")[-1]
+def file_sha256(path: str) -> str:
+    """
+    Content hash of a file (detects changed PDFs even if the name is the same).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    for filename in filenames:
-        # Full path to the current PDF file
-        pdf_path = os.path.join(dirpath, filename)
 
-        # ============================
-        # 2. Define Indexing Metadata
-        # ============================
+def chunk_ids(source: str, chunks) -> list:
+    """
+    Stable ID per chunk, derived from the source file, the page and the chunk content.
+    Identical chunks on the same page get an occurrence number to stay unique.
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        page = chunk.metadata.get("page")
+        content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+        base = f"{source}:{page}:{content_hash}"
+        seen[base] = seen.get(base, -1) + 1
+        ids.append(hashlib.sha256(f"{base}:{seen[base]}".encode("utf-8")).hexdigest())
+    return ids
 
-        # Directory where the vector index will be stored
-        persist_directory = f"index/{parent_dir}/"
 
-        # Collection name for Chroma (usually same as category/folder name)
-        collection_name = parent_dir
+# ============================
+# 2. Load and Split One PDF (runs in a worker process)
+# ============================
 
-        # ============================
-        # 3. Load and Process PDF
-        # ============================
+def make_text_splitter():
+    # Large documents are split into overlapping text chunks
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,       # Each chunk is up to 1000 characters
+        chunk_overlap=200      # Chunks overlap by 200 characters
+    )
 
-        # Load the PDF using PyPDFLoader (each page becomes a document)
-        loader = PyPDFLoader(pdf_path)
-        docs = loader.load()
 
-        # ============================
-        # 4. Create Embeddings
-        # ============================
+def load_and_split(pdf_path: str):
+    """
+    Returns (number of pages, chunks, articles) of a PDF.
+    """
+    # Load the PDF using PyPDFLoader (each page becomes a document)
+    loader = PyPDFLoader(pdf_path)
+    docs = loader.load()
 
-        # Initialize the embedding model (uses your OpenAI API key)
-        embeddings = OpenAIEmbeddings()
+    # Article-level index of the law ("Artículo N" → text + page span)
+    article_parser = ArticleParser()
+    for doc in docs:
+        article_parser.feed(doc.page_content, doc.metadata.get("page"))
 
-        # ============================
-        # 5. Set up Chroma Vector Store
-        # ============================
+    # Apply the splitter to the loaded PDF documents
+    return len(docs), make_text_splitter().split_documents(docs), article_parser.finish()
 
-        # Create or load a vector database (per collection/category)
-        vector_store = Chroma(
-            collection_name=collection_name,
-            embedding_function=embeddings,
-            persist_directory=persist_directory  # Save to disk
-        )
 
-        # ============================
-        # 6. Split Documents into Chunks
-        # ============================
+def iter_page_chunks(pdf_path: str):
+    """
+    Streaming version of `load_and_split`: yields (page, chunks of that page) one page at a time.
+    Pages are split independently in both versions, so chunks (and IDs) are identical.
+    """
+    text_splitter = make_text_splitter()
+    for page in PyPDFLoader(pdf_path).lazy_load():
+        yield page, text_splitter.split_documents([page])
+
+
+# ============================
+# 3. Embedding Batches + Rate Limiting
+# ============================
+
+def make_batches(items, max_texts: int, max_tokens: int):
+    """
+    Groups (id, chunk, tokens) items so every request stays under
+    `max_texts` inputs and `max_tokens` tokens.
+    """
+    batch, batch_tokens = [], 0
+    for item in items:
+        tokens = item[2]
+        if batch and (len(batch) >= max_texts or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+class TokenRateLimiter:
+    """
+    Token bucket shared by the embedding threads: `acquire(n)` blocks until
+    n tokens fit in the tokens-per-minute budget.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait_seconds = (tokens - self.available) * 60 / self.capacity
+            time.sleep(wait_seconds)
+
+
+# ============================
+# 4. Chroma Collections (bulk upserts with precomputed embeddings)
+# ============================
+
+def open_collection(index_dir: str, collection_name: str):
+    import chromadb
+    persist_directory = os.path.join(index_dir, collection_name, "")
+    client = chromadb.PersistentClient(path=persist_directory)
+    # Same collection layout as langchain_chroma.Chroma (embeddings are provided by us)
+    return client.get_or_create_collection(collection_name, embedding_function=None)
+
+
+# ============================
+# 5. The Ingestion Pipeline
+# ============================
+
+class IngestionPipeline:
+    def __init__(self, docs_dir, index_dir, embeddings, workers=None, concurrency=4,
+                 batch_size=256, batch_tokens=100_000, tokens_per_minute=1_000_000,
+                 max_in_flight=None, signature=None):
+        self.docs_dir = docs_dir
+        self.index_dir = index_dir
+        self.embeddings = embeddings
+        # Backend/model of `embeddings`, recorded in (and checked against) every index
+        self.signature = signature
+        self.dimension = None
+        self.workers = workers or os.cpu_count()
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.limiter = TokenRateLimiter(tokens_per_minute)
+        # Streaming mode: max embedding batches submitted but not yet written
+        self.max_in_flight = max_in_flight or concurrency * 2
+        self.stats = {"files": 0, "pages": 0, "chunks": 0, "tokens": 0}
+        self._collections = {}
+        # BM25 indexes (SQLite) of the collections being changed, updated with every write
+        self._lexical_indexes = {}
+
+    def collection(self, collection_name: str):
+        if collection_name not in self._collections:
+            self._collections[collection_name] = open_collection(self.index_dir, collection_name)
+        return self._collections[collection_name]
+
+    def persist_directory(self, collection_name: str) -> str:
+        return os.path.join(self.index_dir, collection_name, "")
+
+    def lexical_index(self, collection_name: str):
+        # Opened for writing on the first change of the collection (unchanged collections
+        # never open it); every batch goes straight to disk, nothing is kept in memory
+        if collection_name not in self._lexical_indexes:
+            persist_directory = self.persist_directory(collection_name)
+            if BM25Index.load(persist_directory) is None:
+                build_lexical_index(persist_directory, self.collection(collection_name))
+            self._lexical_indexes[collection_name] = BM25Index.load(persist_directory, writable=True)
+        return self._lexical_indexes[collection_name]
+
+    # -------- Step 0: decide what to do --------
 
-        # Large documents are split into overlapping text chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,       # Each chunk is up to 1000 characters
-            chunk_overlap=200      # Chunks overlap by 200 characters
+    def collect_pdfs(self) -> dict:
+        """
+        Groups the files under docs_dir by the name of their folder (= collection name).
+        Collections indexed before whose folder is now gone get an empty list,
+        so their chunks are removed too.
+        """
+        collections = {}
+        for dirpath, dirnames, filenames in os.walk(self.docs_dir):
+            if not filenames:
+                continue
+            # Get the name of the current folder (used as collection/category name)
+            parent_dir = os.path.basename(os.path.normpath(dirpath))
+            collections.setdefault(parent_dir, []).extend(
+                os.path.join(dirpath, filename) for filename in sorted(filenames)
+            )
+
+        if os.path.isdir(self.index_dir):
+            for collection_name in os.listdir(self.index_dir):
+                if os.path.exists(os.path.join(self.index_dir, collection_name, MANIFEST_FILE)):
+                    collections.setdefault(collection_name, [])
+        return collections
+
+    def plan(self):
+        """
+        Compares the PDFs on disk with the manifests. Deletes the chunks of removed
+        and changed PDFs, and returns the manifests plus the list of PDFs to (re)index.
+        """
+        manifests, todo = {}, []
+        for collection_name, pdf_paths in self.collect_pdfs().items():
+            # Never mix vectors of two embedding models in the same collection
+            if self.signature:
+                check_embedding_signature(self.persist_directory(collection_name), self.signature)
+            manifest = load_manifest(self.persist_directory(collection_name))
+            manifests[collection_name] = manifest
+            indexed_files = manifest["files"]
+            current_sources = set()
+
+            for pdf_path in pdf_paths:
+                # Manifest keys are relative to docs_dir, so the docs folder can be moved
+                source = os.path.relpath(pdf_path, self.docs_dir)
+                current_sources.add(source)
+                sha256 = file_sha256(pdf_path)
+                previous = indexed_files.get(source)
+                if previous is not None and previous["sha256"] == sha256:
+                    print(f"⏭️  Sin cambios: {source}")
+                    continue
+                # The PDF changed: drop its old chunks before adding the new ones
+                if previous is not None:
+                    self.delete(collection_name, previous["chunk_ids"])
+                    delete_file_articles(self.persist_directory(collection_name), source)
+                    del indexed_files[source]
+                    manifest["changed"] = True
+                todo.append((collection_name, source, pdf_path, sha256))
+
+            # PDFs that were indexed before but no longer exist
+            for source in sorted(set(indexed_files) - current_sources):
+                self.delete(collection_name, indexed_files.pop(source)["chunk_ids"])
+                delete_file_articles(self.persist_directory(collection_name), source)
+                manifest["changed"] = True
+                print(f"🗑️  Eliminado del índice: {source}")
+        return manifests, todo
+
+    def delete(self, collection_name: str, ids: list):
+        if ids:
+            self.collection(collection_name).delete(ids=ids)
+            self.lexical_index(collection_name).remove(ids)
+
+    # -------- Steps 2-4: embed and write --------
+
+    def embed_batch(self, batch):
+        # Runs in an embedding thread
+        self.limiter.acquire(sum(tokens for _, _, tokens in batch))
+        vectors = self.embeddings.embed_documents([chunk.page_content for _, chunk, _ in batch])
+        if vectors:
+            self.dimension = len(vectors[0])
+        return vectors
+
+    def upsert(self, collection_name: str, batch, vectors):
+        ids = [chunk_id for chunk_id, _, _ in batch]
+        documents = [chunk.page_content for _, chunk, _ in batch]
+        metadatas = [chunk.metadata or None for _, chunk, _ in batch]
+        self.collection(collection_name).upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+        # The BM25 postings are updated from the same chunks (never re-read from Chroma)
+        self.lexical_index(collection_name).add(ids, documents, metadatas)
+
+    def run(self):
+        start = time.perf_counter()
+        manifests, todo = self.plan()
+
+        # Files whose batches are still being embedded: key → [remaining batches, manifest entry, articles]
+        in_progress = {}
+
+        with ProcessPoolExecutor(max_workers=self.workers) as parsers, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as embedders:
+            parsing = {parsers.submit(load_and_split, pdf_path): (collection_name, source, sha256)
+                       for collection_name, source, pdf_path, sha256 in todo}
+            embedding = {}
+
+            while parsing or embedding:
+                done, _ = wait(list(parsing) + list(embedding), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in parsing:
+                        # 1 → 2: a PDF was parsed, split its chunks into embedding batches
+                        collection_name, source, sha256 = parsing.pop(future)
+                        pages, chunks, articles = future.result()
+                        ids = chunk_ids(source, chunks)
+                        items = [(chunk_id, chunk, count_tokens(chunk.page_content))
+                                 for chunk_id, chunk in zip(ids, chunks)]
+                        batches = list(make_batches(items, self.batch_size, self.batch_tokens))
+
+                        key = (collection_name, source)
+                        in_progress[key] = [len(batches), {"sha256": sha256, "chunk_ids": ids}, articles]
+                        self.stats["files"] += 1
+                        self.stats["pages"] += pages
+                        self.stats["chunks"] += len(chunks)
+                        self.stats["tokens"] += sum(tokens for _, _, tokens in items)
+
+                        for batch in batches:
+                            embedding[embedders.submit(self.embed_batch, batch)] = (key, batch)
+                        if not batches:
+                            self._finish_file(manifests, key, in_progress)
+                    else:
+                        # 3 → 4: a batch was embedded, write it in bulk
+                        key, batch = embedding.pop(future)
+                        self.upsert(key[0], batch, future.result())
+                        in_progress[key][0] -= 1
+                        if in_progress[key][0] == 0:
+                            self._finish_file(manifests, key, in_progress)
+
+        self._finalize(manifests)
+        self.report(time.perf_counter() - start)
+
+    def run_streaming(self):
+        """
+        Bounded-memory mode: PDFs are read page by page and every stage is a generator.
+        Only `max_in_flight` embedding batches (plus the page being split) are held in memory.
+        """
+        start = time.perf_counter()
+        manifests, todo = self.plan()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as embedders:
+            # future → (collection name, batch) of every batch not yet written
+            in_flight = {}
+
+            for collection_name, source, pdf_path, sha256 in todo:
+                ids = []
+                # Articles go to disk as they close; only the current one stays in memory
+                article_writer = ArticleFileWriter(self.persist_directory(collection_name), source)
+                article_parser = ArticleParser(sink=article_writer.write)
+                items = self._iter_chunk_items(source, pdf_path, ids, article_parser)
+                for batch in make_batches(items, self.batch_size, self.batch_tokens):
+                    # Backpressure: stop reading the PDF until a batch slot is free
+                    while len(in_flight) >= self.max_in_flight:
+                        self._write_completed(in_flight, FIRST_COMPLETED)
+                    in_flight[embedders.submit(self.embed_batch, batch)] = (collection_name, batch)
+
+                # A file is recorded in the manifest only once all its chunks are written
+                self._write_completed(in_flight, ALL_COMPLETED)
+                article_parser.finish()
+                article_writer.close()
+                manifests[collection_name]["files"][source] = {"sha256": sha256, "chunk_ids": ids}
+                manifests[collection_name]["changed"] = True
+                self.stats["files"] += 1
+                print(f"✅ Indexado: {source} ({len(ids)} fragmentos)")
+
+        self._finalize(manifests)
+        self.report(time.perf_counter() - start)
+
+    def _iter_chunk_items(self, source: str, pdf_path: str, ids: list, article_parser):
+        # pages → (id, chunk, tokens) items; collects the chunk IDs for the manifest
+        # and feeds the article parser (which writes each article as it closes)
+        for page, page_chunks in iter_page_chunks(pdf_path):
+            self.stats["pages"] += 1
+            article_parser.feed(page.page_content, page.metadata.get("page"))
+            page_ids = chunk_ids(source, page_chunks)
+            ids.extend(page_ids)
+            for chunk_id, chunk in zip(page_ids, page_chunks):
+                tokens = count_tokens(chunk.page_content)
+                self.stats["chunks"] += 1
+                self.stats["tokens"] += tokens
+                yield chunk_id, chunk, tokens
+
+    def _write_completed(self, in_flight: dict, return_when):
+        done, _ = wait(list(in_flight), return_when=return_when)
+        for future in done:
+            collection_name, batch = in_flight.pop(future)
+            self.upsert(collection_name, batch, future.result())
+
+    def _finalize(self, manifests: dict):
+        for collection_name, manifest in manifests.items():
+            persist_directory = self.persist_directory(collection_name)
+            changed = manifest.pop("changed", False)
+            # BM25 index updated batch by batch during the run; collections that
+            # were indexed before it existed get it rebuilt from Chroma (in pages)
+            if collection_name in self._lexical_indexes:
+                self._lexical_indexes.pop(collection_name).close()
+            elif not os.path.exists(os.path.join(persist_directory, LEXICAL_FILE)):
+                build_lexical_index(persist_directory, self.collection(collection_name))
+            if changed:
+                save_manifest(persist_directory, manifest)
+                if self.signature:
+                    recorded = load_embedding_signature(persist_directory) or {}
+                    dimension = self.dimension or self.signature.get("dimension") or recorded.get("dimension")
+                    save_embedding_signature(persist_directory, {**self.signature, "dimension": dimension})
+                # Bump the index version (invalidates cached answers for this collection)
+                mark_index_updated(persist_directory)
+            print(f"✅ Índice {collection_name} actualizado en: {persist_directory}")
+
+    def _finish_file(self, manifests, key, in_progress):
+        collection_name, source = key
+        manifest = manifests[collection_name]
+        _, manifest["files"][source], articles = in_progress.pop(key)
+        save_file_articles(self.persist_directory(collection_name), source, articles)
+        manifest["changed"] = True
+        print(f"✅ Indexado: {source} ({len(manifest['files'][source]['chunk_ids'])} fragmentos)")
+
+    # -------- Throughput report --------
+
+    def report(self, elapsed: float):
+        elapsed = max(elapsed, 1e-9)
+        print(
+            f"📊 {self.stats['files']} PDFs, {self.stats['pages']} páginas, "
+            f"{self.stats['chunks']} fragmentos, {self.stats['tokens']} tokens en {elapsed:.1f}s → "
+            f"{self.stats['pages'] / elapsed:.1f} páginas/s, "
+            f"{self.stats['chunks'] / elapsed:.1f} fragmentos/s, "
+            f"{self.stats['tokens'] / elapsed:.0f} tokens/s"
         )
 
-        # Apply the splitter to the loaded PDF documents
-        all_splits = text_splitter.split_documents(docs)
 
-        # ============================
-        # 7. Add Chunks to the Vector Store
-        # ============================
+# ============================
+# 6. Command Line Interface
+# ============================
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the PDFs under docs/<collection>/ into Chroma.")
+    parser.add_argument("--docs", default=os.path.join(os.path.dirname(os.path.normpath(INDEX_DIR)), "docs"),
+                        help="Folder with one sub-folder of PDFs per collection")
+    parser.add_argument("--index", default=INDEX_DIR,
+                        help="Folder where one Chroma index per collection is written (INDEX_DIR)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes parsing PDFs (default: number of CPUs)")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Embedding requests in flight (default: 4, or 1 with EMBEDDING_BACKEND=onnx "
+                             "since each local batch already uses all the cores)")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="Max chunks per embedding request")
+    parser.add_argument("--batch-tokens", type=int, default=100_000,
+                        help="Max tokens per embedding request")
+    parser.add_argument("--tpm", type=int, default=1_000_000,
+                        help="Embedding tokens-per-minute limit of the provider account")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Bounded-memory mode: stream pages → chunks → batches → store")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Streaming mode: max embedding batches in memory (default: 2 x concurrency)")
+    args = parser.parse_args()
+
+    # Embedding model of EMBEDDING_BACKEND (OpenAI requires OPENAI_API_KEY in env or `.env`),
+    # behind the persistent embedding cache shared with the retrievers
+    from app.vectorstore.retrievers import EMBEDDING_BACKEND, embedding_signature, get_embeddings
 
-        # Store all the chunks as embeddings in the vector DB
-        vector_store.add_documents(all_splits)
+    pipeline = IngestionPipeline(
+        docs_dir=args.docs,
+        index_dir=args.index,
+        embeddings=get_embeddings(),
+        signature=embedding_signature(),
+        workers=args.workers,
+        concurrency=args.concurrency or (1 if EMBEDDING_BACKEND == "onnx" else 4),
+        batch_size=args.batch_size,
+        batch_tokens=args.batch_tokens,
+        tokens_per_minute=args.tpm,
+        max_in_flight=args.max_in_flight,
+    )
+    if args.streaming:
+        pipeline.run_streaming()
+    else:
+        pipeline.run()
 
-        # ============================
-        # 8. Done!
-        # ============================
 
-        print(f"✅ Índice {collection_name} creado y guardado en: {persist_directory}")
+if __name__ == "__main__":
+    main()
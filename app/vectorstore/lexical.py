@@ -0,0 +1,295 @@
+# ============================
+# Lexical (BM25) Index + Reciprocal Rank Fusion
+# ============================
+
+# Dense search does poorly on exact legal terms ("finiquito", "PTU", "usucapión")
+# and needs a remote embedding per query. This BM25 inverted index is built at
+# ingest time (index/<collection>/bm25.sqlite3) and needs no embedding model.
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import List
+
+from langchain_core.documents import Document
+
+# Same normalization (accents, punctuation) used for the cache keys
+from app.cache import normalize_question
+
+# Index location and version marker (to reload after a re-index)
+from app.vectorstore.index_metadata import index_path, read_index_version
+
+
+# ============================
+# 1. Tokenization
+# ============================
+
+# Very frequent Spanish words that carry no meaning for the search
+STOPWORDS = set("""
+a al algo ante con contra de del desde el en entre era es esa ese eso esta este esto
+ha hay la las le les lo los mas me mi muy no nos o para pero por que se si sin sobre
+su sus te tu un una uno unos unas y ya
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in normalize_question(text).split() if token not in STOPWORDS]
+
+
+# ============================
+# 2. BM25 Inverted Index (SQLite, on disk)
+# ============================
+
+LEXICAL_FILE = "bm25.sqlite3"
+
+# File of the previous in-memory format, removed when the index is rebuilt
+LEGACY_LEXICAL_FILE = "bm25.json"
+
+# Chunks read from Chroma per page when a missing BM25 index is rebuilt
+LEXICAL_PAGE_SIZE = int(os.getenv("LEXICAL_PAGE_SIZE", "1000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    number INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    frequency INTEGER NOT NULL,
+    PRIMARY KEY (term, number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_number ON postings (number);
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES ('chunks', 0), ('length', 0);
+"""
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of one collection, stored in SQLite
+    (index/<collection>/bm25.sqlite3): postings (term → chunk number, term frequency),
+    chunk texts and metadata stay on disk. A search reads the postings of the
+    query terms and the texts of the top-k chunks only, and ingestion writes each
+    batch of chunks as it comes, so memory doesn't grow with the collection.
+    """
+
+    def __init__(self, path: str, writable: bool = False, k1=1.5, b=0.75):
+        self.path = path
+        self.writable = writable
+        self.k1 = k1
+        self.b = b
+        # Read-only: one connection per thread (searches run in worker threads).
+        # Writable: a single connection used by the ingestion pipeline
+        self._local = threading.local()
+        self._writer = None
+        if writable:
+            self._writer = sqlite3.connect(path, check_same_thread=False)
+            self._writer.executescript(SCHEMA)
+            self._writer.commit()
+
+    @classmethod
+    def load(cls, persist_directory: str, writable: bool = False):
+        """
+        Opens the index of a collection (None if it was never built).
+        """
+        path = os.path.join(persist_directory, LEXICAL_FILE)
+        if not os.path.exists(path):
+            return None
+        return cls(path, writable)
+
+    def _connection(self):
+        if self._writer is not None:
+            return self._writer
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    # -------- Incremental updates (ingestion) --------
+
+    def add(self, ids, texts, metadatas):
+        """
+        Adds chunks to the index; a chunk already indexed under the same ID is replaced.
+        """
+        with self._writer:
+            self._remove(ids)
+            added = 0
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                number = self._writer.execute(
+                    "INSERT INTO chunks (id, text, metadata, length) VALUES (?, ?, ?, ?)",
+                    (chunk_id, text, json.dumps(metadata or {}, ensure_ascii=False, sort_keys=True), length),
+                ).lastrowid
+                self._writer.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)",
+                    [(term, number, frequency) for term, frequency in counts.items()],
+                )
+                added += length
+            self._add_totals(len(ids), added)
+
+    def remove(self, ids):
+        with self._writer:
+            self._remove(ids)
+
+    def _remove(self, ids):
+        ids = list(ids)
+        rows = []
+        # A few hundred IDs per query (SQLite caps the number of parameters)
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            rows += self._writer.execute(
+                f"SELECT number, length FROM chunks WHERE id IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+        if not rows:
+            return
+        self._writer.executemany("DELETE FROM postings WHERE number = ?", [(number,) for number, _ in rows])
+        self._writer.executemany("DELETE FROM chunks WHERE number = ?", [(number,) for number, _ in rows])
+        self._add_totals(-len(rows), -sum(length for _, length in rows))
+
+    def _add_totals(self, chunks: int, length: int):
+        self._writer.executemany(
+            "UPDATE totals SET value = value + ? WHERE name = ?", [(chunks, "chunks"), (length, "length")]
+        )
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    # -------- Reading --------
+
+    def texts(self):
+        """
+        Yields the text of every chunk (read from disk in order, never all at once).
+        """
+        cursor = self._connection().execute("SELECT text FROM chunks ORDER BY number")
+        for (text,) in cursor:
+            yield text
+
+    def search(self, query: str, k: int = 4) -> List[Document]:
+        """
+        Top-k chunks by BM25 score (only chunks sharing at least one term with the query).
+        """
+        connection = self._connection()
+        totals = dict(connection.execute("SELECT name, value FROM totals"))
+        total = totals.get("chunks", 0)
+        if not total:
+            return []
+        average_length = totals["length"] / total
+
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = connection.execute(
+                "SELECT p.number, p.frequency, c.length FROM postings p JOIN chunks c ON c.number = p.number"
+                " WHERE p.term = ?", (term,)
+            ).fetchall()
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for number, frequency, length in postings:
+                norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[number] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        if not best:
+            return []
+        numbers = [number for number, _ in best]
+        rows = {
+            number: (chunk_id, text, metadata)
+            for number, chunk_id, text, metadata in connection.execute(
+                f"SELECT number, id, text, metadata FROM chunks WHERE number IN ({','.join('?' * len(numbers))})",
+                numbers,
+            )
+        }
+        return [
+            Document(id=rows[number][0], page_content=rows[number][1], metadata=json.loads(rows[number][2]))
+            for number in numbers
+        ]
+
+
+def build_lexical_index(persist_directory: str, collection, page_size: int = LEXICAL_PAGE_SIZE):
+    """
+    Rebuilds the BM25 index of a collection from everything stored in Chroma,
+    read `page_size` chunks at a time. Only needed when bm25.sqlite3 is missing:
+    the ingestion pipeline otherwise updates it with the chunks it writes.
+    `collection` is a chromadb collection (as used by the ingestion pipeline).
+    """
+    path = os.path.join(persist_directory, LEXICAL_FILE)
+    if os.path.exists(path + ".tmp"):
+        os.remove(path + ".tmp")
+    index = BM25Index(path + ".tmp", writable=True)
+    offset = 0
+    while True:
+        data = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not data["ids"]:
+            break
+        index.add(data["ids"], data["documents"], data["metadatas"])
+        offset += len(data["ids"])
+    index.close()
+    os.replace(path + ".tmp", path)
+    legacy = os.path.join(persist_directory, LEGACY_LEXICAL_FILE)
+    if os.path.exists(legacy):
+        os.remove(legacy)
+    return BM25Index.load(persist_directory)
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_lexical_index(collection_name: str):
+    """
+    BM25 index of a collection (None if it was never built), reloaded after a re-index.
+    """
+    persist_directory = index_path(collection_name)
+    version = read_index_version(persist_directory)
+    cached = _indexes.get(collection_name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _lock:
+        index = BM25Index.load(persist_directory)
+        _indexes[collection_name] = (version, index)
+    return index
+
+
+def release_lexical_index(collection_name: str):
+    # Drops the index of an idle collection (reopened on next use)
+    with _lock:
+        _indexes.pop(collection_name, None)
+
+
+# ============================
+# 3. Reciprocal Rank Fusion
+# ============================
+
+def _document_key(document: Document) -> str:
+    # Chunk ID when available, otherwise a hash of the text
+    return document.id or hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = 4, constant: int = 60) -> List[Document]:
+    """
+    Merges ranked lists: score(d) = Σ 1 / (constant + rank of d in each list).
+    """
+    scores = Counter()
+    documents = {}
+    for results in result_lists:
+        for rank, document in enumerate(results, start=1):
+            key = _document_key(document)
+            scores[key] += 1.0 / (constant + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key, _ in scores.most_common(k)]
@@ -0,0 +1,109 @@
+# ============================
+# Local CPU Embeddings (ONNX Runtime + Hugging Face tokenizers)
+# ============================
+
+# Runs a sentence-embedding model exported to ONNX in-process: no network round
+# trip per query and no per-token cost when ingesting. Inputs are batched (sorted
+# by length to minimize padding) and ONNX Runtime uses all the CPU cores.
+
+import os
+from typing import List
+
+# -------- Numerical computing (pooling + normalization) --------
+import numpy as np
+
+# -------- LangChain embeddings interface --------
+from langchain_core.embeddings import Embeddings
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Hugging Face repo ID or local folder with the ONNX model and its tokenizer.json
+# (multilingual, so Spanish questions and laws land in the same space)
+ONNX_EMBEDDING_MODEL = os.getenv("ONNX_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+ONNX_EMBEDDING_FILE = os.getenv("ONNX_EMBEDDING_FILE", "onnx/model.onnx")
+
+# Texts per inference call, max tokens per text, and CPU threads (0 = all cores)
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "32"))
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", "256"))
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+
+def resolve_model_files(model: str, model_file: str):
+    """
+    Returns the local paths of (model.onnx, tokenizer.json): from the folder if
+    `model` is a directory, otherwise downloaded once from the Hugging Face Hub.
+    """
+    if os.path.isdir(model):
+        return os.path.join(model, model_file), os.path.join(model, "tokenizer.json")
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(model, model_file), hf_hub_download(model, "tokenizer.json")
+
+
+# ============================
+# 2. ONNX Sentence Embeddings
+# ============================
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Mean-pooled, L2-normalized sentence embeddings computed with ONNX Runtime.
+    """
+
+    def __init__(self, model: str = ONNX_EMBEDDING_MODEL, model_file: str = ONNX_EMBEDDING_FILE,
+                 batch_size: int = ONNX_BATCH_SIZE, max_length: int = ONNX_MAX_LENGTH,
+                 threads: int = ONNX_THREADS):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path, tokenizer_path = resolve_model_files(model, model_file)
+        self.model = model
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        pad_token = next((t for t in ("<pad>", "[PAD]") if self.tokenizer.token_to_id(t) is not None), None)
+        self.tokenizer.enable_padding(
+            pad_id=self.tokenizer.token_to_id(pad_token) if pad_token else 0,
+            pad_token=pad_token or "[PAD]",
+        )
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or os.cpu_count()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        # Static output size of the model, e.g. [batch, tokens, 384] → 384
+        size = self.session.get_outputs()[0].shape[-1]
+        self.dimension = size if isinstance(size, int) else len(self._embed_batch(["dimension"])[0])
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self.session.run(None, inputs)[0]
+        if output.ndim == 3:
+            # Token embeddings → mean over the real (non-padding) tokens
+            mask = attention_mask[..., None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Similar lengths in the same batch → less padding to compute
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            for position, vector in zip(positions, self._embed_batch([texts[i] for i in positions])):
+                vectors[position] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
@@ -2,21 +2,94 @@
 # Load Chroma VectorStores as Retrievers
 # ============================
 
+import asyncio
+import logging
 import os
+import threading
+import time
+from functools import lru_cache
 
-# Chroma is the vector database used to store and search document embeddings
-from langchain_chroma import Chroma
+# LangChain retriever interface (used by the article-aware retriever)
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.retrievers import BaseRetriever
+
+# Location of the persisted indexes (INDEX_DIR env var, one folder per collection)
+# and the embedding signature recorded by the ingestion
+from app.vectorstore.index_metadata import INDEX_DIR, check_embedding_signature, index_path
+
+# Article-level index: direct lookup of cited articles
+from app.vectorstore.articles import get_article_index, release_article_index
+
+# BM25 index (exact legal terms, no embeddings needed) and rank fusion
+from app.vectorstore.lexical import get_lexical_index, reciprocal_rank_fusion, release_lexical_index
+
+# Prometheus metrics (embedding calls and Chroma queries)
+from app.metrics import VECTOR_QUERY_DURATION, MeteredEmbeddings
 
-# OpenAI embeddings model (you must have your OPENAI_API_KEY set)
-from langchain_openai import OpenAIEmbeddings
+# Spans around the Chroma queries
+from app.telemetry import tracer
+
+logger = logging.getLogger(__name__)
+
+# Chroma and the embedding model are imported and opened lazily, on first use,
+# so importing this module is fast and doesn't touch the disk or the network.
 
 
 # ============================
-# 1. Set Up OpenAI Embeddings
+# 1. Set Up the Embeddings
 # ============================
 
-# Initialize the embedding function using OpenAI (can be reused across all collections)
-embeddings = OpenAIEmbeddings()
+# "openai": OpenAIEmbeddings (you must have your OPENAI_API_KEY set)
+# "onnx":   local CPU model run with ONNX Runtime (see onnx_embeddings.py)
+# "fake":   deterministic hashed vectors, for benchmarks and offline runs (see app/fakes.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+
+# Persistent cache of query/chunk embeddings shared by the retrievers and ingest_docs.py
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(INDEX_DIR, "embedding_cache.sqlite3"))
+
+
+# Initialize the embedding model of the configured backend (reused across all collections)
+@lru_cache(maxsize=None)
+def get_base_embeddings():
+    if EMBEDDING_BACKEND == "onnx":
+        from app.vectorstore.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings()
+    if EMBEDDING_BACKEND == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings()
+    if EMBEDDING_BACKEND == "fake":
+        from app.fakes import FakeEmbeddings
+        return FakeEmbeddings()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND!r} (expected 'openai', 'onnx' or 'fake')")
+
+
+def embedding_signature() -> dict:
+    """
+    Backend, model and dimension of the configured embeddings (None if only known after embedding).
+    """
+    embeddings = get_base_embeddings()
+    return {
+        "backend": EMBEDDING_BACKEND,
+        "model": embeddings.model,
+        "dimension": getattr(embeddings, "dimension", None),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    # Only calls that reach the model are timed (cache hits are not embedding calls)
+    base = get_base_embeddings()
+    embeddings = MeteredEmbeddings(base, f"{EMBEDDING_BACKEND}:{base.model}")
+    if not EMBEDDING_CACHE_ENABLED:
+        return embeddings
+
+    # Same text + same model → embedded only once, ever
+    from app.vectorstore.embedding_cache import CachedEmbeddings
+    return CachedEmbeddings(embeddings, f"{EMBEDDING_BACKEND}:{base.model}", EMBEDDING_CACHE_PATH)
 
 
 # ============================
@@ -31,39 +104,155 @@ os.environ["CHROMA_TELEMETRY"] = "FALSE"
 # 3. Load Pre-Built VectorStores
 # ============================
 
-# Load the vector store for 'laboral' (Labor Law)
-laboral_vector_store = Chroma(
-    collection_name="laboral",                                  # Name of the Chroma collection
-    embedding_function=embeddings,                              # Embedding model used to compare queries
-    persist_directory="/home/janf/Projects/legal_assistant_ai_agent/index/laboral/",  # Where vectors are stored on disk
-)
+# Collections are built by ingest_docs.py (one per docs/ subfolder); the ones
+# served are listed in the domain registry (app/agents/domains.json)
 
-# Expose it as a retriever (so it can return relevant documents given a question)
-laboral_retriever = laboral_vector_store.as_retriever()
+_vector_stores = {}
+_vector_stores_lock = threading.Lock()
 
 
-# Load the vector store for 'civil' (Civil Law)
-civil_vector_store = Chroma(
-    collection_name="civil",
-    embedding_function=embeddings,
-    persist_directory="/home/janf/Projects/legal_assistant_ai_agent/index/civil/",
-)
-civil_retriever = civil_vector_store.as_retriever()
+# Load the vector store of a collection (opened once, then reused until released).
+# Refuses to open an index built with other embeddings: its vectors wouldn't be comparable.
+def get_vector_store(collection_name: str):
+    store = _vector_stores.get(collection_name)
+    if store is not None:
+        return store
+    with _vector_stores_lock:
+        if collection_name not in _vector_stores:
+            from langchain_chroma import Chroma
+            check_embedding_signature(index_path(collection_name), embedding_signature())
+            _vector_stores[collection_name] = Chroma(
+                collection_name=collection_name,              # Name of the Chroma collection
+                embedding_function=get_embeddings(),          # Embedding model used to compare queries
+                persist_directory=index_path(collection_name),  # Where vectors are stored on disk
+            )
+        return _vector_stores[collection_name]
 
 
-# Load the vector store for 'penal' (Criminal Law)
-penal_vector_store = Chroma(
-    collection_name="penal",
-    embedding_function=embeddings,
-    persist_directory="/home/janf/Projects/legal_assistant_ai_agent/index/penal/",
-)
-penal_retriever = penal_vector_store.as_retriever()
+def release_collection(collection_name: str):
+    """
+    Closes the vector store of an idle collection and drops its BM25 and article
+    indexes from memory. Everything is reopened on the next query.
+    """
+    release_lexical_index(collection_name)
+    release_article_index(collection_name)
+    with _vector_stores_lock:
+        store = _vector_stores.pop(collection_name, None)
+    if store is None:
+        return
+    # Chroma keeps one system (SQLite connection + HNSW segments) per persist directory
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        system = SharedSystemClient._identifier_to_system.pop(store._client._identifier, None)
+        if system is not None:
+            system.stop()
+    except Exception as e:
+        logger.warning("Could not close the Chroma client of %s: %r", collection_name, e)
 
 
-# Load the vector store for 'general' (Fallback or uncategorized documents)
-general_vector_store = Chroma(
-    collection_name="general",
-    embedding_function=embeddings,
-    persist_directory="/home/janf/Projects/legal_assistant_ai_agent/index/general/",
-)
-general_retriever = general_vector_store.as_retriever()
+# ============================
+# 4. Retrieval Mode
+# ============================
+
+# "hybrid": BM25 + vector search merged with reciprocal rank fusion (default)
+# "dense":  vector search only
+# "lexical": BM25 only, no embedding calls (when the embedding provider is slow or down)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+
+# Documents returned, and candidates taken from each side before fusion
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+
+# In hybrid mode, a vector search slower than this (seconds) is dropped
+# and the lexical results are used alone
+DENSE_TIMEOUT = float(os.getenv("DENSE_TIMEOUT", "10"))
+
+
+# ============================
+# 5. Legal Retrievers
+# ============================
+
+# Questions citing an article ("artículo 47 de la LFT") are resolved with a direct
+# lookup in the article-level index; the other questions go to the BM25 and/or
+# vector search depending on RETRIEVAL_MODE.
+class ArticleAwareRetriever(BaseRetriever):
+    collection_name: str
+    mode: str = RETRIEVAL_MODE
+    k: int = RETRIEVAL_K
+    candidates: int = RETRIEVAL_CANDIDATES
+
+    # The query is embedded first, so the Chroma query itself can be timed on its own
+    def _dense_search(self, query: str, k: int):
+        vector = get_embeddings().embed_query(query)
+        start = time.perf_counter()
+        try:
+            with self._span(k):
+                return get_vector_store(self.collection_name).similarity_search_by_vector(vector, k=k)
+        finally:
+            VECTOR_QUERY_DURATION.observe(time.perf_counter() - start, collection=self.collection_name)
+
+    async def _adense_search(self, query: str, k: int):
+        vector = await get_embeddings().aembed_query(query)
+        start = time.perf_counter()
+        try:
+            with self._span(k):
+                store = get_vector_store(self.collection_name)
+                return await asyncio.to_thread(store.similarity_search_by_vector, vector, k=k)
+        finally:
+            VECTOR_QUERY_DURATION.observe(time.perf_counter() - start, collection=self.collection_name)
+
+    def _span(self, k: int):
+        return tracer.start_as_current_span(
+            "chroma.query", attributes={"db.collection": self.collection_name, "retrieval.k": k}
+        )
+
+    def _fuse(self, lexical, dense):
+        if dense is None:
+            return lexical[:self.k]
+        if lexical is None:
+            return dense[:self.k]
+        return reciprocal_rank_fusion([lexical, dense], k=self.k)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun):
+        articles = get_article_index(self.collection_name).lookup(query)
+        if articles:
+            return articles
+
+        lexical_index = get_lexical_index(self.collection_name) if self.mode != "dense" else None
+        lexical = lexical_index.search(query, self.candidates) if lexical_index else None
+        if self.mode == "lexical" and lexical is not None:
+            return lexical[:self.k]
+
+        try:
+            dense = self._dense_search(query, self.candidates)
+        except Exception as e:
+            # Embedding provider down: keep going with the lexical results
+            if lexical is None:
+                raise
+            logger.warning("Vector search failed for %s, using BM25 only: %r", self.collection_name, e)
+            dense = None
+        return self._fuse(lexical, dense)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun):
+        # Loading the article index reads JSON from disk: do it in a worker thread
+        article_index = await asyncio.to_thread(get_article_index, self.collection_name)
+        articles = article_index.lookup(query)
+        if articles:
+            return articles
+
+        lexical_index = await asyncio.to_thread(get_lexical_index, self.collection_name) if self.mode != "dense" else None
+        # The BM25 postings are read from disk: search in a worker thread too
+        lexical = await asyncio.to_thread(lexical_index.search, query, self.candidates) if lexical_index else None
+        if self.mode == "lexical" and lexical is not None:
+            return lexical[:self.k]
+
+        dense_search = self._adense_search(query, self.candidates)
+        if lexical is None:
+            return (await dense_search)[:self.k]
+        try:
+            dense = await asyncio.wait_for(dense_search, DENSE_TIMEOUT)
+        except Exception as e:
+            # Embedding provider slow or down: answer with the lexical results
+            logger.warning("Vector search failed for %s, using BM25 only: %r", self.collection_name, e)
+            dense = None
+        return self._fuse(lexical, dense)
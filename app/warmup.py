@@ -0,0 +1,88 @@
+# ============================
+# Optional Warmup + Readiness State
+# ============================
+
+# LLM clients, vector stores and the local classifier are all built lazily.
+# The warmup builds them ahead of time, in parallel, so the first request
+# doesn't pay for it. /ready reports when it is done.
+
+# -------- Standard Library --------
+import asyncio
+import os
+import time
+
+
+# ============================
+# 1. Configuration
+# ============================
+
+# Run the warmup in the background when the server starts (off = fully lazy)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+
+
+# ============================
+# 2. Readiness State
+# ============================
+
+readiness = {
+    "ready": not WARMUP_ON_STARTUP,   # Nothing to wait for when warmup is off
+    "errors": {},                     # Component name → error message
+    "warmup_seconds": None,
+}
+
+
+# ============================
+# 3. Warmup Steps
+# ============================
+
+def _warmup_steps():
+    # Imported here so importing this module stays cheap
+    from app.llms import get_fallback_llm
+    from app.router import get_legal_classifier
+    from app.vectorstore.retrievers import get_embeddings
+    from app.agents.domains import DOMAINS
+    from app.agents.domain_agent import get_domain_agent
+    from app.agents.legal_assistant_agent import local_classifier
+
+    # Independent components, built in parallel
+    first_phase = {
+        "llms": lambda: get_fallback_llm().warmup(),
+        "classifier": get_legal_classifier,
+        "embeddings": get_embeddings,
+    }
+    # Every registered domain (graph + collection)
+    for name in DOMAINS:
+        first_phase[f"{name}_domain"] = get_domain_agent(name).warmup
+
+    # Components that read the indexes opened in the first phase
+    second_phase = {}
+    if local_classifier is not None:
+        second_phase["local_classifier"] = local_classifier.warmup
+    return [first_phase, second_phase]
+
+
+async def _run_parallel(steps: dict):
+    results = await asyncio.gather(
+        *(asyncio.to_thread(step) for step in steps.values()),
+        return_exceptions=True,
+    )
+    return {
+        name: f"{type(result).__name__}: {result}"
+        for name, result in zip(steps, results)
+        if isinstance(result, Exception)
+    }
+
+
+async def warmup():
+    """
+    Builds every lazy component in parallel (each one in a worker thread)
+    and updates the readiness state. Failures are recorded, not raised.
+    """
+    start = time.perf_counter()
+    errors = {}
+    for steps in _warmup_steps():
+        errors.update(await _run_parallel(steps))
+
+    readiness["errors"] = errors
+    readiness["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    readiness["ready"] = not errors
@@ -0,0 +1,24 @@
+from app.vectorstore.articles import ArticleIndex, find_citations
+
+
+def test_find_citations_reads_lists_of_articles():
+    assert find_citations("artículos 47, 48 y 50 de la LFT") == ["47", "48", "50"]
+    assert find_citations("arts. 47 y 48") == ["47", "48"]
+    assert find_citations("art. 47 bis y 48 ter") == ["47 bis", "48 ter"]
+    assert find_citations("artículo 47 e inciso b") == ["47"]
+
+
+def index_of(law, keys):
+    index = ArticleIndex("/nonexistent")
+    index.laws = {law}
+    index.articles = {(law, key): key for key in keys}
+    return index
+
+
+def test_lookup_skips_laws_outside_the_index():
+    index = index_of("LFT", ["14", "47", "48", "123"])
+    assert index.lookup("arts. 47 y 48 de la LFT") == ["47", "48"]
+    assert index.lookup("¿qué dice el artículo 47?") == ["47"]
+    assert index.lookup("artículo 123 constitucional") == []
+    assert index.lookup("art. 14 de la Ley de Amparo") == []
+    assert index.lookup("art. 47 del Código Penal") == []
@@ -0,0 +1,41 @@
+import asyncio
+
+from app.cache import AnswerCache
+from app.fakes import FakeEmbeddings
+
+
+def test_embeddings_factory_failure_falls_back_to_exact_matches():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        raise RuntimeError("no embedding model")
+
+    cache = AnswerCache(embeddings=factory)
+    response = {"question": "¿Cuánto es el aguinaldo?", "answer": "15 días", "category": "General"}
+
+    # The failure doesn't escape the lookup: it is a miss, with no vector
+    cached, vector = asyncio.run(cache.alookup("¿Cuánto es el aguinaldo?"))
+    assert cached is None and vector is None
+
+    # Exact matches still work, and the factory isn't called again
+    cache.store("¿Cuánto es el aguinaldo?", response, vector)
+    cached, _ = asyncio.run(cache.alookup("cuanto es el aguinaldo"))
+    assert cached == response
+    cached, _ = asyncio.run(cache.alookup("¿Y cuánto es la prima vacacional?"))
+    assert cached is None
+    assert len(calls) == 1
+
+
+def test_embeddings_factory_is_resolved_once():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return FakeEmbeddings(latency=0)
+
+    cache = AnswerCache(embeddings=factory)
+    _, first = asyncio.run(cache.alookup("¿Cuánto es el aguinaldo?"))
+    _, second = asyncio.run(cache.alookup("¿Qué es la prima vacacional?"))
+    assert first is not None and second is not None
+    assert len(calls) == 1
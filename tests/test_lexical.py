@@ -0,0 +1,19 @@
+from app.vectorstore.lexical import LEXICAL_FILE, BM25Index
+
+
+def test_index_is_updated_on_disk(tmp_path):
+    index = BM25Index(str(tmp_path / LEXICAL_FILE), writable=True)
+    index.add(["a", "b"], ["El aguinaldo es de quince días", "La prima vacacional"], [{"page": 1}, None])
+    index.add(["b"], ["El finiquito incluye el aguinaldo"], [{"page": 2}])
+    index.remove(["a"])
+    index.close()
+
+    index = BM25Index.load(str(tmp_path))
+    assert [document.id for document in index.search("aguinaldo")] == ["b"]
+    assert index.search("aguinaldo")[0].metadata == {"page": 2}
+    assert index.search("prima vacacional") == []
+    assert list(index.texts()) == ["El finiquito incluye el aguinaldo"]
+
+
+def test_missing_index(tmp_path):
+    assert BM25Index.load(str(tmp_path)) is None